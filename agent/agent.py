@@ -1,102 +1,327 @@
 from __future__ import annotations
+import json
+import time
+from contextlib import aclosing
 from typing import Any, AsyncGenerator
 from client.llm_client import LLMClient
 from agent.events import AgentEvent, AgentEventType
-from client.response import StreamEventType, ToolCall, ToolResultMessage
+from client.response import StreamEventType, TextBuffer, TokenUsage, ToolCall, ToolResultMessage, coalesce_text_deltas
+from client.endpoints import BackendReport
+from client.retry import RetryAttempt
 from context.manager import ContextManager
+from context.compaction import ContextCompactor
 from tools.registry import create_default_registry
+from agent.scheduler import ToolScheduler
+from agent.timing import RunTiming, TurnTiming
+from config.settings import Config, get_config
+from utils.tracing import Span, get_tracer
 from pathlib import Path
-# this entire class just processes one single message and runs one single time for one message
+
+# one Agent handles one conversation: every run() keeps sending tool results back to
+# the model until it answers without tool calls or one of the budgets runs out
 class Agent:
-    def __init__(self):
-        self.client = LLMClient()
-        self.context_manager = ContextManager()
+    def __init__(
+            self,
+            max_tool_concurrency: int | None = None,
+            max_turns: int | None = None,
+            max_duration: float | None = None,
+            max_total_tokens: int | None = None,
+            context_window: int | None = None,
+            compaction_threshold: float | None = None,
+            config: Config | None = None,
+            ):
+        # arguments left as None fall back to the config
+        self.config = config or get_config()
+        self.client = LLMClient(self.config)
+        self.context_manager = ContextManager(self.config.model)
+        self.compactor = ContextCompactor(
+            self.client,
+            context_window=context_window or self.config.context_window,
+            threshold=compaction_threshold or self.config.compaction_threshold,
+        )
         self.tool_registry = create_default_registry()
+        # upper bound on read-only tool calls running at the same time
+        self.max_tool_concurrency = max_tool_concurrency or self.config.max_tool_concurrency
+        # budgets for a single run(): model turns, wall-clock seconds and total tokens
+        self.max_turns = max_turns or self.config.max_turns
+        self.max_duration = max_duration if max_duration is not None else self.config.max_duration
+        self.max_total_tokens = (
+            max_total_tokens if max_total_tokens is not None else self.config.max_total_tokens
+        )
+        self.usage = TokenUsage()
+        # accumulated over every run() of this agent, for prompt cache reporting
+        self.session_usage = TokenUsage()
+        self._stop_reason : str | None = None
+        self._retries : list[RetryAttempt] = []
+        # which endpoint answered the current turn, and where its time went
+        self._turn_backend : BackendReport | None = None
+        self._turn_timing : TurnTiming | None = None
+        # spans of the current run and turn. they are never the active span, since the
+        # consumer runs between our yields, so children are given them as their parent
+        self._run_span : Span | None = None
+        self._turn_span : Span | None = None
+        self._timing = RunTiming()
 
     async def run(self, message : str):
-        yield AgentEvent.agent_start(message=message)
-        self.context_manager.add_user_message(message)
-        #  add user message to context
-        final_response : str | None = None
-        async for event in self._agentic_loop():
-            yield event
+        with get_tracer().span("agent.run", activate=False, model=self.config.model) as span:
+            self._run_span = span
+            yield AgentEvent.agent_start(message=message)
+            self.context_manager.add_user_message(message)
+            #  add user message to context
+            final_response : str | None = None
+            self.usage = TokenUsage()
+            self._stop_reason = None
+            self._retries = []
+            self._timing = RunTiming()
+            # closed explicitly, down to the HTTP response, when our consumer stops early
+            async with aclosing(self._agentic_loop()) as events:
+                async for event in events:
+                    yield event
 
-            if event.type == AgentEventType.TEXT_COMPLETE:
-                final_response = event.data.get("content", "")  
+                    if event.type == AgentEventType.TEXT_COMPLETE:
+                        final_response = event.data.get("content", "")
 
-        yield AgentEvent.agent_end(response=final_response)
+            span.set_attributes(
+                turns=len(self._timing.turns),
+                stop_reason=self._stop_reason,
+                prompt_tokens=self.usage.prompt_tokens,
+                completion_tokens=self.usage.completion_tokens,
+                cached_tokens=self.usage.cached_tokens,
+                retries=len(self._retries),
+            )
+            yield AgentEvent.agent_end(
+                response=final_response,
+                usage=self.usage,
+                stop_reason=self._stop_reason,
+                session_usage=self.session_usage,
+                retries=self._retries,
+                timing=self._timing,
+            )
+
+    def _budget_exhausted(self, turn: int, deadline: float | None) -> str | None:
+        if turn > self.max_turns:
+            return "max_turns"
+        if deadline is not None and time.monotonic() >= deadline:
+            return "deadline"
+        if self.max_total_tokens is not None and self.usage.total_tokens >= self.max_total_tokens:
+            return "token_budget"
+        return None
 
     async def _agentic_loop(self)-> AsyncGenerator[AgentEvent, None]:
+        deadline = (
+            time.monotonic() + self.max_duration
+            if self.max_duration is not None
+            else None
+        )
+        turn = 1
+
+        while True:
+            stop_reason = self._budget_exhausted(turn, deadline)
+            if stop_reason:
+                self._stop_reason = stop_reason
+                yield AgentEvent.agent_error(
+                    error=f"Agent stopped before finishing: {stop_reason} reached",
+                    details={
+                        "stop_reason": stop_reason,
+                        "turns": turn - 1,
+                        "usage": self.usage.to_dict(),
+                    },
+                )
+                return
+
+            with get_tracer().span("agent.turn", parent=self._run_span, activate=False, turn=turn) as span:
+                self._turn_span = span
+                timing = TurnTiming(turn=turn)
+                self._turn_timing = timing
+                if self.compactor.should_compact(self.context_manager):
+                    result = await self.compactor.compact(self.context_manager, parent_span=span)
+                    timing.compaction = result.duration
+                    yield AgentEvent.context_compacted(result)
+
+                yield AgentEvent.turn_start(turn=turn)
+                self._turn_backend = None
+                tool_calls : list[ToolCall] = []
+                turn_usage : list[TokenUsage] = []
+                errored = False
+
+                async with aclosing(self._run_turn(tool_calls, turn_usage)) as events:
+                    async for event in events:
+                        if event.type == AgentEventType.AGENT_ERROR:
+                            errored = True
+                        yield event
+
+                usage = turn_usage[0] if turn_usage else None
+                if usage:
+                    self.usage += usage
+                    self.session_usage += usage
+                backend = self._turn_backend
+                span.set_attributes(
+                    tool_calls=len(tool_calls),
+                    prompt_tokens=usage.prompt_tokens if usage else None,
+                    completion_tokens=usage.completion_tokens if usage else None,
+                    cached_tokens=usage.cached_tokens if usage else None,
+                    endpoint=backend.endpoint if backend else None,
+                    hedged=backend.hedged if backend else False,
+                    compacted=timing.compaction > 0,
+                )
+                if errored:
+                    span.set_error("turn ended with an error")
+                yield AgentEvent.turn_end(
+                    turn=turn,
+                    tool_calls=len(tool_calls),
+                    usage=usage,
+                    backend=backend,
+                    timing=timing.finish(),
+                )
+                self._timing.turns.append(timing)
+
+            if errored:
+                self._stop_reason = "error"
+                return
+            if not tool_calls:
+                self._stop_reason = "completed"
+                return
+            turn += 1
+
+    # one model call plus the tool calls it asked for. the tool calls and the reported
+    # usage are appended to the given lists so the loop can decide whether to continue
+    async def _run_turn(
+            self,
+            tool_calls: list[ToolCall],
+            turn_usage: list[TokenUsage],
+            )-> AsyncGenerator[AgentEvent, None]:
         # messages = [{"role": "user", "content": "Hey what is going on."}]
-        response_text = ""
-        
+        response_text = TextBuffer()
+        timing = self._turn_timing or TurnTiming(turn=0)
+
         tool_schemas = self.tool_registry.get_schemas()
 
-        tool_calls : list[ToolCall] = []
+        # read-only calls are dispatched while the model is still streaming; once a
+        # mutating call shows up, it and everything after it wait for the stream to end
+        deferred_calls : list[ToolCall] = []
+        scheduler = ToolScheduler(
+            self.tool_registry,
+            Path.cwd(),
+            max_concurrency=self.max_tool_concurrency,
+            parent_span=self._turn_span,
+        )
 
-        async for event in self.client.chat_completion(
+        stream_start = time.perf_counter()
+        events = self.client.chat_completion(
             messages=self.context_manager.get_messages(),
             tools=tool_schemas if tool_schemas else None,
             stream=True,
-        ):
-            # print(event)
-            if event.type == StreamEventType.TEXT_DELTA:
-                if event.text_delta:    
-                    content = event.text_delta.content
-                    response_text += content
-                    yield AgentEvent.text_delta(content=content)
+            prompt_tokens=self.context_manager.total_tokens,
+            parent_span=self._turn_span,
+        )
+        if self.config.stream_coalesce_window:
+            events = coalesce_text_deltas(events, self.config.stream_coalesce_window)
+        assistant_added = False
+        tool_call_results : list[ToolResultMessage] | None = None
+        try:
+            async for event in events:
+                # print(event)
+                if event.type == StreamEventType.TEXT_DELTA:
+                    if event.text_delta:
+                        content = event.text_delta.content
+                        response_text.append(content)
+                        yield AgentEvent.text_delta(content=content)
 
-            elif event.type == StreamEventType.TOOL_CALL_COMPLETE:
-                if event.tool_call:
-                    tool_calls.append(event.tool_call)
+                elif event.type == StreamEventType.TOOL_CALL_COMPLETE:
+                    if event.tool_call:
+                        tool_calls.append(event.tool_call)
+                        if deferred_calls or scheduler.is_mutating(event.tool_call):
+                            deferred_calls.append(event.tool_call)
+                        else:
+                            scheduler.submit(event.tool_call)
 
+                elif event.type == StreamEventType.MESSAGE_COMPLETE:
+                    if event.usage:
+                        turn_usage.append(event.usage)
+                    self._turn_backend = event.backend
+                    timing.stream = event.metrics
 
-            elif event.type == StreamEventType.ERROR:
-                yield AgentEvent.agent_error(
-                    error=event.error or "Unknown error occured",
-                    details={},
-                )    
-        self.context_manager.add_assistant_message(response_text or None,)
-
-        if response_text:
-            yield AgentEvent.text_complete(content=response_text)
-        tool_call_results : list[ToolResultMessage] = []
-        for tool_call in tool_calls:
-            yield AgentEvent.tool_call_start(
-                tool_call.call_id,
-                tool_call.name,
-                tool_call.arguments,
-            )
-            result = await self.tool_registry.invoke(
-                tool_call.name,
-                tool_call.arguments,
-                Path.cwd(),
-            )
+                elif event.type == StreamEventType.RETRY:
+                    if event.retry:
+                        self._retries.append(event.retry)
+                        yield AgentEvent.model_retry(event.retry)
 
-            yield AgentEvent.tool_call_complete(
-                tool_call.call_id,
-                tool_call.name,
-                result,
-            )
+                elif event.type == StreamEventType.ERROR:
+                    yield AgentEvent.agent_error(
+                        error=event.error or "Unknown error occured",
+                        details={},
+                    )
 
-            tool_call_results.append(
-                ToolResultMessage(
-                    tool_call_id=tool_call.call_id,
-                    content=result.to_model_output(),
-                    is_error=not result.success,
-                )
-            )
-    
-        for tool_result in tool_call_results:
-            self.context_manager.add_tool_result_message(
-                tool_result.tool_call_id,
-                tool_result.content,
+                for tool_event in scheduler.poll_events():
+                    self._record_tool_timing(timing, tool_event)
+                    yield tool_event
+
+            stream_end = time.perf_counter()
+            timing.model = stream_end - stream_start
+
+            # the assistant message has to carry its tool_calls, otherwise the provider
+            # rejects the tool results that follow it on the next turn
+            self.context_manager.add_assistant_message(
+                response_text.getvalue() or None,
+                tool_calls=[
+                    {
+                        "id": tool_call.call_id,
+                        "type": "function",
+                        "function": {
+                            "name": tool_call.name,
+                            "arguments": json.dumps(tool_call.arguments),
+                        },
+                    }
+                    for tool_call in tool_calls
+                ],
             )
+            assistant_added = True
+            # submitted before the next yield, so an interrupted turn still has a (cancelled)
+            # task, and with it a result, for every tool call in the assistant message
+            for tool_call in deferred_calls:
+                scheduler.submit(tool_call)
+
+            if response_text:
+                yield AgentEvent.text_complete(content=response_text.getvalue())
+
+            async for event in scheduler.drain():
+                self._record_tool_timing(timing, event)
+                yield event
+
+            tool_call_results = await scheduler.results()
+            timing.tool_wait = time.perf_counter() - stream_end
+        finally:
+            # the consumer stopped early or the run was cancelled (Ctrl-C in the REPL): close
+            # the stream, and with it the HTTP response, and don't leave tools running in
+            # the background
+            await events.aclose()
+            await scheduler.cancel()
+            # the history has to stay valid for the next run on this agent
+            if not assistant_added:
+                # interrupted while streaming: keep the text the user already saw, but not
+                # tool calls that never ran
+                if response_text:
+                    self.context_manager.add_assistant_message(response_text.getvalue())
+            else:
+                if tool_call_results is None:
+                    tool_call_results = await scheduler.results()
+                for tool_result in tool_call_results:
+                    self.context_manager.add_tool_result_message(
+                        tool_result.tool_call_id,
+                        tool_result.content,
+                    )
+
+    def _record_tool_timing(self, timing: TurnTiming, event: AgentEvent) -> None:
+        if event.type == AgentEventType.TOOL_CALL_COMPLETE:
+            timing.record_tool(event.data.get("tool_name", "unknown"), event.data.get("duration"))
+
+    async def close(self) -> None:
+        if self.client:
+            await self.client.close()
+            self.client = None
 
     async def __aenter__(self)->Agent:
         return self
-    
+
     async def __aexit__(self, exc_type, exc_value, traceback)->None:
-        if self.client:
-            await self.client.close()
-            self.client = None
\ No newline at end of file
+        await self.close()
@@ -3,8 +3,15 @@ from enum import Enum
 from dataclasses import dataclass, field
 from typing import Any
 
-from client.response import TokenUsage
-from tools.base import ToolResult
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from client.response import TokenUsage
+    from tools.base import ToolResult
+    from agent.timing import RunTiming, TurnTiming
+    from client.endpoints import BackendReport
+    from client.retry import RetryAttempt
+    from context.compaction import CompactionResult
 
 class AgentEventType(str, Enum):
     # agent lifecycle events
@@ -12,6 +19,16 @@ class AgentEventType(str, Enum):
     AGENT_END = "agent_end"
     AGENT_ERROR = "agent_error"
 
+    # agentic loop events, one pair per model call
+    TURN_START = "turn_start"
+    TURN_END = "turn_end"
+
+    # context management events
+    CONTEXT_COMPACTED = "context_compacted"
+
+    # a model call failed and is being retried
+    MODEL_RETRY = "model_retry"
+
     # Tool call events
     TOOL_CALL_START = "tool_call_start"
     TOOL_CALL_COMPLETE = "tool_call_complete"
@@ -20,11 +37,14 @@ class AgentEventType(str, Enum):
     TEXT_DELTA = "text_delta"
     TEXT_COMPLETE = "text_complete"
 
-@dataclass
+@dataclass(slots=True)
 class AgentEvent:
     type: AgentEventType
     data : dict[str, Any] = field(default_factory=dict)
 
+    def to_dict(self) -> dict[str, Any]:
+        return {"type": self.type.value, "data": self.data}
+
     @classmethod
     def agent_start(cls, message: str) -> AgentEvent:
         return cls(
@@ -37,12 +57,26 @@ class AgentEvent:
         cls, 
         response: str | None = None,
         usage: TokenUsage | None = None,
+        stop_reason: str | None = None,
+        session_usage: TokenUsage | None = None,
+        retries: list[RetryAttempt] | None = None,
+        timing: RunTiming | None = None,
         ) -> AgentEvent:
+        # usage covers this run, session_usage every run of the agent so far; both
+        # split prompt tokens into cached and uncached
+        retries = retries or []
         return cls(
             type=AgentEventType.AGENT_END,
             data={
                 "response": response, 
-                "usage": usage.__dict__ if usage else None
+                "usage": usage.to_dict() if usage else None,
+                "stop_reason": stop_reason,
+                "session_usage": session_usage.to_dict() if session_usage else None,
+                "retries": {
+                    "count": len(retries),
+                    "wait_time": round(sum(retry.delay for retry in retries), 3),
+                },
+                "timing": timing.to_dict() if timing else None,
                 }
         )
     
@@ -53,6 +87,56 @@ class AgentEvent:
             data={"error": error, "details": details or {}}
         )
 
+    @classmethod
+    def turn_start(cls, turn: int) -> AgentEvent:
+        return cls(
+            type=AgentEventType.TURN_START,
+            data={"turn": turn}
+        )
+
+    @classmethod
+    def turn_end(
+        cls,
+        turn: int,
+        tool_calls: int,
+        usage: TokenUsage | None = None,
+        backend: BackendReport | None = None,
+        timing: TurnTiming | None = None,
+        ) -> AgentEvent:
+        return cls(
+            type=AgentEventType.TURN_END,
+            data={
+                "turn": turn,
+                "tool_calls": tool_calls,
+                "usage": usage.to_dict() if usage else None,
+                "backend": backend.to_dict() if backend else None,
+                "timing": timing.to_dict() if timing else None,
+                }
+        )
+
+    @classmethod
+    def context_compacted(cls, result: CompactionResult) -> AgentEvent:
+        return cls(
+            type=AgentEventType.CONTEXT_COMPACTED,
+            data={
+                "tokens_before": result.tokens_before,
+                "tokens_after": result.tokens_after,
+                "tokens_saved": result.tokens_saved,
+                "duration": result.duration,
+                "elided_tool_results": result.elided_tool_results,
+                "truncated_tool_results": result.truncated_tool_results,
+                "summarized_messages": result.summarized_messages,
+                "error": result.error,
+                }
+        )
+
+    @classmethod
+    def model_retry(cls, retry: RetryAttempt) -> AgentEvent:
+        return cls(
+            type=AgentEventType.MODEL_RETRY,
+            data=retry.to_dict(),
+        )
+
     @classmethod
     def text_delta(cls, content: str) -> AgentEvent:
         return cls(
@@ -89,5 +173,8 @@ class AgentEvent:
                 "error": result.error,
                 "metadata": result.metadata,
                 "truncated": result.truncated,
+                "cached": result.metadata.get("cache_hit", False),
+                "duration": result.duration,
+                "timed_out": result.timed_out,
             }
         )
\ No newline at end of file
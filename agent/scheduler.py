@@ -0,0 +1,142 @@
+from __future__ import annotations
+import asyncio
+from pathlib import Path
+from typing import AsyncGenerator
+
+from agent.events import AgentEvent
+from client.response import ToolCall, ToolResultMessage
+from tools.base import ToolResult
+from tools.registry import ToolRegistry
+from utils.tracing import Span
+
+DEFAULT_MAX_TOOL_CONCURRENCY = 8
+
+def _cancelled_result(tool_call: ToolCall) -> ToolResult:
+    return ToolResult.error_result(
+        f"Tool {tool_call.name} was cancelled",
+        metadata={"tool_name": tool_call.name},
+    )
+
+# runs the tool calls of one model turn.
+# read-only calls run concurrently (bounded by the semaphore), a mutating call waits for
+# every call submitted before it, and every call submitted after a mutating call waits for it.
+# results are always reported back in submission order so the context matches the model's tool_calls.
+class ToolScheduler:
+    def __init__(
+            self,
+            tool_registry: ToolRegistry,
+            cwd: Path,
+            max_concurrency: int = DEFAULT_MAX_TOOL_CONCURRENCY,
+            parent_span: Span | None = None,
+            )-> None:
+        self.tool_registry = tool_registry
+        self.cwd = cwd
+        # the turn the calls belong to, their tool.invoke spans go under it
+        self.parent_span = parent_span
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._events : asyncio.Queue[AgentEvent] = asyncio.Queue()
+        self._calls : list[ToolCall] = []
+        self._tasks : list[asyncio.Task[ToolResult]] = []
+        self._last_mutating : asyncio.Task[ToolResult] | None = None
+        self._pending_events : int = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def is_mutating(self, tool_call: ToolCall) -> bool:
+        tool = self.tool_registry.get(tool_call.name)
+        if tool is None:
+            # unknown tools fail fast inside the registry, no need to serialize them
+            return False
+        return tool.is_mutating(tool_call.arguments or {})
+
+    def submit(self, tool_call: ToolCall) -> None:
+        mutating = self.is_mutating(tool_call)
+        if mutating:
+            depends_on = list(self._tasks)
+        else:
+            depends_on = [self._last_mutating] if self._last_mutating else []
+
+        task = asyncio.create_task(self._run(tool_call, depends_on))
+        if mutating:
+            self._last_mutating = task
+
+        self._calls.append(tool_call)
+        self._tasks.append(task)
+        # every call emits exactly one start and one complete event
+        self._pending_events += 2
+
+    async def _run(
+            self,
+            tool_call: ToolCall,
+            depends_on: list[asyncio.Task[ToolResult]],
+            )-> ToolResult:
+        if depends_on:
+            await asyncio.wait(depends_on)
+
+        async with self._semaphore:
+            self._events.put_nowait(
+                AgentEvent.tool_call_start(
+                    tool_call.call_id,
+                    tool_call.name,
+                    tool_call.arguments,
+                )
+            )
+            result : ToolResult | None = None
+            try:
+                result = await self.tool_registry.invoke(
+                    tool_call.name,
+                    tool_call.arguments,
+                    self.cwd,
+                    parent_span=self.parent_span,
+                )
+            finally:
+                if result is None:
+                    result = _cancelled_result(tool_call)
+                self._events.put_nowait(
+                    AgentEvent.tool_call_complete(
+                        tool_call.call_id,
+                        tool_call.name,
+                        result,
+                    )
+                )
+        return result
+
+    # events that are already available, without waiting
+    def poll_events(self) -> list[AgentEvent]:
+        events : list[AgentEvent] = []
+        while not self._events.empty():
+            events.append(self._events.get_nowait())
+        self._pending_events -= len(events)
+        return events
+
+    # yields start/complete events as they happen until every submitted call has finished
+    async def drain(self) -> AsyncGenerator[AgentEvent, None]:
+        while self._pending_events > 0:
+            event = await self._events.get()
+            self._pending_events -= 1
+            yield event
+
+    # one result per submitted call. after cancel(), calls that didn't finish (or never
+    # started) are reported as cancelled, so the history still answers every tool call
+    async def results(self) -> list[ToolResultMessage]:
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+        tool_call_results : list[ToolResultMessage] = []
+        for tool_call, task in zip(self._calls, self._tasks):
+            result = _cancelled_result(tool_call) if task.cancelled() else task.result()
+            tool_call_results.append(
+                ToolResultMessage(
+                    tool_call_id=tool_call.call_id,
+                    content=result.to_model_output(),
+                    is_error=not result.success,
+                )
+            )
+        return tool_call_results
+
+    async def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from client.metrics import StreamMetrics, summarize_stream_metrics
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+# where the wall time of one turn went. tools that were dispatched while the model was
+# still streaming overlap with `model`, so only `tool_wait` (after the stream ended) adds to it
+@dataclass
+class TurnTiming:
+    turn : int
+    _start : float = field(default_factory=time.perf_counter, repr=False)
+    duration : float = 0.0
+    compaction : float = 0.0
+    model : float = 0.0
+    tool_wait : float = 0.0
+    # summed over every tool call, so concurrent calls can add up to more than tool_wait
+    tool_time : float = 0.0
+    tools : list[tuple[str, float]] = field(default_factory=list)
+    stream : StreamMetrics | None = None
+
+    def record_tool(self, name: str, duration: float | None) -> None:
+        if duration is not None:
+            self.tools.append((name, duration))
+            self.tool_time += duration
+
+    def finish(self) -> TurnTiming:
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "duration_ms": _ms(self.duration),
+            "compaction_ms": _ms(self.compaction),
+            "model_ms": _ms(self.model),
+            "tool_wait_ms": _ms(self.tool_wait),
+            "tool_time_ms": _ms(self.tool_time),
+            "stream": self.stream.to_dict() if self.stream else None,
+        }
+
+# every turn of one Agent.run() folded together for agent_end
+@dataclass
+class RunTiming:
+    _start : float = field(default_factory=time.perf_counter, repr=False)
+    turns : list[TurnTiming] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        tools : dict[str, dict[str, Any]] = {}
+        for turn in self.turns:
+            for name, duration in turn.tools:
+                entry = tools.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["calls"] += 1
+                entry["total_ms"] = round(entry["total_ms"] + duration * 1000, 2)
+                entry["max_ms"] = max(entry["max_ms"], _ms(duration))
+
+        return {
+            "wall_ms": _ms(time.perf_counter() - self._start),
+            "turns": len(self.turns),
+            "compaction_ms": _ms(sum(t.compaction for t in self.turns)),
+            "model_ms": _ms(sum(t.model for t in self.turns)),
+            "tool_wait_ms": _ms(sum(t.tool_wait for t in self.turns)),
+            "tool_time_ms": _ms(sum(t.tool_time for t in self.turns)),
+            "model": summarize_stream_metrics([t.stream for t in self.turns if t.stream]),
+            "tools": tools,
+        }
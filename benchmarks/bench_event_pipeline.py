@@ -0,0 +1,131 @@
+# replays one long streamed answer through LLMClient -> Agent -> consumer and measures what
+# the event pipeline itself costs: CPU time, events delivered, peak traced memory and gen0
+# garbage collections (a proxy for allocation churn). the stub runs in a subprocess so its
+# own CPU time isn't counted
+# run from the repo root: python -m benchmarks.bench_event_pipeline --tokens 50000
+import argparse
+import asyncio
+import gc
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from benchmarks.stub_server import CHARS_PER_TOKEN, STUB_MODEL
+from client.transport import close_http_client
+from config.settings import load_config, set_config
+
+PROMPT = "Write a long design document."
+STUB_API_KEY_ENV = "STUB_API_KEY"
+WORDS = (
+    "the agent streams every token through the client, the loop and the renderer so "
+    "any per token cost is paid fifty thousand times in a long answer"
+).split()
+
+def _long_answer(tokens: int) -> str:
+    lines = []
+    size = 0
+    i = 0
+    while size < tokens * CHARS_PER_TOKEN:
+        if i % 120 == 0:
+            lines.append(f"\n## Section {i // 120 + 1}\n\n")
+        line = " ".join(WORDS[(i + j) % len(WORDS)] for j in range(12)) + ".\n"
+        lines.append(line)
+        size += len(line)
+        i += 1
+    return "".join(lines)[:tokens * CHARS_PER_TOKEN]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"stub server didn't start on port {port}")
+
+async def replay() -> dict[str, float]:
+    deltas = 0
+    chars = 0
+    async with Agent() as agent:
+        async for event in agent.run(PROMPT):
+            if event.type == AgentEventType.TEXT_DELTA:
+                deltas += 1
+                chars += len(event.data["content"])
+            elif event.type == AgentEventType.AGENT_ERROR:
+                raise RuntimeError(event.data.get("error"))
+    await close_http_client()
+    return {"deltas": deltas, "chars": chars}
+
+def measure(window: float | None, trace_memory: bool) -> dict[str, float]:
+    set_config(load_config(overrides={
+        "base_url": os.environ["BENCH_BASE_URL"],
+        "model": STUB_MODEL,
+        "api_key_env": STUB_API_KEY_ENV,
+        "stream_coalesce_window": window,
+    }))
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    if trace_memory:
+        tracemalloc.start()
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    result = asyncio.run(replay())
+    result["cpu"] = time.process_time() - cpu
+    result["wall"] = time.perf_counter() - wall
+    result["gen0"] = gc.get_stats()[0]["collections"] - collections
+    if trace_memory:
+        result["peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the per-token cost of the event pipeline")
+    parser.add_argument("--tokens", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--windows", type=float, nargs="*", default=[0.0, 0.01], help="coalescing windows to compare, 0 for off")
+    args = parser.parse_args()
+
+    os.environ.setdefault(STUB_API_KEY_ENV, "stub")
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = Path(tmp) / "long_answer.jsonl"
+        recording.write_text(json.dumps({"content": _long_answer(args.tokens)}) + "\n", encoding="utf-8")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_server", "--port", str(port), "--recording", str(recording)],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for_port(port)
+            os.environ["BENCH_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+            print(f"tokens: {args.tokens}  runs: {args.runs}")
+            for window in args.windows:
+                runs = [measure(window or None, trace_memory=False) for _ in range(args.runs)]
+                best = min(runs, key=lambda r: r["cpu"])
+                memory = measure(window or None, trace_memory=True)
+                label = f"coalesce {window * 1000:.0f}ms" if window else "no coalescing"
+                print(
+                    f"{label:>16}: cpu {best['cpu'] * 1000:8.1f}ms  "
+                    f"per 1k tokens {best['cpu'] * 1000 / (args.tokens / 1000):6.2f}ms  "
+                    f"wall {best['wall'] * 1000:8.1f}ms  deltas {best['deltas']:6}  "
+                    f"gen0 gcs {best['gen0']:5}  peak traced {memory['peak'] / 1024 / 1024:6.1f}MiB"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# time to first token against two stub backends that both have slow outliers: a single
+# endpoint, failover only, and hedging at the p90 of observed first-token times
+# run from the repo root: python -m benchmarks.bench_hedging --requests 200
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stats import percentile
+from benchmarks.stub_server import StubServer
+from client.llm_client import LLMClient
+from client.response import StreamEventType
+from client.transport import close_http_client
+from config.settings import load_config, set_config
+
+STUB_API_KEY_ENV = "STUB_API_KEY"
+RESPONSE = [{"content": "The answer is in agent/agent.py, in the agentic loop."}]
+MESSAGES = [{"role": "user", "content": "Where is the agentic loop?"}]
+
+async def scenario(args: argparse.Namespace, label: str, hedge: bool) -> None:
+    servers = [
+        StubServer(RESPONSE, latency=args.latency, tail_rate=args.tail_rate, tail_latency=args.tail_latency, seed=seed)
+        for seed in (1, 2)
+    ]
+    for server in servers:
+        await server.start()
+    set_config(load_config(overrides={
+        "base_url": servers[0].base_url,
+        "model": "primary",
+        "api_key_env": STUB_API_KEY_ENV,
+        "fallback_endpoints": f"secondary@{servers[1].base_url}",
+        "hedge_percentile": 0.9 if hedge else None,
+        "hedge_initial_delay": args.latency * 4,
+    }))
+
+    client = LLMClient()
+    ttfts : list[float] = []
+    hedged = 0
+    try:
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            first = None
+            async for event in client.chat_completion(MESSAGES):
+                if first is None and event.type == StreamEventType.TEXT_DELTA:
+                    first = time.perf_counter() - start
+                if event.type == StreamEventType.MESSAGE_COMPLETE and event.backend and event.backend.hedged:
+                    hedged += 1
+            ttfts.append(first or 0.0)
+    finally:
+        await close_http_client()
+        for server in servers:
+            await server.close()
+
+    print(
+        f"{label:>16}: ttft p50 {percentile(ttfts, 0.5) * 1000:7.1f}ms  "
+        f"p90 {percentile(ttfts, 0.9) * 1000:7.1f}ms  p99 {percentile(ttfts, 0.99) * 1000:7.1f}ms  "
+        f"hedged {hedged:4}  backend requests {sum(s.requests for s in servers)}"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark hedged model requests")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="usual time to first token")
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="share of slow first tokens")
+    parser.add_argument("--tail-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    os.environ.setdefault(STUB_API_KEY_ENV, "stub")
+    asyncio.run(scenario(args, "no hedging", hedge=False))
+    asyncio.run(scenario(args, "hedge at p90", hedge=True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# end-to-end agent runs against the local stub server: no network, no API key, and the
+# same recorded responses every time, so numbers are comparable between commits
+# run from the repo root: python -m benchmarks.bench_pipeline --runs 20 --token-rate 200
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from benchmarks.stats import percentile
+from benchmarks.stub_server import DEFAULT_RECORDING, STUB_MODEL, StubServer, load_recording
+from client.transport import close_http_client, pool_stats
+from config.settings import load_config, set_config
+
+PROMPT = "Explain how a prompt flows through this code base."
+STUB_API_KEY_ENV = "STUB_API_KEY"
+
+async def run_once() -> dict[str, float]:
+    start = time.perf_counter()
+    first_token : float | None = None
+    tool_calls = 0
+    turns = 0
+    async with Agent() as agent:
+        async for event in agent.run(PROMPT):
+            if event.type == AgentEventType.TEXT_DELTA and first_token is None:
+                first_token = time.perf_counter() - start
+            elif event.type == AgentEventType.TOOL_CALL_COMPLETE:
+                tool_calls += 1
+            elif event.type == AgentEventType.TURN_END:
+                turns += 1
+            elif event.type == AgentEventType.AGENT_ERROR:
+                raise RuntimeError(event.data.get("error"))
+    return {
+        "total": time.perf_counter() - start,
+        "first_token": first_token or 0.0,
+        "tool_calls": tool_calls,
+        "turns": turns,
+    }
+
+def _ms(values: list[float]) -> str:
+    p50 = percentile(values, 0.5) * 1000
+    p95 = percentile(values, 0.95) * 1000
+    return f"p50 {p50:8.1f}ms  p95 {p95:8.1f}ms"
+
+async def bench(args: argparse.Namespace) -> None:
+    server = StubServer(
+        load_recording(args.recording),
+        token_rate=args.token_rate,
+        latency=args.latency,
+    )
+    await server.start()
+    os.environ.setdefault(STUB_API_KEY_ENV, "stub")
+    set_config(load_config(overrides={
+        "base_url": server.base_url,
+        "model": STUB_MODEL,
+        "api_key_env": STUB_API_KEY_ENV,
+    }))
+
+    try:
+        results = [await run_once() for _ in range(args.runs)]
+    finally:
+        await close_http_client()
+        await server.close()
+
+    print(f"runs: {args.runs}  token rate: {args.token_rate or 'unlimited'}  latency: {args.latency}s")
+    print(f"turns per run: {results[0]['turns']}  tool calls per run: {results[0]['tool_calls']}")
+    print(f"first token  {_ms([r['first_token'] for r in results])}")
+    print(f"full run     {_ms([r['total'] for r in results])}")
+    print(f"requests: {server.requests}  pool: {pool_stats()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline against the stub server")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--recording", type=Path, default=DEFAULT_RECORDING)
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens per second, 0 for unlimited")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    asyncio.run(bench(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
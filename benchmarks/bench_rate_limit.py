@@ -0,0 +1,81 @@
+# many agents in one process against a stub that throttles like a provider: compares
+# reacting to 429s (retries only) with pacing requests through the client-side limiter
+# run from the repo root: python -m benchmarks.bench_rate_limit --agents 20
+import argparse
+import asyncio
+import os
+import time
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from benchmarks.stub_server import DEFAULT_RECORDING, STUB_MODEL, StubServer, load_recording
+from client.rate_limit import get_rate_limiter
+from client.transport import close_http_client
+from config.settings import load_config, set_config
+
+PROMPT = "Explain how a prompt flows through this code base."
+STUB_API_KEY_ENV = "STUB_API_KEY"
+
+async def run_agent() -> tuple[int, float, bool]:
+    retries = 0
+    wait = 0.0
+    ok = True
+    async with Agent() as agent:
+        async for event in agent.run(PROMPT):
+            if event.type == AgentEventType.MODEL_RETRY:
+                retries += 1
+                wait += event.data["delay"]
+            elif event.type == AgentEventType.AGENT_ERROR:
+                ok = False
+    return retries, wait, ok
+
+async def scenario(args: argparse.Namespace, limited: bool) -> None:
+    server = StubServer(
+        load_recording(DEFAULT_RECORDING),
+        rpm_limit=args.server_limit,
+        rate_window=1.0,
+    )
+    await server.start()
+    overrides = {
+        "base_url": server.base_url,
+        "model": STUB_MODEL,
+        "api_key_env": STUB_API_KEY_ENV,
+        "max_retries": 20,
+        "retry_base_delay": 0.05,
+        "retry_max_delay": 2.0,
+    }
+    if limited:
+        # the stub allows server_limit requests per second; the limiter gets the same
+        # budget per minute with a one second burst
+        overrides["rate_limit_rpm"] = args.server_limit * 60
+        overrides["rate_limit_burst_seconds"] = 1.0
+    set_config(load_config(overrides=overrides))
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run_agent() for _ in range(args.agents)))
+        limiter = get_rate_limiter()
+    finally:
+        await close_http_client()
+        await server.close()
+    elapsed = time.perf_counter() - start
+
+    label = "client limiter" if limited else "retries only"
+    print(
+        f"{label:>15}: {elapsed:6.2f}s  requests {server.requests:4}  429s {server.errors:4}  "
+        f"retry wait {sum(r[1] for r in results):7.2f}s  failed agents {sum(not r[2] for r in results)}"
+    )
+    if limiter is not None:
+        print(f"{'':>15}  limiter: {limiter.snapshot()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark client-side rate limiting")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--server-limit", type=int, default=10, help="requests per second the stub accepts")
+    args = parser.parse_args()
+    os.environ.setdefault(STUB_API_KEY_ENV, "stub")
+    asyncio.run(scenario(args, limited=False))
+    asyncio.run(scenario(args, limited=True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# CPU spent rendering a streamed answer in the TUI, per 10k tokens: printing every delta
+# through Rich (how the TUI used to stream), the frame-rate-limited markdown renderer on a
+# terminal, and plain writes when stdout is not a terminal. output goes to an in-memory
+# file, so only rendering is measured, not the terminal drawing it
+# run from the repo root: python -m benchmarks.bench_render --tokens 10000 --token-rate 2000
+import argparse
+import io
+import time
+
+from rich.console import Console
+
+from benchmarks.bench_event_pipeline import _long_answer
+from benchmarks.stub_server import CHARS_PER_TOKEN
+from ui.renderer import AGENT_THEME, DEFAULT_MAX_FPS, TUI
+
+# deltas are fed in batches with a sleep in between to keep the token rate
+BATCH_TOKENS = 20
+
+def _console(terminal: bool) -> Console:
+    return Console(
+        file=io.StringIO(),
+        theme=AGENT_THEME,
+        highlight=False,
+        force_terminal=terminal,
+        width=100,
+        height=40,
+    )
+
+def _deltas(tokens: int) -> list[str]:
+    text = _long_answer(tokens)
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+def _feed(deltas: list[str], write, token_rate: float) -> None:
+    interval = BATCH_TOKENS / token_rate if token_rate else 0.0
+    for start in range(0, len(deltas), BATCH_TOKENS):
+        for delta in deltas[start:start + BATCH_TOKENS]:
+            write(delta)
+        if interval:
+            time.sleep(interval)
+
+def per_delta_print(deltas: list[str], token_rate: float, max_fps: float) -> None:
+    console = _console(terminal=True)
+    _feed(deltas, lambda delta: console.print(delta, end="", markup=False), token_rate)
+
+def buffered(deltas: list[str], token_rate: float, max_fps: float, terminal: bool = True) -> None:
+    tui = TUI(console=_console(terminal), max_fps=max_fps)
+    tui.begin_assistant()
+    _feed(deltas, tui.stream_assistant_delta, token_rate)
+    tui.end_assistant()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark TUI rendering cost of streamed text")
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--token-rate", type=float, default=2000, help="tokens per second, 0 to feed as fast as possible")
+    parser.add_argument("--max-fps", type=float, default=DEFAULT_MAX_FPS)
+    args = parser.parse_args()
+
+    deltas = _deltas(args.tokens)
+    scenarios = [
+        ("per-delta print", per_delta_print),
+        ("buffered terminal", buffered),
+        ("plain (no tty)", lambda d, r, f: buffered(d, r, f, terminal=False)),
+    ]
+    print(f"tokens: {args.tokens}  token rate: {args.token_rate or 'unlimited'}  max fps: {args.max_fps}")
+    for label, render in scenarios:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        render(deltas, args.token_rate, args.max_fps)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        print(
+            f"{label:>18}: cpu {cpu * 1000:8.1f}ms  per 10k tokens {cpu * 1000 * 10_000 / args.tokens:8.1f}ms  "
+            f"wall {wall:6.2f}s"
+        )
+
+if __name__ == "__main__":
+    main()
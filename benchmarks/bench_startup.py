@@ -0,0 +1,78 @@
+# cold-start regression check: runs each startup path in a fresh interpreter and compares
+# the median wall time against a budget, then lists the packages that took longest to import
+# on that path, from python -X importtime. exits 1 when a path is over its budget, so it can
+# gate CI
+# run from the repo root: python -m benchmarks.bench_startup --runs 5
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name -> (code run with python -c, budget in ms). the budgets leave headroom over a warm
+# disk cache on a laptop; a path going over means something heavy is imported eagerly again
+SCENARIOS = {
+    # click parses --help before anything else is loaded
+    "cli --help": ("import sys; sys.argv = ['main.py', '--help']\ntry:\n    import main; main.main()\nexcept SystemExit:\n    pass", 150),
+    # everything the jsonl output path needs before the first event is written
+    "jsonl writer": ("import main; main.CLI(output='jsonl')", 150),
+    # an Agent ready to send its first request: client, tools, context. the tokenizer
+    # loads in the background and is not part of this. most of the time is the openai sdk
+    # (~400ms here) and the httpx it imports, whose cli module eagerly pulls in click, rich and
+    # pygments; nothing in the repo imports rich or tiktoken on this path, so the floor moves
+    # with the installed openai/httpx versions rather than with our code
+    "agent ready": ("from agent.agent import Agent; Agent()", 1100),
+}
+
+def _run(code: str, importtime: bool = False) -> tuple[float, str]:
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    result = subprocess.run(args + ["-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"startup failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+def _slowest_packages(stderr: str, count: int) -> list[tuple[int, str]]:
+    # "import time: self [us] | cumulative | imported package". self times are summed per
+    # top level package, so nested imports aren't counted twice
+    totals : dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    return sorted(((total, package) for package, total in totals.items()), reverse=True)[:count]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CLI cold-start time against a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest packages to list per path")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. for slow CI machines")
+    args = parser.parse_args()
+
+    # one throwaway run so the first scenario doesn't pay for a cold disk cache
+    _run("import main")
+    over = []
+    for name, (code, budget) in SCENARIOS.items():
+        budget *= args.budget_scale
+        median = statistics.median(_run(code)[0] for _ in range(args.runs)) * 1000
+        status = "ok" if median <= budget else "OVER BUDGET"
+        if median > budget:
+            over.append(name)
+        print(f"{name:>14}: median {median:7.1f}ms  budget {budget:7.1f}ms  {status}")
+        for total, package in _slowest_packages(_run(code, importtime=True)[1], args.top):
+            print(f"{'':>16}{total / 1000:7.1f}ms  {package}")
+    if over:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
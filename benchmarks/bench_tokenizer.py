@@ -0,0 +1,67 @@
+# compares the old per-call tokenizer lookup against the cached registry
+# run from the repo root: python -m benchmarks.bench_tokenizer
+import random
+import time
+
+import tiktoken
+
+from utils.text import count_tokens, count_tokens_many, get_encoding
+
+MODEL = "mistralai/devstral-2512:free"
+NUM_MESSAGES = 10_000
+
+def old_count_tokens(text: str, model: str) -> int:
+    # the implementation before the registry: resolve the encoding on every call
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
+
+def make_messages(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = [
+        "def", "return", "self", "context", "message", "tool_call", "async", "await",
+        "import", "for", "in", "if", "else", "token", "count", "path", "=", "(", ")",
+        "café", "naïve", "→", "数据",
+    ]
+    messages = []
+    for _ in range(count):
+        length = rng.randint(5, 400)
+        messages.append(" ".join(rng.choice(words) for _ in range(length)))
+    return messages
+
+def bench(label: str, fn, messages: list[str]) -> float:
+    start = time.perf_counter()
+    total = fn(messages)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   {total:>10} tokens")
+    return elapsed
+
+def main() -> None:
+    if get_encoding(MODEL) is None:
+        print("tokenizer unavailable (offline?), only estimates would be measured")
+        return
+
+    messages = make_messages(NUM_MESSAGES)
+    print(f"{NUM_MESSAGES} messages, {sum(map(len, messages)) / 1e6:.1f}M chars")
+
+    old = bench(
+        "old count_tokens (uncached)",
+        lambda msgs: sum(old_count_tokens(m, MODEL) for m in msgs),
+        messages,
+    )
+    new = bench(
+        "count_tokens (cached)",
+        lambda msgs: sum(count_tokens(m, MODEL) for m in msgs),
+        messages,
+    )
+    batch = bench(
+        "count_tokens_many",
+        lambda msgs: sum(count_tokens_many(msgs, MODEL)),
+        messages,
+    )
+    print(f"speedup: cached {old / new:.1f}x, batched {old / batch:.1f}x")
+
+if __name__ == "__main__":
+    main()
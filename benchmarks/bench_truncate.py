@@ -0,0 +1,77 @@
+# compares the old per-line / binary-search truncation with the windowed engine
+# run from the repo root: python -m benchmarks.bench_truncate
+import time
+
+from utils.text import TruncationStrategy, count_tokens, get_encoding, truncate_text
+
+MODEL = "mistralai/devstral-2512:free"
+MAX_TOKENS = 25_000
+SIZES_MB = (1, 4, 10)
+SUFFIX = "\n... [truncated]"
+
+def old_truncate_by_lines(text: str, target_tokens: int) -> str:
+    lines = text.split("\n")
+    result_lines: list[str] = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = count_tokens(line + "\n", MODEL)
+        if current_tokens + line_tokens > target_tokens:
+            break
+        result_lines.append(line)
+        current_tokens += line_tokens
+    if not result_lines:
+        return old_truncate_by_chars(text, target_tokens)
+    return "\n".join(result_lines) + SUFFIX
+
+def old_truncate_by_chars(text: str, target_tokens: int) -> str:
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid], MODEL) <= target_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + SUFFIX
+
+def old_truncate_text(text: str, preserve_lines: bool) -> str:
+    if count_tokens(text, MODEL) <= MAX_TOKENS:
+        return text
+    target_tokens = MAX_TOKENS - count_tokens(SUFFIX, MODEL)
+    if preserve_lines:
+        return old_truncate_by_lines(text, target_tokens)
+    return old_truncate_by_chars(text, target_tokens)
+
+def make_text(size_mb: int) -> str:
+    lines = []
+    size = 0
+    i = 0
+    while size < size_mb * 1024 * 1024:
+        line = f"{i:6}|    result = process_item(items[{i}], context=ctx, retries={i % 5})  # step"
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+def main() -> None:
+    if get_encoding(MODEL) is None:
+        print("tokenizer unavailable (offline?), only estimates would be measured")
+        return
+
+    print(f"{'size':>6} {'old lines':>11} {'old chars':>11} {'head':>9} {'tail':>9} {'head_tail':>10}")
+    for size_mb in SIZES_MB:
+        text = make_text(size_mb)
+        row = [
+            timed(lambda: old_truncate_text(text, preserve_lines=True)),
+            timed(lambda: old_truncate_text(text, preserve_lines=False)),
+        ]
+        for strategy in TruncationStrategy:
+            row.append(timed(lambda: truncate_text(text, MAX_TOKENS, MODEL, strategy=strategy)))
+        print(f"{size_mb:>4}MB " + " ".join(f"{ms:>9.0f}ms" for ms in row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# summary statistics shared by the benchmarks
+import math
+
+def percentile(values: list[float], fraction: float) -> float:
+    # nearest rank: the smallest sample with at least `fraction` of the samples at or below it
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
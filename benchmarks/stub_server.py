@@ -0,0 +1,397 @@
+# local OpenAI-compatible endpoint that replays recorded chat completions, so the whole
+# agent pipeline can be exercised and benchmarked offline and deterministically.
+# run from the repo root: python -m benchmarks.stub_server --port 8765
+# then point the agent at it: AGENT_BASE_URL=http://127.0.0.1:8765/v1 python main.py "..."
+#
+# recordings are JSONL, one response per line, in either form:
+#   {"content": "text", "tool_calls": [{"name": "read_file", "arguments": {"path": "main.py"}}]}
+#   {"chunks": [<raw chat.completion.chunk objects as captured from a provider>]}
+# a request gets the response at the index of its turn (the number of assistant messages
+# already in it), so a multi-turn agent run walks through the file in order
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_RECORDING = Path(__file__).parent / "recordings" / "agent_session.jsonl"
+STUB_MODEL = "stub-model"
+# responses are cut into pseudo tokens of this many characters
+CHARS_PER_TOKEN = 4
+
+def load_recording(path: Path) -> list[dict[str, Any]]:
+    responses = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            responses.append(json.loads(line))
+    if not responses:
+        raise ValueError(f"Recording {path} has no responses")
+    return responses
+
+def _pieces(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class StubServer:
+    def __init__(
+            self,
+            responses: list[dict[str, Any]],
+            token_rate: float = 0.0,
+            latency: float = 0.0,
+            chunk_tokens: int = 1,
+            error_rate: float = 0.0,
+            error_status: int = 429,
+            retry_after: float | None = None,
+            disconnect_rate: float = 0.0,
+            rpm_limit: int | None = None,
+            rate_window: float = 60.0,
+            tail_rate: float = 0.0,
+            tail_latency: float = 0.0,
+            seed: int = 0,
+            )-> None:
+        self.responses = responses
+        # generated tokens per second, 0 streams as fast as the socket allows
+        self.token_rate = token_rate
+        # seconds before the first chunk, i.e. the time to first token
+        self.latency = latency
+        self.chunk_tokens = max(1, chunk_tokens)
+        # fault injection: share of requests answered with error_status (plus a
+        # Retry-After header when retry_after is set), and share of streams cut off halfway
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.disconnect_rate = disconnect_rate
+        self._rng = random.Random(seed)
+        # slow outliers: this share of requests waits tail_latency before the first token
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        # provider-style throttling: more than rpm_limit requests in a sliding window
+        # (a minute unless rate_window says otherwise) get a 429
+        self.rpm_limit = rpm_limit
+        self.rate_window = rate_window
+        self._recent : collections.deque[float] = collections.deque()
+        self.requests = 0
+        self.errors = 0
+        self.disconnects = 0
+        self._server : asyncio.Server | None = None
+        self.host = DEFAULT_HOST
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = 0) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    # -- http/1.1 with keep-alive, just enough for httpx --
+
+    async def _handle_connection(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter,
+            )-> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers : dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", "0"))
+                body = await reader.readexactly(length) if length else b""
+
+                await self._route(method, target.split("?", 1)[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # the event loop is shutting down with the connection still open
+            pass
+        finally:
+            writer.close()
+
+    async def _route(
+            self,
+            method: str,
+            path: str,
+            body: bytes,
+            writer: asyncio.StreamWriter,
+            )-> None:
+        if method == "POST" and path.endswith("/chat/completions"):
+            self.requests += 1
+            throttle = self._throttle()
+            if throttle is not None:
+                self.errors += 1
+                self._write_json(
+                    writer,
+                    {"error": {"message": "Rate limit exceeded", "code": 429}},
+                    status=429,
+                    extra={"Retry-After": f"{throttle:.3f}"},
+                )
+            elif self.error_rate and self._rng.random() < self.error_rate:
+                self.errors += 1
+                extra = {"Retry-After": f"{self.retry_after:g}"} if self.retry_after is not None else {}
+                self._write_json(
+                    writer,
+                    {"error": {"message": "Injected failure", "code": self.error_status}},
+                    status=self.error_status,
+                    extra=extra,
+                )
+            else:
+                await self._chat_completion(json.loads(body or b"{}"), writer)
+        elif method == "GET" and path.endswith("/models"):
+            self._write_json(writer, {"object": "list", "data": [{"id": STUB_MODEL, "object": "model"}]})
+        elif method == "HEAD":
+            # connection prewarm
+            self._write_head(writer, 200, "application/json", {"Content-Length": "0"})
+        else:
+            self._write_json(writer, {"error": {"message": f"Not found: {method} {path}"}}, status=404)
+        await writer.drain()
+
+    def _write_head(
+            self,
+            writer: asyncio.StreamWriter,
+            status: int,
+            content_type: str,
+            extra: dict[str, str],
+            )-> None:
+        reason = {
+            200: "OK",
+            404: "Not Found",
+            429: "Too Many Requests",
+            500: "Internal Server Error",
+            503: "Service Unavailable",
+        }.get(status, "Error")
+        lines = [f"HTTP/1.1 {status} {reason}", f"Content-Type: {content_type}"]
+        lines += [f"{name}: {value}" for name, value in extra.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    def _write_json(
+            self,
+            writer: asyncio.StreamWriter,
+            payload: Any,
+            status: int = 200,
+            extra: dict[str, str] | None = None,
+            )-> None:
+        data = json.dumps(payload).encode("utf-8")
+        self._write_head(writer, status, "application/json", {"Content-Length": str(len(data)), **(extra or {})})
+        writer.write(data)
+
+    def _throttle(self) -> float | None:
+        # seconds until the window has room again, None when the request is admitted
+        if self.rpm_limit is None:
+            return None
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= self.rate_window:
+            self._recent.popleft()
+        if len(self._recent) >= self.rpm_limit:
+            return self.rate_window - (now - self._recent[0])
+        self._recent.append(now)
+        return None
+
+    # -- chat completions --
+
+    def _pick_response(self, request: dict[str, Any]) -> dict[str, Any]:
+        turn = sum(1 for m in request.get("messages", []) if m.get("role") == "assistant")
+        return self.responses[min(turn, len(self.responses) - 1)]
+
+    def _usage(self, request: dict[str, Any], completion_tokens: int) -> dict[str, int]:
+        prompt_chars = sum(len(json.dumps(m.get("content") or "")) for m in request.get("messages", []))
+        prompt_tokens = prompt_chars // CHARS_PER_TOKEN
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _deltas(self, response: dict[str, Any]) -> list[tuple[dict[str, Any], int]]:
+        # (delta, pseudo tokens it carries) in streaming order
+        size = CHARS_PER_TOKEN * self.chunk_tokens
+        deltas = [
+            ({"role": "assistant", "content": piece}, len(piece) // CHARS_PER_TOKEN or 1)
+            for piece in _pieces(response.get("content") or "", size)
+        ]
+        for index, call in enumerate(response.get("tool_calls", [])):
+            arguments = call.get("arguments", {})
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            deltas.append(({"tool_calls": [{
+                "index": index,
+                "id": call.get("id") or f"call_stub_{index}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": ""},
+            }]}, 1))
+            for piece in _pieces(arguments, size):
+                deltas.append(({"tool_calls": [{
+                    "index": index,
+                    "function": {"arguments": piece},
+                }]}, len(piece) // CHARS_PER_TOKEN or 1))
+        return deltas
+
+    def _chunks(self, request: dict[str, Any], response: dict[str, Any]) -> list[tuple[dict[str, Any], int]]:
+        if "chunks" in response:
+            return [(chunk, 1) for chunk in response["chunks"]]
+
+        base = {
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model") or STUB_MODEL,
+        }
+        deltas = self._deltas(response)
+        finish_reason = "tool_calls" if response.get("tool_calls") else "stop"
+        chunks = [
+            ({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}, tokens)
+            for delta, tokens in deltas
+        ]
+        chunks.append(({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}, 0))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            completion_tokens = sum(tokens for _, tokens in deltas)
+            chunks.append(({**base, "choices": [], "usage": self._usage(request, completion_tokens)}, 0))
+        return chunks
+
+    def _first_token_delay(self) -> float:
+        if self.tail_rate and self._rng.random() < self.tail_rate:
+            return self.tail_latency
+        return self.latency
+
+    async def _chat_completion(self, request: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        response = self._pick_response(request)
+        latency = self._first_token_delay()
+        if not request.get("stream"):
+            await asyncio.sleep(latency)
+            self._write_json(writer, self._full_completion(request, response))
+            return
+
+        self._write_head(writer, 200, "text/event-stream", {
+            "Transfer-Encoding": "chunked",
+            "Cache-Control": "no-cache",
+        })
+        await writer.drain()
+        await asyncio.sleep(latency)
+
+        chunks = self._chunks(request, response)
+        cut_at = None
+        if self.disconnect_rate and self._rng.random() < self.disconnect_rate:
+            cut_at = len(chunks) // 2
+
+        # chunks follow an absolute schedule so sleep overshoot doesn't accumulate
+        start = time.perf_counter()
+        emitted = 0
+        for i, (chunk, tokens) in enumerate(chunks):
+            if i == cut_at:
+                # drop the connection without the terminating chunk
+                self.disconnects += 1
+                raise ConnectionAbortedError("injected disconnect")
+            if self.token_rate > 0 and tokens:
+                delay = start + emitted / self.token_rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                emitted += tokens
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await writer.drain()
+
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+    def _full_completion(self, request: dict[str, Any], response: dict[str, Any]) -> dict[str, Any]:
+        tool_calls = [
+            {
+                "id": call.get("id") or f"call_stub_{index}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"] if isinstance(call.get("arguments"), str)
+                    else json.dumps(call.get("arguments", {})),
+                },
+            }
+            for index, call in enumerate(response.get("tool_calls", []))
+        ]
+        content = response.get("content") or None
+        message : dict[str, Any] = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model") or STUB_MODEL,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": self._usage(request, len(content or "") // CHARS_PER_TOKEN),
+        }
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = StubServer(
+        load_recording(args.recording),
+        token_rate=args.token_rate,
+        latency=args.latency,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        disconnect_rate=args.disconnect_rate,
+        rpm_limit=args.rpm_limit,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        seed=args.seed,
+    )
+    await server.start(args.host, args.port)
+    print(f"stub server listening on {server.base_url} ({len(server.responses)} recorded responses)")
+    await server.serve_forever()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub that replays recorded completions")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--recording", type=Path, default=DEFAULT_RECORDING)
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens per second, 0 for unlimited")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="tokens per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with failures")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="share of streams cut off halfway")
+    parser.add_argument("--rpm-limit", type=int, default=None, help="answer 429 above this many requests per minute")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="share of requests with a slow first token")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="seconds before the first token of those")
+    parser.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
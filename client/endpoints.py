@@ -0,0 +1,69 @@
+from __future__ import annotations
+import collections
+import math
+from dataclasses import dataclass, field
+from typing import Any
+
+# recent first-token times kept per endpoint for the hedging percentile
+TTFT_WINDOW = 50
+# below this many samples the percentile is too noisy, hedge_initial_delay is used instead
+HEDGE_MIN_SAMPLES = 5
+
+@dataclass
+class EndpointStats:
+    requests : int = 0
+    failures : int = 0
+    # streams this endpoint finished for the caller
+    wins : int = 0
+    # requests sent as the hedge against a slow first request
+    hedges : int = 0
+    ttfts : collections.deque[float] = field(default_factory=lambda: collections.deque(maxlen=TTFT_WINDOW))
+
+    def record_ttft(self, ttft: float) -> None:
+        self.ttfts.append(ttft)
+
+    def ttft_percentile(self, percentile: float) -> float | None:
+        if len(self.ttfts) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.ttfts)
+        rank = max(0, math.ceil(percentile * len(ordered)) - 1)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def to_dict(self) -> dict[str, Any]:
+        ordered = sorted(self.ttfts)
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "wins": self.wins,
+            "hedges": self.hedges,
+            "ttft_p50": round(ordered[len(ordered) // 2], 4) if ordered else None,
+            "ttft_p90": round(ordered[min(len(ordered) - 1, math.ceil(0.9 * len(ordered)) - 1)], 4) if ordered else None,
+        }
+
+# which backend answered one chat_completion, attached to its MESSAGE_COMPLETE event
+@dataclass
+class BackendReport:
+    endpoint : str | None = None
+    # first-token time of every backend that got that far in this call; a hedge that lost
+    # before its first token is listed as None
+    ttft_by_backend : dict[str, float | None] = field(default_factory=dict)
+    hedged : bool = False
+    hedge_delay : float | None = None
+    failovers : int = 0
+
+    @property
+    def ttft(self) -> float | None:
+        return self.ttft_by_backend.get(self.endpoint) if self.endpoint else None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "ttft": round(self.ttft, 4) if self.ttft is not None else None,
+            "ttft_by_backend": {
+                name: round(ttft, 4) if ttft is not None else None
+                for name, ttft in self.ttft_by_backend.items()
+            },
+            "hedged": self.hedged,
+            "hedge_delay": round(self.hedge_delay, 4) if self.hedge_delay is not None else None,
+            "failovers": self.failovers,
+        }
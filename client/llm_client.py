@@ -1,43 +1,83 @@
-import os
+import httpx
 from openai import AsyncOpenAI
-from dotenv import load_dotenv
 from typing import Any
-from typing import AsyncGenerator
-from client.response import StreamEventType, TextDelta, TokenUsage, StreamEvent, ToolCall, ToolCallDelta, parse_tool_call_arguments
+from typing import AsyncGenerator, Callable
+from client.response import StreamEventType, TextBuffer, TextDelta, TokenUsage, StreamEvent, ToolCall, ToolCallDelta, is_complete_json_object, parse_tool_call_arguments
+from client.transport import get_http_client
+from client.prompt_cache import apply_cache_breakpoints, supports_cache_control
+from client.rate_limit import RateLimiter, RequestPriority, get_rate_limiter
+from client.endpoints import BackendReport, EndpointStats
+from client.metrics import StreamMetrics
+from client.retry import RetryAttempt, RetryPolicy, RetryState, RetryStats, StreamDivergedError, StreamResumer
+from config.settings import Config, Endpoint, get_config
+from utils.text import estimate_tokens
+from utils.tracing import Span, get_tracer
 from openai import RateLimitError,APIConnectionError,APIError
 import asyncio
-
-load_dotenv()
+import json
+import time
+from contextlib import aclosing
 
 class LLMClient:
-    def __init__(self) ->None:
-        self._client: AsyncOpenAI | None = None
-        self._max_retries : int = 3
-
-    # Singleton pattern to ensure only one client instance
-    def get_client(self) -> AsyncOpenAI:
-        if self._client is None:
-            self._client = AsyncOpenAI(
-                api_key=os.getenv("OPENROUTER_API_KEY"),
-                base_url="https://openrouter.ai/api/v1",
+    def __init__(
+            self,
+            config: Config | None = None,
+            retry_policy: RetryPolicy | None = None,
+            rate_limiter: RateLimiter | None = None,
+            ) ->None:
+        # endpoint, model, timeouts and retries; defaults to the process-wide config
+        self.config : Config = config or get_config()
+        # the configured endpoint first, then the fallbacks in order
+        self.endpoints : tuple[Endpoint, ...] = self.config.endpoints
+        self._clients : dict[Endpoint, AsyncOpenAI] = {}
+        self.endpoint_stats : dict[str, EndpointStats] = {
+            endpoint.name: EndpointStats() for endpoint in self.endpoints
+        }
+        self.retry_policy : RetryPolicy = retry_policy or RetryPolicy.from_config(self.config)
+        # cumulative over every chat_completion of this client
+        self.retry_stats = RetryStats()
+        # None uses the limiter shared by every client on the event loop (if limits are configured)
+        self.rate_limiter = rate_limiter
+        self.priority = RequestPriority[self.config.request_priority.upper()]
+
+    # one AsyncOpenAI per endpoint, created on first use
+    def get_client(self, endpoint: Endpoint | None = None) -> AsyncOpenAI:
+        endpoint = endpoint or self.endpoints[0]
+        if endpoint not in self._clients:
+            self._clients[endpoint] = AsyncOpenAI(
+                api_key=endpoint.api_key,
+                base_url=endpoint.base_url,
+                timeout=httpx.Timeout(
+                    self.config.request_timeout,
+                    connect=self.config.connect_timeout,
+                ),
+                # connections come from the process-wide pool shared by every LLMClient
+                http_client=get_http_client(),
+                # retries are handled by self.retry_policy, the SDK's own would stack on top
+                max_retries=0,
             )
-        return self._client
+        return self._clients[endpoint]
     
-    # Gracefully close the client session
+    # Gracefully close the client session. the pooled connections stay open for other
+    # clients, close_http_client() shuts the pool down at process exit
     async def close(self) -> None:
-        if self._client:
-            await self._client.close()
-            self._client = None
+        self._clients = {}
+
+    def backend_stats(self) -> dict[str, Any]:
+        return {name: stats.to_dict() for name, stats in self.endpoint_stats.items()}
     
     def _build_tools(self, tools: list[dict[str,Any]]):
+        # ToolRegistry.get_schemas() already returns the provider format, pass it through as is
+        if all(tool.get('type') == 'function' for tool in tools):
+            return tools
         return [
-            {
+            tool if tool.get('type') == 'function' else {
                 'type': 'function',
                 'function' : {
                     'name': tool['name'],
                     'description': tool.get('description',''),
                     'parameters': tool.get(
-                        "paramters",
+                        "parameters",
                         {
                             "type": "object",
                             "properties": {},
@@ -48,154 +88,493 @@ class LLMClient:
             } for tool in tools
         ]
 
-    async def chat_completion(
+    def _request_kwargs(
             self,
+            endpoint: Endpoint,
             messages: list[dict[str, Any]],
-            tools: list[dict[str, Any]] | None = None,
-            stream: bool = True,
-            )-> AsyncGenerator[StreamEvent, None]:
-        client = self.get_client()
+            tools: list[dict[str, Any]] | None,
+            stream: bool,
+            )-> dict[str, Any]:
+        if supports_cache_control(endpoint.model):
+            messages = apply_cache_breakpoints(messages)
         kwargs = {
-                    "model": "mistralai/devstral-2512:free",
+                    "model": endpoint.model,
                     "messages": messages,
                     "stream": stream,
 
                 }
+        if stream:
+            # usage is only sent on the final chunk when asked for explicitly
+            kwargs["stream_options"] = {"include_usage": True}
         if tools:
-            kwargs["tools"] = self._build_tools(tools)
+            kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
+        return kwargs
 
-        for attempt in range(self._max_retries+1):
-            try:
-                if stream:
-                    async for event in self._stream_response(client=client, kwargs=kwargs):
-                        yield event
-                else:
-                    event = await self._non_stream_response(client=client, kwargs=kwargs)
-                    yield event  # yield the single event for non-streaming response
-                    #Note : differnce between yield and return is that yield allows the function to be a generator, producing a series of values over time, whereas return exits the function and provides a single value.
-                return
-            except RateLimitError as e:
-                if attempt < self._max_retries:
-                    # Exponential backoff before retrying
-                    # attemmpt -> failed
-                    #  1s -> failed
-                    #  2s -> failed
-                    #  4s -> failed
-                    #  exponential backoff = 2 ** attempt
-                    wait_time = 2 ** attempt
-                    await asyncio.sleep(wait_time)
+    def _hedge_delay(self, endpoint: Endpoint) -> float | None:
+        if self.config.hedge_percentile is None:
+            return None
+        observed = self.endpoint_stats[endpoint.name].ttft_percentile(self.config.hedge_percentile)
+        if observed is None:
+            return self.config.hedge_initial_delay
+        return max(self.config.hedge_min_delay, observed)
+
+    def _next_endpoint(self, tried: set[Endpoint]) -> Endpoint | None:
+        return next((endpoint for endpoint in self.endpoints if endpoint not in tried), None)
+
+    async def chat_completion(
+            self,
+            messages: list[dict[str, Any]],
+            tools: list[dict[str, Any]] | None = None,
+            stream: bool = True,
+            prompt_tokens: int | None = None,
+            priority: RequestPriority | None = None,
+            parent_span: Span | None = None,
+            )-> AsyncGenerator[StreamEvent, None]:
+        # prompt_tokens is what the rate limiter reserves against the tokens-per-minute
+        # budget; callers with a ContextManager pass its running total, otherwise it is estimated
+        span = get_tracer().span(
+            "llm.chat_completion",
+            parent=parent_span,
+            # not the active span: the caller runs between our yields
+            activate=False,
+            model=self.endpoints[0].model,
+            messages=len(messages),
+            stream=stream,
+        )
+        with span:
+            built_tools = self._build_tools(tools) if tools else None
+
+            state = RetryState()
+            # only what the consumer hasn't seen yet is yielded when an attempt is retried
+            resumer = StreamResumer()
+            report = BackendReport()
+            self.retry_stats.requests += 1
+
+            limiter = self.rate_limiter or get_rate_limiter(self.config)
+            if prompt_tokens is None:
+                prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) for m in messages)
+
+            span.set_attribute("prompt_tokens_estimate", prompt_tokens)
+
+            def attempt(endpoint: Endpoint, hedge: bool = False) -> AsyncGenerator[StreamEvent, None]:
+                return self._attempt(
+                    endpoint,
+                    self._request_kwargs(endpoint, messages, built_tools, stream),
+                    limiter,
+                    prompt_tokens,
+                    priority or self.priority,
+                    report,
+                    span,
+                    attempt=state.retries,
+                    hedge=hedge,
+                )
+
+            # endpoints already tried since the last backoff; failing over to the next one
+            # doesn't wait, only a full round of failures does
+            tried : set[Endpoint] = set()
+            endpoint = self.endpoints[0]
+
+            while True:
+                resumer.restart()
+                tried.add(endpoint)
+                hedge_delay = self._hedge_delay(endpoint) if stream and not resumer.emitted_anything else None
+                if hedge_delay is not None:
+                    source = self._race(attempt, endpoint, self._next_endpoint(tried) or endpoint, hedge_delay, report, tried)
                 else:
-                    yield StreamEvent(
-                        type=StreamEventType.ERROR,
-                        error=f"Rate limit exceeded after {self._max_retries} retries: {str(e)}"
-                    )
+                    report.endpoint = endpoint.name
+                    source = attempt(endpoint)
+
+                try:
+                    async for event in source:
+                        if event.type == StreamEventType.MESSAGE_COMPLETE:
+                            self.endpoint_stats[report.endpoint].wins += 1
+                            event.backend = report
+                            if span.recording:
+                                self._trace_completion(span, event, report, state)
+                        event = resumer.filter(event)
+                        if event is not None:
+                            yield event
                     return
-            except APIConnectionError as e:
-                if attempt < self._max_retries:
-                    wait_time = 2 ** attempt
-                    await asyncio.sleep(wait_time)
-                else:
+                except StreamDivergedError as e:
+                    self.retry_stats.gave_up += 1
+                    span.set_error(f"stream diverged: {e}")
                     yield StreamEvent(
                         type=StreamEventType.ERROR,
-                        error=f"API connection error after {self._max_retries} retries: {str(e)}"
+                        error=f"Stream could not be resumed after {state.retries} retries: {str(e)}"
                     )
                     return
-            except APIError as e:
-                yield StreamEvent(
-                        type=StreamEventType.ERROR,
-                        error=f"API connection error after {self._max_retries} retries: {str(e)}"
-                    )
-                return
-        
+                except (APIError, httpx.TransportError) as e:
+                    # a stream that already showed output stays on its endpoint so it can resume
+                    if not resumer.emitted_anything:
+                        next_endpoint = self._next_endpoint(tried)
+                        if next_endpoint is not None and self.retry_policy.should_failover(e):
+                            report.failovers += 1
+                            span.add_event("failover", endpoint=next_endpoint.name, error=str(e))
+                            yield StreamEvent(
+                                type=StreamEventType.RETRY,
+                                retry=RetryAttempt(
+                                    attempt=state.retries,
+                                    delay=0.0,
+                                    error=str(e),
+                                    status_code=getattr(e, "status_code", None),
+                                    endpoint=next_endpoint.name,
+                                    failover=True,
+                                ),
+                            )
+                            endpoint = next_endpoint
+                            continue
+
+                    retry = self.retry_policy.plan(e, state)
+                    if retry is None:
+                        if state.retries or self.retry_policy.should_retry(e):
+                            self.retry_stats.gave_up += 1
+                        span.set_attribute("retries", state.retries)
+                        span.set_error(f"{self._describe_error(e)}: {e}")
+                        yield StreamEvent(
+                            type=StreamEventType.ERROR,
+                            error=f"{self._describe_error(e)} after {state.retries} retries: {str(e)}"
+                        )
+                        return
+
+                    retry.resumed = resumer.emitted_anything
+                    if not retry.resumed:
+                        # a new round starts back at the preferred endpoint
+                        tried.clear()
+                        endpoint = self.endpoints[0]
+                    retry.endpoint = endpoint.name
+                    self.retry_stats.record(retry)
+                    if limiter is not None and isinstance(e, RateLimitError):
+                        # hold back every client sharing the limiter, not just this one
+                        limiter.pause(retry.delay)
+                    span.add_event("retry", **retry.to_dict())
+                    yield StreamEvent(type=StreamEventType.RETRY, retry=retry)
+                    await asyncio.sleep(retry.delay)
+                finally:
+                    # our consumer stopping early (or being cancelled) has to close the
+                    # response now, not whenever the suspended generator is collected
+                    await source.aclose()
+
+    def _trace_completion(
+            self,
+            span: Span,
+            event: StreamEvent,
+            report: BackendReport,
+            state: RetryState,
+            ) -> None:
+        usage = event.usage
+        span.set_attributes(
+            endpoint=report.endpoint,
+            hedged=report.hedged,
+            failovers=report.failovers,
+            retries=state.retries,
+            ttft_ms=round(report.ttft * 1000, 3) if report.ttft is not None else None,
+            finish_reason=event.finish_reason,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+            cached_tokens=usage.cached_tokens if usage else None,
+        )
+
+    def _describe_error(self, error: Exception) -> str:
+        if isinstance(error, RateLimitError):
+            return "Rate limit exceeded"
+        if isinstance(error, (APIConnectionError, httpx.TransportError)):
+            return "API connection error"
+        return "API error"
+
+    # one request to one endpoint, holding a rate limiter lease for as long as it streams
+    async def _attempt(
+            self,
+            endpoint: Endpoint,
+            kwargs: dict[str, Any],
+            limiter: RateLimiter | None,
+            prompt_tokens: int,
+            priority: RequestPriority,
+            report: BackendReport,
+            parent_span: Span | None = None,
+            attempt: int = 0,
+            hedge: bool = False,
+            )-> AsyncGenerator[StreamEvent, None]:
+        stats = self.endpoint_stats[endpoint.name]
+        stats.requests += 1
+        span = get_tracer().span(
+            "llm.attempt",
+            parent=parent_span,
+            activate=False,
+            endpoint=endpoint.name,
+            attempt=attempt,
+            hedge=hedge,
+        )
+        with span:
+            # every attempt is a request of its own as far as the provider's limits go
+            client = self.get_client(endpoint)
+            queued = time.perf_counter()
+            lease = await limiter.acquire(prompt_tokens, priority) if limiter is not None else None
+            start = time.perf_counter()
+            span.set_attribute("rate_limit_wait_ms", round((start - queued) * 1000, 3))
+            try:
+                if kwargs["stream"]:
+                    first = True
+                    async with aclosing(self._stream_response(client=client, kwargs=kwargs)) as events:
+                        async for event in events:
+                            if first:
+                                first = False
+                                ttft = time.perf_counter() - start
+                                stats.record_ttft(ttft)
+                                report.ttft_by_backend[endpoint.name] = ttft
+                                span.set_attribute("ttft_ms", round(ttft * 1000, 3))
+                            if event.type == StreamEventType.MESSAGE_COMPLETE and event.usage:
+                                if lease:
+                                    lease.settle(event.usage.total_tokens)
+                                span.set_attributes(
+                                    prompt_tokens=event.usage.prompt_tokens,
+                                    completion_tokens=event.usage.completion_tokens,
+                                    cached_tokens=event.usage.cached_tokens,
+                                )
+                            yield event
+                else:
+                    events = await self._non_stream_response(client=client, kwargs=kwargs)
+                    usage = events[-1].usage
+                    if usage:
+                        if lease:
+                            lease.settle(usage.total_tokens)
+                        span.set_attributes(
+                            prompt_tokens=usage.prompt_tokens,
+                            completion_tokens=usage.completion_tokens,
+                            cached_tokens=usage.cached_tokens,
+                        )
+                    for event in events:
+                        yield event
+                    #Note : differnce between yield and return is that yield allows the function to be a generator, producing a series of values over time, whereas return exits the function and provides a single value.
+            except (APIError, httpx.TransportError) as e:
+                stats.failures += 1
+                span.set_attribute("status_code", getattr(e, "status_code", None))
+                raise
+            finally:
+                if lease:
+                    lease.release()
+
+    # starts the primary request and, if it hasn't produced its first event after `delay`
+    # seconds, a hedge to `secondary`. the first to produce an event wins and the other one
+    # is cancelled, which closes its connection and releases its rate limiter lease
+    async def _race(
+            self,
+            attempt: Callable[[Endpoint, bool], AsyncGenerator[StreamEvent, None]],
+            primary: Endpoint,
+            secondary: Endpoint,
+            delay: float,
+            report: BackendReport,
+            tried: set[Endpoint],
+            )-> AsyncGenerator[StreamEvent, None]:
+        streams : dict[asyncio.Task, tuple[Endpoint, AsyncGenerator[StreamEvent, None]]] = {}
+
+        def start(endpoint: Endpoint, hedge: bool = False) -> None:
+            stream = attempt(endpoint, hedge)
+            streams[asyncio.ensure_future(anext(stream))] = (endpoint, stream)
+
+        winner : tuple[Endpoint, AsyncGenerator[StreamEvent, None], asyncio.Task] | None = None
+        errors : list[BaseException] = []
+        try:
+            start(primary)
+            done, _ = await asyncio.wait(streams.keys(), timeout=delay)
+            if not done:
+                report.hedged = True
+                report.hedge_delay = delay
+                report.ttft_by_backend.setdefault(primary.name, None)
+                report.ttft_by_backend.setdefault(secondary.name, None)
+                self.endpoint_stats[secondary.name].hedges += 1
+                tried.add(secondary)
+                start(secondary, hedge=True)
+
+            while streams and winner is None:
+                done, _ = await asyncio.wait(streams.keys(), return_when=asyncio.FIRST_COMPLETED)
+                # the primary wins ties
+                for task in sorted(done, key=lambda t: streams[t][0] != primary):
+                    endpoint, stream = streams.pop(task)
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = (endpoint, stream, task)
+                        break
+                    errors.append(error)
+                    await stream.aclose()
+        finally:
+            for task, (_, stream) in streams.items():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.aclose()
+
+        if winner is None:
+            raise errors[0]
+
+        endpoint, stream, task = winner
+        report.endpoint = endpoint.name
+        if task.exception() is not None:
+            # the stream ended without producing anything
+            return
+        try:
+            yield task.result()
+            async for event in stream:
+                yield event
+        finally:
+            await stream.aclose()
+
     async def _stream_response(
             self,
             client : AsyncOpenAI,
             kwargs: dict[str, Any]
             )-> AsyncGenerator[StreamEvent, None]:
-        response = await client.chat.completions.create(**kwargs)
-        
+        metrics = StreamMetrics()
         finish_reason : str | None = None
         usage : TokenUsage | None = None
         tool_calls: dict[int, dict[str,Any]] = {}
-        
-        async for chunk in response:
-            if hasattr(chunk,"usage") and chunk.usage:
-                usage = TokenUsage(
-                    prompt_tokens=chunk.usage.prompt_tokens,
-                    completion_tokens=chunk.usage.completion_tokens,
-                    total_tokens=chunk.usage.total_tokens,
-                    cached_tokens=chunk.usage.prompt_tokens_details.cached_tokens,
-                )
+        # indexes whose TOOL_CALL_COMPLETE was already yielded while still streaming
+        completed: set[int] = set()
 
-            if not chunk.choices:
-                continue
-
-            choice = chunk.choices[0]
-            delta = choice.delta
-            if choice.finish_reason:
-                finish_reason = choice.finish_reason
-            if delta.content:
-                yield StreamEvent(
-                    type=StreamEventType.TEXT_DELTA,
-                    text_delta=TextDelta(content=delta.content),
-                )
+        # the SSE lines are decoded into plain dicts: the SDK's own stream builds a pydantic
+        # model for every chunk, which costs more per token than everything downstream combined.
+        # leaving the block closes the response, which releases its connection right away when
+        # the consumer stops early, e.g. a cancelled hedge or an interrupted turn
+        async with client.chat.completions.with_streaming_response.create(**kwargs) as response:
+            # the block is entered once the response headers are in
+            metrics.mark_first_byte()
+            async for line in response.http_response.aiter_lines():
+                # skips blank separators and comments such as ": keep-alive"
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    # keep reading to the end of the body rather than breaking out: a response
+                    # closed before it is fully read takes its connection out of the pool
+                    continue
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    # a truncated or garbled event; surfaced like any other stream error so
+                    # it goes through failover/retry instead of escaping the agent
+                    raise self._stream_error(
+                        {"message": f"Malformed stream event: {data[:200]!r}"},
+                        response.http_response,
+                    )
+                if not isinstance(chunk, dict):
+                    raise self._stream_error(
+                        {"message": f"Unexpected stream event: {data[:200]!r}"},
+                        response.http_response,
+                    )
+                if chunk.get("error"):
+                    raise self._stream_error(chunk["error"], response.http_response)
+
+                if chunk.get("usage"):
+                    usage = TokenUsage.from_dict(chunk["usage"])
+
+                choices = chunk.get("choices")
+                if not choices:
+                    continue
+
+                choice = choices[0]
+                delta = choice.get("delta") or {}
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+                content = delta.get("content")
+                delta_tool_calls = delta.get("tool_calls")
+                if content or delta_tool_calls:
+                    metrics.mark_content()
+                if content:
+                    yield StreamEvent(
+                        type=StreamEventType.TEXT_DELTA,
+                        text_delta=TextDelta(content=content),
+                    )
             
-            if delta.tool_calls:
-                for tool_call_delta in delta.tool_calls:
-                    idx = tool_call_delta.index
-                    if idx not in tool_calls:
-                        tool_calls[idx] = {
-                            "id" : tool_call_delta.id or "",
-                            "name": '',
-                            "arguments": '',
-                        }
+                if delta_tool_calls:
+                    for tool_call_delta in delta_tool_calls:
+                        idx = tool_call_delta.get("index") or 0
+                        call_id = tool_call_delta.get("id")
+                        if idx not in tool_calls:
+                            # tool calls stream in index order, so a new index means every
+                            # earlier call has all of its arguments
+                            for prev_idx in tool_calls:
+                                if prev_idx not in completed:
+                                    completed.add(prev_idx)
+                                    yield self._tool_call_complete_event(tool_calls[prev_idx])
+
+                            tool_calls[idx] = {
+                                "id" : call_id or "",
+                                "name": '',
+                                "arguments": TextBuffer(),
+                            }
+                        elif call_id and not tool_calls[idx]["id"]:
+                            tool_calls[idx]["id"] = call_id
                     
-                    if tool_call_delta.function:
-                        if tool_call_delta.function.name:
-                            tool_calls[idx]["name"] += tool_call_delta.function.name
-                            yield StreamEvent(
-                                type=StreamEventType.TOOL_CALL_START,
-                                tool_call_delta=ToolCallDelta(
-                                    call_id=tool_calls[idx]["id"],
-                                    name=tool_call_delta.function.name
+                        function = tool_call_delta.get("function")
+                        if function:
+                            name = function.get("name")
+                            if name:
+                                tool_calls[idx]["name"] += name
+                                yield StreamEvent(
+                                    type=StreamEventType.TOOL_CALL_START,
+                                    tool_call_delta=ToolCallDelta(
+                                        call_id=tool_calls[idx]["id"],
+                                        name=name
+                                    )
                                 )
-                            )
 
-                        if tool_call_delta.function.arguments:
-                            tool_calls[idx]["arguments"] += tool_call_delta.function.arguments
-                            yield StreamEvent(
-                                type=StreamEventType.TOOL_CALL_DELTA,
-                                tool_call_delta=ToolCallDelta(
-                                    call_id=tool_calls[idx]["id"],
-                                    name=tool_calls[idx]["name"],
-                                    arguments_delta=tool_call_delta.function.arguments,
+                            arguments = function.get("arguments")
+                            if arguments:
+                                tool_calls[idx]["arguments"].append(arguments)
+                                yield StreamEvent(
+                                    type=StreamEventType.TOOL_CALL_DELTA,
+                                    tool_call_delta=ToolCallDelta(
+                                        call_id=tool_calls[idx]["id"],
+                                        name=tool_calls[idx]["name"],
+                                        arguments_delta=arguments,
 
+                                    )
                                 )
-                            )
+                                # only try to parse when this delta could have closed the json object
+                                if (
+                                    idx not in completed
+                                    and "}" in arguments
+                                    and is_complete_json_object(tool_calls[idx]["arguments"].getvalue())
+                                ):
+                                    completed.add(idx)
+                                    yield self._tool_call_complete_event(tool_calls[idx])
 
         for idx, tc in tool_calls.items():
-            yield StreamEvent(
-                type=StreamEventType.TOOL_CALL_COMPLETE,
-                tool_call=ToolCall(
-                    call_id=tc["id"],
-                    name=tc["name"],
-                    arguments= parse_tool_call_arguments(tc["arguments"]),
-                )
-            )
+            if idx not in completed:
+                yield self._tool_call_complete_event(tc)
         
         yield StreamEvent(
             type=StreamEventType.MESSAGE_COMPLETE,
             finish_reason=finish_reason,
             usage=usage,
+            metrics=metrics.finish(usage.completion_tokens if usage else None),
+        )
+
+    # an error the provider sent in place of a chunk, raised the way the SDK's stream does
+    def _stream_error(self, error: Any, http_response: httpx.Response) -> APIError:
+        message = error.get("message") if isinstance(error, dict) else None
+        if not message or not isinstance(message, str):
+            message = "An error occurred during streaming"
+        return APIError(message=message, request=http_response.request, body=error)
+
+    def _tool_call_complete_event(self, tc: dict[str, Any]) -> StreamEvent:
+        return StreamEvent(
+            type=StreamEventType.TOOL_CALL_COMPLETE,
+            tool_call=ToolCall(
+                call_id=tc["id"],
+                name=tc["name"],
+                arguments= parse_tool_call_arguments(str(tc["arguments"])),
+            )
         )
 
     async def _non_stream_response(
             self,
             client : AsyncOpenAI,
             kwargs: dict[str, Any]
-            ):
+            )-> list[StreamEvent]:
+        metrics = StreamMetrics()
         response = await client.chat.completions.create(**kwargs)
+        metrics.mark_first_byte()
+        metrics.mark_content()
         choice = response.choices[0]
         message = choice.message
         text_delta = None
@@ -203,7 +582,7 @@ class LLMClient:
             text_delta = TextDelta(content=message.content)
         
         tool_calls : list[ToolCall] = []
-        if message.tool_call:
+        if message.tool_calls:
             for tc in message.tool_calls:
                 tool_calls.append(
                     ToolCall(
@@ -216,16 +595,18 @@ class LLMClient:
         
         usage = None
         if response.usage:
-            usage = TokenUsage(
-                prompt_tokens=response.usage.prompt_tokens,
-                completion_tokens=response.usage.completion_tokens,
-                total_tokens=response.usage.total_tokens,
-                cached_tokens=response.usage.prompt_tokens_details.cached_tokens,
-            )
+            usage = TokenUsage.from_openai(response.usage)
         
-        return StreamEvent(
+        # the same shape as a stream: one TOOL_CALL_COMPLETE per call, then MESSAGE_COMPLETE
+        events = [
+            StreamEvent(type=StreamEventType.TOOL_CALL_COMPLETE, tool_call=tool_call)
+            for tool_call in tool_calls
+        ]
+        events.append(StreamEvent(
             type=StreamEventType.MESSAGE_COMPLETE,
             text_delta=text_delta,
             finish_reason=choice.finish_reason,
             usage=usage,
-        )
\ No newline at end of file
+            metrics=metrics.finish(usage.completion_tokens if usage else None),
+        ))
+        return events
\ No newline at end of file
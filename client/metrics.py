@@ -0,0 +1,99 @@
+from __future__ import annotations
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+def _percentile(ordered: list[float], percentile: float) -> float | None:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+# timings of one model response, attached to its MESSAGE_COMPLETE event. every value is in
+# seconds from the moment the request was sent
+@dataclass
+class StreamMetrics:
+    # wall clock time the request was sent, for correlating with provider logs
+    started_at : float = field(default_factory=time.time)
+    # response headers arrived
+    ttfb : float | None = None
+    # first text or tool call delta arrived
+    ttft : float | None = None
+    duration : float = 0.0
+    # chunks that carried text or tool call deltas
+    content_chunks : int = 0
+    # from the provider's usage when it was sent, otherwise None
+    completion_tokens : int | None = None
+    # time between consecutive content chunks
+    gaps : list[float] = field(default_factory=list, repr=False)
+    _start : float = field(default_factory=time.perf_counter, repr=False)
+    _last : float | None = field(default=None, repr=False)
+
+    def mark_first_byte(self) -> None:
+        self.ttfb = time.perf_counter() - self._start
+
+    def mark_content(self) -> None:
+        now = time.perf_counter()
+        if self._last is None:
+            self.ttft = now - self._start
+        else:
+            self.gaps.append(now - self._last)
+        self._last = now
+        self.content_chunks += 1
+
+    def finish(self, completion_tokens: int | None = None) -> StreamMetrics:
+        self.duration = time.perf_counter() - self._start
+        self.completion_tokens = completion_tokens
+        return self
+
+    @property
+    def generation_time(self) -> float:
+        # from the first token to the end of the stream
+        return max(0.0, self.duration - (self.ttft or 0.0))
+
+    @property
+    def tokens(self) -> int:
+        return self.completion_tokens if self.completion_tokens is not None else self.content_chunks
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        if self.generation_time <= 0 or self.tokens <= 1:
+            return None
+        return self.tokens / self.generation_time
+
+    def to_dict(self) -> dict[str, Any]:
+        gaps = sorted(self.gaps)
+        tokens_per_second = self.tokens_per_second
+        return {
+            "started_at": self.started_at,
+            "ttfb_ms": _ms(self.ttfb),
+            "ttft_ms": _ms(self.ttft),
+            "duration_ms": _ms(self.duration),
+            "content_chunks": self.content_chunks,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_second": round(tokens_per_second, 2) if tokens_per_second is not None else None,
+            "gap_p50_ms": _ms(_percentile(gaps, 0.5)),
+            "gap_p95_ms": _ms(_percentile(gaps, 0.95)),
+            "gap_max_ms": _ms(gaps[-1] if gaps else None),
+        }
+
+# several responses folded together, e.g. every model call of an agent run
+def summarize_stream_metrics(metrics: list[StreamMetrics]) -> dict[str, Any]:
+    ttfts = sorted(m.ttft for m in metrics if m.ttft is not None)
+    ttfbs = [m.ttfb for m in metrics if m.ttfb is not None]
+    gaps = sorted(gap for m in metrics for gap in m.gaps)
+    generation_time = sum(m.generation_time for m in metrics)
+    tokens = sum(m.tokens for m in metrics)
+    return {
+        "calls": len(metrics),
+        "duration_ms": _ms(sum(m.duration for m in metrics)),
+        "ttfb_avg_ms": _ms(sum(ttfbs) / len(ttfbs) if ttfbs else None),
+        "ttft_avg_ms": _ms(sum(ttfts) / len(ttfts) if ttfts else None),
+        "ttft_max_ms": _ms(ttfts[-1] if ttfts else None),
+        "tokens": tokens,
+        "tokens_per_second": round(tokens / generation_time, 2) if generation_time > 0 else None,
+        "gap_p95_ms": _ms(_percentile(gaps, 0.95)),
+        "gap_max_ms": _ms(gaps[-1] if gaps else None),
+    }
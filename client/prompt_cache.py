@@ -0,0 +1,38 @@
+from typing import Any
+
+# providers (as routed by OpenRouter) that only cache prompts at explicit
+# cache_control breakpoints; the others cache matching prefixes automatically
+CACHE_CONTROL_MODEL_PREFIXES = (
+    "anthropic/",
+    "google/gemini",
+)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def supports_cache_control(model: str) -> bool:
+    return model.startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+def _with_cache_control(message: dict[str, Any]) -> dict[str, Any]:
+    content = message.get("content")
+    if isinstance(content, str) and content:
+        parts = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    elif isinstance(content, list) and content:
+        parts = list(content)
+        parts[-1] = {**parts[-1], "cache_control": CACHE_CONTROL}
+    else:
+        return message
+    return {**message, "content": parts}
+
+def apply_cache_breakpoints(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # marks the system prompt (which also covers the tool schemas rendered before it) and
+    # the newest message, so the next turn can reuse everything up to that point.
+    # only the two marked dicts are copied, the shared history list is left untouched
+    if not messages:
+        return messages
+
+    marked = list(messages)
+    if marked[0].get("role") == "system":
+        marked[0] = _with_cache_control(marked[0])
+    if len(marked) > 1:
+        marked[-1] = _with_cache_control(marked[-1])
+    return marked
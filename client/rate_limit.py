@@ -0,0 +1,257 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+from config.settings import Config, get_config
+
+# lower value goes first: interactive sessions pre-empt batch work waiting in the same queue
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+# continuous refill at rate_per_minute, holding at most `capacity` (defaults to one minute
+# worth). the level may go negative when a request used more tokens than it reserved
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float | None = None) -> None:
+        self.rate = rate_per_minute / 60.0
+        # at least one request's worth, or it could never be granted
+        self.capacity = max(1.0, capacity or rate_per_minute)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+    def time_until(self, amount: float) -> float:
+        # a request bigger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        missing = amount - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._level -= amount
+
+@dataclass
+class RateLimitStats:
+    granted : int = 0
+    # requests that had to queue, and how long they queued in total
+    queued : int = 0
+    wait_time : float = 0.0
+    max_queue_depth : int = 0
+    # provider 429s reported through pause()
+    throttled : int = 0
+    wait_by_priority : dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "granted": self.granted,
+            "queued": self.queued,
+            "wait_time": round(self.wait_time, 3),
+            "max_queue_depth": self.max_queue_depth,
+            "throttled": self.throttled,
+            "wait_by_priority": {name: round(wait, 3) for name, wait in self.wait_by_priority.items()},
+        }
+
+@dataclass(order=True)
+class _Waiter:
+    priority : int
+    seq : int
+    tokens : int = field(compare=False)
+    future : asyncio.Future = field(compare=False)
+    enqueued : float = field(compare=False, default_factory=time.monotonic)
+
+# one granted request: holds a concurrency slot until released
+class RateLimitLease:
+    def __init__(self, limiter: RateLimiter, tokens: int) -> None:
+        self._limiter = limiter
+        self.tokens = tokens
+        self._released = False
+
+    def settle(self, actual_tokens: int) -> None:
+        # charge (or refund) the difference between the estimate and the real usage
+        if actual_tokens:
+            self._limiter.settle(actual_tokens - self.tokens)
+            self.tokens = actual_tokens
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+# governs requests per minute, tokens per minute and requests in flight for every
+# LLMClient on an event loop. waiters are served strictly in (priority, arrival) order so
+# a big batch request at the head can't be starved by a stream of small ones behind it
+class RateLimiter:
+    def __init__(
+            self,
+            requests_per_minute: int | None = None,
+            tokens_per_minute: int | None = None,
+            max_concurrency: int | None = None,
+            burst_seconds: float = 60.0,
+            )-> None:
+        # the buckets hold burst_seconds worth of budget; a minute matches how providers
+        # count, less spreads a burst of requests out more evenly
+        self._requests = (
+            TokenBucket(requests_per_minute, requests_per_minute * burst_seconds / 60)
+            if requests_per_minute
+            else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60)
+            if tokens_per_minute
+            else None
+        )
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._waiters : list[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer : asyncio.TimerHandle | None = None
+        self._paused_until = 0.0
+        self.stats = RateLimitStats()
+
+    @classmethod
+    def from_config(cls, config: Config) -> RateLimiter:
+        return cls(
+            requests_per_minute=config.rate_limit_rpm,
+            tokens_per_minute=config.rate_limit_tpm,
+            max_concurrency=config.max_concurrent_requests,
+            burst_seconds=config.rate_limit_burst_seconds,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.future.done())
+
+    # seconds until a request of this size may start, None while no concurrency slot is free
+    def _wait_time(self, tokens: int) -> float | None:
+        if self.max_concurrency is not None and self._in_flight >= self.max_concurrency:
+            return None
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self._requests is not None:
+            wait = max(wait, self._requests.time_until(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.time_until(tokens))
+        return wait
+
+    def _grant(self, tokens: int) -> RateLimitLease:
+        if self._requests is not None:
+            self._requests.consume(1)
+        if self._tokens is not None:
+            self._tokens.consume(tokens)
+        self._in_flight += 1
+        self.stats.granted += 1
+        return RateLimitLease(self, tokens)
+
+    async def acquire(
+            self,
+            tokens: int,
+            priority: RequestPriority = RequestPriority.INTERACTIVE,
+            )-> RateLimitLease:
+        if not self.queue_depth and self._wait_time(tokens) == 0:
+            return self._grant(tokens)
+
+        waiter = _Waiter(
+            priority=int(priority),
+            seq=next(self._seq),
+            tokens=tokens,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        self.stats.queued += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.queue_depth)
+        self._dispatch()
+
+        try:
+            lease = await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # granted in the same tick the caller was cancelled
+                waiter.future.result().release()
+            else:
+                self._dispatch()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        self.stats.wait_time += waited
+        name = RequestPriority(waiter.priority).name.lower()
+        self.stats.wait_by_priority[name] = self.stats.wait_by_priority.get(name, 0.0) + waited
+        return lease
+
+    def pause(self, seconds: float) -> None:
+        # the provider throttled us anyway: hold every queued request until it says to come back
+        self.stats.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # tokens used beyond (or, when negative, short of) what a granted request reserved.
+    # a refund may be enough for the request at the head of the queue
+    def settle(self, delta: int) -> None:
+        if self._tokens is None or not delta:
+            return
+        self._tokens.consume(delta)
+        if delta < 0:
+            self._dispatch()
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(head.tokens)
+            if wait is None:
+                # woken again by _release
+                return
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            head.future.set_result(self._grant(head.tokens))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **self.stats.to_dict(),
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+        }
+
+# like the http pool, one limiter per event loop (futures can't cross loops), shared by
+# every LLMClient on it. None when no limit is configured
+_limiter : RateLimiter | None = None
+_limiter_loop : asyncio.AbstractEventLoop | None = None
+
+def get_rate_limiter(config: Config | None = None) -> RateLimiter | None:
+    global _limiter, _limiter_loop
+    config = config or get_config()
+    if not (config.rate_limit_rpm or config.rate_limit_tpm or config.max_concurrent_requests):
+        return None
+
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        _limiter = RateLimiter.from_config(config)
+        _limiter_loop = loop
+    return _limiter
@@ -1,10 +1,18 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any
+from typing import TYPE_CHECKING, Any, AsyncGenerator, AsyncIterator
 import json
+import time
 
-@dataclass
+if TYPE_CHECKING:
+    from client.endpoints import BackendReport
+    from client.metrics import StreamMetrics
+    from client.retry import RetryAttempt
+
+# the stream types below are slotted: a long answer allocates one StreamEvent and one
+# TextDelta per token
+@dataclass(slots=True)
 class TextDelta:
     content : str
 
@@ -21,15 +29,61 @@ class StreamEventType(str, Enum):
     TOOL_CALL_DELTA = "tool_call_delta"
     TOOL_CALL_COMPLETE = "tool_call_complete"
 
+    # a failed attempt is about to be retried
+    RETRY = "retry"
+
 
 # token usage information
-@dataclass
+@dataclass(slots=True)
 class TokenUsage:
     prompt_tokens : int = 0
     completion_tokens : int = 0
     total_tokens : int = 0
     cached_tokens : int = 0
 
+    # prompt_tokens_details is optional, several providers leave it out
+    @classmethod
+    def from_openai(cls, usage: Any) -> TokenUsage:
+        details = getattr(usage, "prompt_tokens_details", None)
+        return cls(
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            total_tokens=usage.total_tokens or 0,
+            cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        )
+
+    # prompt tokens the provider had to process from scratch
+    @property
+    def uncached_prompt_tokens(self) -> int:
+        return max(0, self.prompt_tokens - self.cached_tokens)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_tokens": self.cached_tokens,
+            "uncached_prompt_tokens": self.uncached_prompt_tokens,
+            "cache_hit_rate": round(self.cache_hit_rate, 4),
+        }
+
+    # the same from a raw usage object decoded from JSON
+    @classmethod
+    def from_dict(cls, usage: dict[str, Any]) -> TokenUsage:
+        details = usage.get("prompt_tokens_details") or {}
+        return cls(
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            completion_tokens=usage.get("completion_tokens") or 0,
+            total_tokens=usage.get("total_tokens") or 0,
+            cached_tokens=details.get("cached_tokens") or 0,
+        )
+
     # using annotations to indicate return type as we are importing TokenUsage within its own definition 
     def __add__(self, other: TokenUsage):
         return TokenUsage(
@@ -40,20 +94,20 @@ class TokenUsage:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolCallDelta:
     call_id : str
     name : str | None = None
     arguments_delta : str = ""
 
-@dataclass
+@dataclass(slots=True)
 class ToolCall:
     call_id : str
     name : str | None = None
     arguments : str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamEvent:
     type : StreamEventType
     text_delta: TextDelta | None = None
@@ -62,8 +116,86 @@ class StreamEvent:
     tool_call_delta: ToolCallDelta | None = None
     tool_call: ToolCall | None = None
     usage : TokenUsage | None = None
-
-@dataclass
+    retry : RetryAttempt | None = None
+    # on MESSAGE_COMPLETE: which endpoint answered and how fast each one started
+    backend : BackendReport | None = None
+    # on MESSAGE_COMPLETE: first byte / first token / throughput timings of the response
+    metrics : StreamMetrics | None = None
+
+# accumulates streamed text without copying everything received so far on each append,
+# which `text += piece` does for attributes and dict values. getvalue() joins once and
+# keeps the result until the next append
+class TextBuffer:
+    __slots__ = ("_parts", "_length", "_value")
+
+    def __init__(self, text: str = "") -> None:
+        self._parts : list[str] = [text] if text else []
+        self._length = len(text)
+        self._value : str | None = text
+
+    def append(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+            self._value = None
+
+    def getvalue(self) -> str:
+        if self._value is None:
+            self._value = "".join(self._parts)
+            self._parts = [self._value]
+        return self._value
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __str__(self) -> str:
+        return self.getvalue()
+
+# merges text deltas that arrive within `window` seconds of the first one still held back,
+# so everything downstream handles one event per window instead of one per token. the first
+# delta of the stream goes through right away to keep time to first token, and held text is
+# flushed before any other event. held text waits for the next chunk to arrive, so a stream
+# that stalls can delay it by up to one inter-chunk gap on top of the window
+async def coalesce_text_deltas(
+        events: AsyncIterator[StreamEvent],
+        window: float,
+        ) -> AsyncGenerator[StreamEvent, None]:
+    held : list[str] = []
+    held_since = 0.0
+    first = True
+    try:
+        async for event in events:
+            if event.type == StreamEventType.TEXT_DELTA and event.text_delta:
+                if first:
+                    first = False
+                    yield event
+                    continue
+                now = time.perf_counter()
+                if not held:
+                    held_since = now
+                held.append(event.text_delta.content)
+                if now - held_since >= window:
+                    yield StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta("".join(held)))
+                    held = []
+                continue
+
+            if held:
+                yield StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta("".join(held)))
+                held = []
+            yield event
+
+        if held:
+            yield StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta("".join(held)))
+    finally:
+        # the source is a stream holding a connection, close it with us
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+@dataclass(slots=True)
 class ToolResultMessage:
     tool_call_id : str
     content : str
@@ -91,3 +223,12 @@ def parse_tool_call_arguments(arguments_str: str)-> dict[str, Any]:
     except json.JSONDecodeError:
         return {'raw_arguments': arguments_str}
 
+
+def is_complete_json_object(arguments_str: str) -> bool:
+    stripped = arguments_str.strip()
+    if not stripped.endswith("}"):
+        return False
+    try:
+        return isinstance(json.loads(stripped), dict)
+    except json.JSONDecodeError:
+        return False
\ No newline at end of file
@@ -0,0 +1,271 @@
+from __future__ import annotations
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+from client.response import StreamEvent, StreamEventType, TextBuffer, TextDelta, ToolCallDelta
+from config.settings import Config
+
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+# retrying stops once this many seconds have passed since the first attempt
+DEFAULT_RETRY_DEADLINE = 120.0
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# the request itself is at fault, another endpoint would reject it just the same
+NO_FAILOVER_STATUS_CODES = frozenset({400, 422})
+# spread server-provided waits by up to this share so clients told the same
+# Retry-After don't all come back in the same instant
+RETRY_AFTER_JITTER = 0.1
+
+@dataclass
+class RetryState:
+    started : float = field(default_factory=time.monotonic)
+    retries : int = 0
+    previous_delay : float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+# what one retry looked like, carried by StreamEventType.RETRY
+@dataclass
+class RetryAttempt:
+    attempt : int
+    delay : float
+    error : str
+    status_code : int | None = None
+    # the server sent Retry-After / retry-after-ms and the delay follows it
+    server_hint : bool = False
+    # output was already streamed before the failure
+    resumed : bool = False
+    # the endpoint the next attempt goes to, and whether it is a different one
+    endpoint : str | None = None
+    failover : bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "attempt": self.attempt,
+            "delay": round(self.delay, 3),
+            "error": self.error,
+            "status_code": self.status_code,
+            "server_hint": self.server_hint,
+            "resumed": self.resumed,
+            "endpoint": self.endpoint,
+            "failover": self.failover,
+        }
+
+@dataclass
+class RetryStats:
+    requests : int = 0
+    retries : int = 0
+    wait_time : float = 0.0
+    gave_up : int = 0
+    resumed_streams : int = 0
+
+    def record(self, attempt: RetryAttempt) -> None:
+        self.retries += 1
+        self.wait_time += attempt.delay
+        if attempt.resumed:
+            self.resumed_streams += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "wait_time": round(self.wait_time, 3),
+            "gave_up": self.gave_up,
+            "resumed_streams": self.resumed_streams,
+        }
+
+def _status_code(error: Exception) -> int | None:
+    return error.status_code if isinstance(error, APIStatusError) else None
+
+def parse_retry_after(headers: httpx.Headers | None) -> float | None:
+    # retry-after-ms (OpenAI) is more precise, Retry-After is seconds or an HTTP date
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# decides whether and how long to wait before the next attempt. subclass and override
+# should_retry / next_delay to change the behaviour, then pass it to LLMClient
+class RetryPolicy:
+    def __init__(
+            self,
+            max_retries: int = 3,
+            base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+            max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+            deadline: float | None = DEFAULT_RETRY_DEADLINE,
+            rng: random.Random | None = None,
+            )-> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, config: Config) -> RetryPolicy:
+        return cls(
+            max_retries=config.max_retries,
+            base_delay=config.retry_base_delay,
+            max_delay=config.retry_max_delay,
+            deadline=config.retry_deadline,
+        )
+
+    def should_retry(self, error: Exception) -> bool:
+        if isinstance(error, (RateLimitError, APIConnectionError, httpx.TransportError)):
+            return True
+        status_code = _status_code(error)
+        return status_code is not None and status_code in RETRYABLE_STATUS_CODES
+
+    def should_failover(self, error: Exception) -> bool:
+        # auth, missing model, overload... are specific to one endpoint, try the next right away
+        return _status_code(error) not in NO_FAILOVER_STATUS_CODES
+
+    def next_delay(self, state: RetryState) -> float:
+        # decorrelated jitter: each wait is drawn between the base and three times the
+        # previous one, so clients that failed together drift apart instead of retrying in lockstep
+        upper = max(self.base_delay, state.previous_delay * 3)
+        return min(self.max_delay, self._rng.uniform(self.base_delay, upper))
+
+    def retry_after(self, error: Exception) -> float | None:
+        response = getattr(error, "response", None)
+        return parse_retry_after(getattr(response, "headers", None))
+
+    # None means give up and surface the error
+    def plan(self, error: Exception, state: RetryState) -> RetryAttempt | None:
+        if state.retries >= self.max_retries or not self.should_retry(error):
+            return None
+
+        hint = self.retry_after(error)
+        if hint is not None:
+            delay = hint * (1 + self._rng.uniform(0, RETRY_AFTER_JITTER))
+        else:
+            delay = self.next_delay(state)
+
+        if self.deadline is not None and state.elapsed + delay > self.deadline:
+            return None
+
+        state.retries += 1
+        state.previous_delay = delay
+        return RetryAttempt(
+            attempt=state.retries,
+            delay=delay,
+            error=str(error),
+            status_code=_status_code(error),
+            server_hint=hint is not None,
+        )
+
+class StreamDivergedError(Exception):
+    pass
+
+# sits between a retried stream and the consumer: whatever was already yielded by an
+# earlier attempt is swallowed when the retry replays it, so deltas are never duplicated.
+# if the retry produces something different from what was already shown the stream
+# can't be stitched together and StreamDivergedError is raised instead
+class StreamResumer:
+    def __init__(self) -> None:
+        self._text = TextBuffer()
+        # per tool call, in stream order: (name, arguments streamed so far, completed)
+        self._calls : list[list[Any]] = []
+        self._replay_text = 0
+        self._replay_ids : dict[str, int] = {}
+        self._replay_args : list[int] = []
+        self._replay_completed = 0
+
+    @property
+    def emitted_anything(self) -> bool:
+        return bool(self._text or self._calls)
+
+    def restart(self) -> None:
+        self._replay_text = 0
+        self._replay_ids = {}
+        self._replay_args = []
+        self._replay_completed = 0
+
+    def _replay(self, emitted: TextBuffer, position: int, piece: str) -> str:
+        # returns the part of piece that was not emitted yet
+        if position >= len(emitted):
+            return piece
+        overlap = emitted.getvalue()[position:position + len(piece)]
+        if not piece.startswith(overlap):
+            raise StreamDivergedError("the retried response differs from the output already streamed")
+        return piece[len(overlap):]
+
+    def filter(self, event: StreamEvent) -> StreamEvent | None:
+        if event.type == StreamEventType.TEXT_DELTA and event.text_delta:
+            piece = event.text_delta.content
+            fresh = self._replay(self._text, self._replay_text, piece)
+            self._replay_text += len(piece)
+            if not fresh:
+                return None
+            self._text.append(fresh)
+            if len(fresh) == len(piece):
+                return event
+            return StreamEvent(type=event.type, text_delta=TextDelta(content=fresh))
+
+        if event.type == StreamEventType.TOOL_CALL_START and event.tool_call_delta:
+            ordinal = len(self._replay_ids)
+            self._replay_ids[event.tool_call_delta.call_id] = ordinal
+            self._replay_args.append(0)
+            if ordinal < len(self._calls):
+                if self._calls[ordinal][0] != event.tool_call_delta.name:
+                    raise StreamDivergedError("the retried response called a different tool")
+                return None
+            self._calls.append([event.tool_call_delta.name, TextBuffer(), False])
+            return event
+
+        if event.type == StreamEventType.TOOL_CALL_DELTA and event.tool_call_delta:
+            ordinal = self._replay_ids.get(event.tool_call_delta.call_id, len(self._replay_ids) - 1)
+            call = self._calls[ordinal]
+            piece = event.tool_call_delta.arguments_delta
+            fresh = self._replay(call[1], self._replay_args[ordinal], piece)
+            self._replay_args[ordinal] += len(piece)
+            if not fresh:
+                return None
+            call[1].append(fresh)
+            if len(fresh) == len(piece):
+                return event
+            return StreamEvent(
+                type=event.type,
+                tool_call_delta=ToolCallDelta(
+                    call_id=event.tool_call_delta.call_id,
+                    name=event.tool_call_delta.name,
+                    arguments_delta=fresh,
+                ),
+            )
+
+        if event.type == StreamEventType.TOOL_CALL_COMPLETE:
+            ordinal = self._replay_completed
+            self._replay_completed += 1
+            if ordinal < len(self._calls) and self._calls[ordinal][2]:
+                # already handed to the scheduler by the earlier attempt
+                return None
+            if ordinal < len(self._calls):
+                self._calls[ordinal][2] = True
+            else:
+                self._calls.append([event.tool_call.name if event.tool_call else None, TextBuffer(), True])
+            return event
+
+        return event
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from config.settings import Config, get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+# idle connections are closed after this many seconds
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+@dataclass
+class PoolConfig:
+    max_connections : int = DEFAULT_MAX_CONNECTIONS
+    max_keepalive_connections : int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS
+    keepalive_expiry : float = DEFAULT_KEEPALIVE_EXPIRY
+    timeout : float = DEFAULT_TIMEOUT
+    connect_timeout : float = DEFAULT_CONNECT_TIMEOUT
+    # only honoured when the optional `h2` package is installed
+    http2 : bool = True
+
+    @classmethod
+    def from_config(cls, config: Config) -> PoolConfig:
+        return cls(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+            timeout=config.request_timeout,
+            connect_timeout=config.connect_timeout,
+        )
+
+@dataclass
+class PoolStats:
+    requests : int = 0
+    new_connections : int = 0
+    reused_connections : int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_rate": round(self.reused_connections / self.requests, 4) if self.requests else 0.0,
+        }
+
+# counts whether each request had to open a connection, using httpcore's trace extension
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        opened = False
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict[str, Any]) -> None:
+            nonlocal opened
+            if event_name.startswith(("connection.connect_tcp.", "connection.connect_unix_socket.")):
+                opened = True
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        response = await super().handle_async_request(request)
+
+        self._stats.requests += 1
+        if opened:
+            self._stats.new_connections += 1
+        else:
+            self._stats.reused_connections += 1
+        return response
+
+# one pool per process (per event loop: connections can't move between loops), shared by
+# every LLMClient so back-to-back agents reuse warm TCP/TLS connections
+_http_client : httpx.AsyncClient | None = None
+_http_client_loop : asyncio.AbstractEventLoop | None = None
+# None means "build it from the process-wide config"
+_pool_config : PoolConfig | None = None
+_pool_stats = PoolStats()
+
+def configure_pool(config: PoolConfig | None) -> None:
+    # takes effect for the next pool that is created
+    global _pool_config
+    _pool_config = config
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+# sockets of the pooled connections, for closing them without the loop they belong to
+def _pool_sockets(client: httpx.AsyncClient) -> list[Any]:
+    pool = getattr(client._transport, "_pool", None)
+    sockets = []
+    for connection in getattr(pool, "connections", []):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        # asyncio hands out a TransportSocket wrapper, close the socket it wraps
+        sock = getattr(sock, "_sock", sock)
+        if sock is not None:
+            sockets.append(sock)
+    return sockets
+
+# the pool of a loop we moved away from. a loop still running elsewhere closes it itself;
+# a finished loop can't run aclose() any more, so the sockets are closed directly
+def _discard_http_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None) -> None:
+    if client.is_closed:
+        return
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    for sock in _pool_sockets(client):
+        try:
+            sock.close()
+        except OSError as e:
+            logger.debug(f"Could not close pooled connection: {e}")
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client, _http_client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _http_client is None or _http_client.is_closed or (
+        loop is not None and _http_client_loop is not None and loop is not _http_client_loop
+    ):
+        if _http_client is not None:
+            _discard_http_client(_http_client, _http_client_loop)
+        config = _pool_config or PoolConfig.from_config(get_config())
+        transport = _InstrumentedTransport(
+            _pool_stats,
+            http2=config.http2 and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+        )
+        _http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            follow_redirects=True,
+        )
+        _http_client_loop = loop
+    return _http_client
+
+async def prewarm(base_url: str) -> bool:
+    # opens (and TLS-handshakes) a pooled connection before the first real request.
+    # any response counts, the status code doesn't matter
+    try:
+        await get_http_client().head(base_url)
+        return True
+    except httpx.HTTPError as e:
+        logger.debug(f"Connection prewarm to {base_url} failed: {e}")
+        return False
+
+def pool_stats() -> dict[str, Any]:
+    return _pool_stats.to_dict()
+
+async def close_http_client() -> None:
+    global _http_client, _http_client_loop
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
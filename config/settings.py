@@ -0,0 +1,235 @@
+import json
+import os
+import typing
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any
+
+# settings are layered: defaults < config file < AGENT_* environment variables < CLI flags
+CONFIG_FILE_ENV = "AGENT_CONFIG"
+DEFAULT_CONFIG_FILES = ("agent.toml", "agent.json")
+ENV_PREFIX = "AGENT_"
+
+@dataclass(frozen=True)
+class Endpoint:
+    base_url : str
+    model : str
+    # None uses the api_key_env of the config it belongs to
+    api_key_env : str | None = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.base_url}"
+
+    @property
+    def api_key(self) -> str | None:
+        return os.getenv(self.api_key_env) if self.api_key_env else None
+
+@dataclass(frozen=True)
+class Config:
+    # model endpoint
+    base_url : str = "https://openrouter.ai/api/v1"
+    model : str = "mistralai/devstral-2512:free"
+    # name of the environment variable holding the key, not the key itself
+    api_key_env : str = "OPENROUTER_API_KEY"
+    # tried in order after the endpoint above fails. in a file: a list of tables with
+    # base_url / model / api_key_env; in env or CLI: JSON, or "model@base_url" pairs
+    # separated by commas
+    fallback_endpoints : tuple[Endpoint, ...] = ()
+
+    # hedged requests: when a stream hasn't produced anything after this percentile of the
+    # endpoint's recent times to first token, a second request goes to the next endpoint
+    # and whichever starts first wins. None turns hedging off
+    hedge_percentile : float | None = None
+    # used until enough first-token times were seen, and as a floor afterwards
+    hedge_initial_delay : float = 2.0
+    hedge_min_delay : float = 0.25
+
+    # timeouts in seconds
+    request_timeout : float = 600.0
+    connect_timeout : float = 10.0
+    max_retries : int = 3
+    # retry backoff: decorrelated jitter between base and max delay, and no new
+    # attempt once retry_deadline seconds have passed since the first one
+    retry_base_delay : float = 1.0
+    retry_max_delay : float = 30.0
+    retry_deadline : float | None = 120.0
+
+    # client-side rate limiting shared by every model call in the process; None disables
+    # a limit. request_priority is "interactive" or "batch", interactive calls go first
+    rate_limit_rpm : int | None = None
+    rate_limit_tpm : int | None = None
+    max_concurrent_requests : int | None = None
+    rate_limit_burst_seconds : float = 60.0
+    request_priority : str = "interactive"
+
+    # http connection pool
+    max_connections : int = 100
+    max_keepalive_connections : int = 20
+    keepalive_expiry : float = 60.0
+
+    # agent loop limits
+    max_turns : int = 25
+    max_duration : float | None = None
+    max_total_tokens : int | None = None
+    max_tool_concurrency : int = 8
+    # a tool call running longer than this many seconds is stopped and reported to the model
+    # as timed out, with the output it produced so far. None lets calls run as long as they
+    # take. tools with a setting of their own (read_timeout) ignore it
+    tool_timeout : float | None = 120.0
+
+    # text deltas arriving within this many seconds of each other are merged into one event
+    # before the agent yields them. None passes every delta through as it arrives
+    stream_coalesce_window : float | None = None
+
+    # context management
+    context_window : int = 128_000
+    compaction_threshold : float = 0.8
+
+    # read_file limits
+    read_max_output_tokens : int = 25_000
+    read_max_file_size : int = 10 * 1024 * 1024
+    read_timeout : float | None = 30.0
+
+    # tracing: spans for every run, turn, model attempt and tool call are appended to this
+    # JSONL file. None turns tracing off
+    trace_file : str | None = None
+
+    @property
+    def api_key(self) -> str | None:
+        return os.getenv(self.api_key_env)
+
+    @property
+    def endpoints(self) -> tuple[Endpoint, ...]:
+        return tuple(
+            replace(endpoint, api_key_env=endpoint.api_key_env or self.api_key_env)
+            for endpoint in (Endpoint(self.base_url, self.model), *self.fallback_endpoints)
+        )
+
+def _parse_endpoint(value: Any) -> Endpoint:
+    if isinstance(value, Endpoint):
+        return value
+    if isinstance(value, dict):
+        return Endpoint(**value)
+    model, separator, base_url = str(value).strip().partition("@")
+    if not separator or not model or not base_url:
+        raise ValueError(f"Endpoint must look like model@base_url, got {value!r}")
+    return Endpoint(base_url=base_url, model=model)
+
+def _parse_endpoints(value: Any) -> tuple[Endpoint, ...]:
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return ()
+        value = json.loads(value) if value.startswith("[") else value.split(",")
+    return tuple(_parse_endpoint(item) for item in value)
+
+def _coerce(name: str, value: Any, annotation: Any) -> Any:
+    optional = type(None) in typing.get_args(annotation)
+    if value is None or (optional and isinstance(value, str) and value.strip().lower() in ("", "none", "null")):
+        if optional:
+            return None
+        raise ValueError(f"Config option '{name}' can't be empty")
+
+    base = annotation
+    if optional:
+        base = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    try:
+        if typing.get_origin(base) is tuple:
+            return _parse_endpoints(value)
+        if base is bool:
+            if isinstance(value, str):
+                flag = value.strip().lower()
+                if flag in ("1", "true", "yes", "on"):
+                    return True
+                if flag in ("0", "false", "no", "off"):
+                    return False
+                # a typo shouldn't quietly turn an option off
+                raise ValueError(flag)
+            return bool(value)
+        return base(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value for config option '{name}': {value!r}") from e
+
+def _read_file(path: Path) -> dict[str, Any]:
+    if path.suffix == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+    else:
+        # imported here: most runs have no TOML file and startup shouldn't pay for the parser
+        import tomllib
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+    # allow the settings to live under an [agent] table
+    if isinstance(data.get("agent"), dict):
+        data = data["agent"]
+    return data
+
+def _find_config_file(path: Path | None) -> Path | None:
+    if path is not None:
+        return path
+    env_path = os.getenv(CONFIG_FILE_ENV)
+    if env_path:
+        return Path(env_path).expanduser()
+    for name in DEFAULT_CONFIG_FILES:
+        candidate = Path.cwd() / name
+        if candidate.is_file():
+            return candidate
+    return None
+
+_dotenv_loaded = False
+
+# .env is read on the first load instead of at import, so importing the settings stays cheap.
+# like before, variables already set in the environment win over the file
+def _load_dotenv() -> None:
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _dotenv_loaded = True
+
+def load_config(
+        path: Path | None = None,
+        overrides: dict[str, Any] | None = None,
+        ) -> Config:
+    _load_dotenv()
+    hints = typing.get_type_hints(Config)
+    known = {f.name for f in fields(Config)}
+    values : dict[str, Any] = {}
+
+    config_file = _find_config_file(path)
+    if config_file is not None:
+        for key, value in _read_file(config_file).items():
+            if key not in known:
+                raise ValueError(f"Unknown config option '{key}' in {config_file}")
+            values[key] = value
+
+    for name in known:
+        env_value = os.getenv(ENV_PREFIX + name.upper())
+        if env_value is not None:
+            values[name] = env_value
+
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            values[key] = value
+
+    return Config(**{
+        name: _coerce(name, value, hints[name])
+        for name, value in values.items()
+    })
+
+_config : Config | None = None
+
+def get_config() -> Config:
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
+
+def set_config(config: Config) -> None:
+    global _config
+    _config = config
+
+def update_config(**changes: Any) -> Config:
+    config = replace(get_config(), **changes)
+    set_config(config)
+    return config
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING
+
+from client.response import StreamEventType, TextBuffer
+from context.manager import ContextManager, MessageItem
+from utils.text import TruncationStrategy, count_tokens, truncate_text
+
+if TYPE_CHECKING:
+    from client.llm_client import LLMClient
+    from utils.tracing import Span
+
+DEFAULT_CONTEXT_WINDOW = 128_000
+# compaction starts once the context uses this share of the window...
+DEFAULT_COMPACTION_THRESHOLD = 0.8
+# ...and tries to bring it back under this share
+DEFAULT_COMPACTION_TARGET = 0.5
+# the most recent messages are never touched so the model keeps its working set
+DEFAULT_KEEP_RECENT_MESSAGES = 6
+# tool outputs smaller than this are not worth eliding
+MIN_ELIDE_TOKENS = 200
+# each message is clipped to this before it goes into the summarization request
+MAX_TRANSCRIPT_MESSAGE_TOKENS = 2_000
+
+SUMMARY_PREFIX = "Summary of the earlier conversation (older messages were compacted):\n\n"
+
+SUMMARIZE_PROMPT = """You compress the history of a coding agent session so the agent can continue the task.
+Write a concise summary that keeps:
+- the user's goals and any constraints or preferences they stated
+- files that were read or changed and the key facts learned from them
+- decisions made, commands run and their outcomes, errors hit and how they were resolved
+- what remains to be done
+Do not invent anything that is not in the transcript. Reply with the summary only."""
+
+@dataclass
+class CompactionResult:
+    tokens_before : int
+    tokens_after : int
+    duration : float
+    elided_tool_results : int = 0
+    truncated_tool_results : int = 0
+    summarized_messages : int = 0
+    error : str | None = None
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+# shrinks a ContextManager in up to three phases: first the outputs of old tool calls are
+# elided, then oversized tool outputs among the recent messages are truncated, and only if
+# that was not enough older messages are summarized by the model into one message
+class ContextCompactor:
+    def __init__(
+            self,
+            client: LLMClient,
+            context_window: int = DEFAULT_CONTEXT_WINDOW,
+            threshold: float = DEFAULT_COMPACTION_THRESHOLD,
+            target: float = DEFAULT_COMPACTION_TARGET,
+            keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES,
+            )-> None:
+        if keep_recent_messages < 1:
+            # the model needs at least the latest message to continue from
+            raise ValueError("keep_recent_messages must be at least 1")
+        self.client = client
+        self.context_window = context_window
+        self.threshold = threshold
+        self.target = target
+        self.keep_recent_messages = keep_recent_messages
+        # context size right after the last compaction. until the context grows past it
+        # another compaction could only redo the same work
+        self._compacted_tokens : int | None = None
+
+    @property
+    def threshold_tokens(self) -> int:
+        return int(self.context_window * self.threshold)
+
+    @property
+    def target_tokens(self) -> int:
+        return int(self.context_window * self.target)
+
+    # each recent message may use an equal share of the target
+    @property
+    def max_recent_tool_tokens(self) -> int:
+        return max(MIN_ELIDE_TOKENS, self.target_tokens // self.keep_recent_messages)
+
+    def should_compact(self, context_manager: ContextManager) -> bool:
+        total = context_manager.total_tokens
+        if self._compacted_tokens is not None and total <= self._compacted_tokens:
+            return False
+        return total >= self.threshold_tokens
+
+    async def compact(
+            self,
+            context_manager: ContextManager,
+            parent_span: Span | None = None,
+            )-> CompactionResult:
+        start = time.perf_counter()
+        tokens_before = context_manager.total_tokens
+        items = list(context_manager.messages)
+        cut = self._protected_start(items)
+
+        model = context_manager.model_name
+
+        items, elided = self._elide_tool_results(items, cut, model)
+        context_manager.replace_messages(items)
+
+        truncated = 0
+        if context_manager.total_tokens > self.target_tokens:
+            # one huge output the model just asked for can't be summarized away, cut it down
+            items, truncated = self._truncate_recent_tool_results(items, cut, model)
+            context_manager.replace_messages(items)
+
+        summarized = 0
+        error = None
+        if context_manager.total_tokens > self.target_tokens and self._can_summarize(items[:cut]):
+            summary, error = await self._summarize(items[:cut], model, parent_span)
+            if summary:
+                context_manager.replace_messages(self._with_summary(summary, items[cut:], model))
+                summarized = cut
+
+        self._compacted_tokens = context_manager.total_tokens
+        return CompactionResult(
+            tokens_before=tokens_before,
+            tokens_after=context_manager.total_tokens,
+            duration=time.perf_counter() - start,
+            elided_tool_results=elided,
+            truncated_tool_results=truncated,
+            summarized_messages=summarized,
+            error=error,
+        )
+
+    def _can_summarize(self, items: list[MessageItem]) -> bool:
+        # the summary of an earlier compaction on its own would only be summarized again
+        if len(items) == 1 and items[0].content.startswith(SUMMARY_PREFIX):
+            return False
+        return bool(items)
+
+    def _with_summary(self, summary: str, tail: list[MessageItem], model: str) -> list[MessageItem]:
+        # the summary goes out as a user message. when the kept messages start with one as
+        # well the two are merged, so user and assistant turns keep alternating
+        content = SUMMARY_PREFIX + summary
+        if tail and tail[0].role == "user":
+            content = f"{content}\n\n{tail[0].content}"
+            tail = tail[1:]
+        summary_item = MessageItem(
+            role="user",
+            content=content,
+            token_count=count_tokens(content, model),
+        )
+        return [summary_item] + tail
+
+    def _protected_start(self, items: list[MessageItem]) -> int:
+        # index where the untouched tail begins. it never starts on a tool result, so an
+        # assistant message and the results of its tool calls always stay together
+        cut = max(0, len(items) - self.keep_recent_messages)
+        while cut > 0 and items[cut].role == "tool":
+            cut -= 1
+        return cut
+
+    def _elide_tool_results(
+            self,
+            items: list[MessageItem],
+            cut: int,
+            model: str,
+            )-> tuple[list[MessageItem], int]:
+        elided = 0
+        result = list(items)
+        for i in range(cut):
+            item = result[i]
+            if item.role != "tool" or (item.token_count or 0) < MIN_ELIDE_TOKENS:
+                continue
+            # the tool_call_id stays, so the pairing with the assistant's tool_calls holds
+            content = (
+                f"[tool output elided during context compaction: "
+                f"{item.token_count} tokens]"
+            )
+            result[i] = replace(
+                item,
+                content=content,
+                token_count=count_tokens(content, model),
+            )
+            elided += 1
+        return result, elided
+
+    def _truncate_recent_tool_results(
+            self,
+            items: list[MessageItem],
+            cut: int,
+            model: str,
+            )-> tuple[list[MessageItem], int]:
+        truncated = 0
+        limit = self.max_recent_tool_tokens
+        result = list(items)
+        for i in range(cut, len(result)):
+            item = result[i]
+            if item.role != "tool" or (item.token_count or 0) <= limit:
+                continue
+            content = truncate_text(
+                item.content,
+                limit,
+                model,
+                suffix="\n... [tool output truncated during context compaction]",
+                strategy=TruncationStrategy.HEAD_TAIL,
+            )
+            result[i] = replace(item, content=content, token_count=count_tokens(content, model))
+            truncated += 1
+        return result, truncated
+
+    def _render_transcript(self, items: list[MessageItem], model: str) -> str:
+        parts : list[str] = []
+        for item in items:
+            content = truncate_text(
+                item.content or "",
+                MAX_TRANSCRIPT_MESSAGE_TOKENS,
+                model,
+                strategy=TruncationStrategy.HEAD_TAIL,
+            )
+            if item.tool_calls:
+                calls = ", ".join(
+                    f"{call['function']['name']}({call['function']['arguments']})"
+                    for call in item.tool_calls
+                )
+                content = f"{content}\n[tool calls: {calls}]".strip()
+            parts.append(f"[{item.role}] {content}")
+        return "\n\n".join(parts)
+
+    async def _summarize(
+            self,
+            items: list[MessageItem],
+            model: str,
+            parent_span: Span | None = None,
+            )-> tuple[str | None, str | None]:
+        messages = [
+            {"role": "system", "content": SUMMARIZE_PROMPT},
+            {"role": "user", "content": self._render_transcript(items, model)},
+        ]
+        summary = TextBuffer()
+        # returning on an error event closes the stream, its rate limiter lease and response
+        async with aclosing(self.client.chat_completion(messages=messages, stream=True, parent_span=parent_span)) as events:
+            async for event in events:
+                if event.type == StreamEventType.TEXT_DELTA and event.text_delta:
+                    summary.append(event.text_delta.content)
+                elif event.type == StreamEventType.ERROR:
+                    return None, event.error or "Summarization failed"
+        return summary.getvalue().strip() or None, None
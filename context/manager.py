@@ -1,7 +1,8 @@
 from typing import Any
 from prompts.system import get_system_prompt
 from dataclasses import dataclass, field
-from utils.text import count_tokens
+from utils.text import count_tokens_if_ready, encoding_ready, estimate_tokens
+from config.settings import get_config
 
 @dataclass
 class MessageItem:
@@ -26,52 +27,119 @@ class MessageItem:
         return result
 
 class ContextManager:
-    def __init__(self)->None:
+    def __init__(self, model_name: str | None = None)->None:
         self._system_prompt : str = get_system_prompt()
         self._messages : list[MessageItem] = []
-        self._model_name : str = "mistralai/devstral-2512:free" 
+        self._model_name : str = model_name or get_config().model
+        # the tokenizer may still be loading in the background when the agent starts. counts
+        # are estimated until then and redone once it is ready, see _recount_estimated
+        self._system_estimated : bool = False
+        self._estimated : list[MessageItem] = []
+        self._system_tokens : int = self._count_system()
+        # provider-ready messages, appended to alongside _messages so get_messages()
+        # doesn't re-serialize the whole history on every model call. entries are never
+        # rewritten outside compaction, so every request shares a byte-identical prefix
+        # with the previous one and provider prompt caches keep hitting
+        self._serialized : list[dict[str,Any]] = []
+        self._total_tokens : int = 0
+        self._rebuild()
+
+    @property
+    def total_tokens(self) -> int:
+        # system prompt plus every message, kept up to date on each add
+        if (self._estimated or self._system_estimated) and encoding_ready(self._model_name):
+            self._recount_estimated()
+        return self._total_tokens
+
+    @property
+    def messages(self) -> list[MessageItem]:
+        return self._messages
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    def _count_system(self) -> int:
+        count = count_tokens_if_ready(self._system_prompt, self._model_name)
+        self._system_estimated = count is None
+        return estimate_tokens(self._system_prompt) if count is None else count
+
+    def _count(self, item: MessageItem) -> MessageItem:
+        count = count_tokens_if_ready(item.content, self._model_name)
+        if count is None:
+            count = estimate_tokens(item.content) if item.content else 0
+            self._estimated.append(item)
+        item.token_count = count
+        return item
+
+    def _recount_estimated(self) -> None:
+        if self._system_estimated:
+            self._system_tokens = self._count_system()
+        for item in self._estimated:
+            self._count(item)
+        self._estimated = []
+        self._total_tokens = self._system_tokens + sum(
+            item.token_count or 0 for item in self._messages
+        )
+
+    def _append(self, item: MessageItem) -> None:
+        self._messages.append(item)
+        self._serialized.append(item.to_dict())
+        self._total_tokens += item.token_count or 0
+
+    # the only place the serialized list is rebuilt from scratch; called when history is
+    # rewritten rather than appended to
+    def _rebuild(self) -> None:
+        serialized : list[dict[str,Any]] = []
+        if self._system_prompt:
+            serialized.append({
+                "role":"system",
+                "content": self._system_prompt,
+            })
+        serialized.extend(item.to_dict() for item in self._messages)
+
+        self._serialized = serialized
+        # estimated items that were dropped or replaced don't need a recount
+        kept = {id(item) for item in self._messages}
+        self._estimated = [item for item in self._estimated if id(item) in kept]
+        self._total_tokens = self._system_tokens + sum(
+            item.token_count or 0 for item in self._messages
+        )
+
+    def replace_messages(self, items: list[MessageItem]) -> None:
+        self._messages = list(items)
+        self._rebuild()
     
     def add_user_message(self,content: str)->None:
         item = MessageItem(
             role="user",
             content=content,
-            token_count=count_tokens(content,self._model_name),
         )
 
-        self._messages.append(item)
+        self._append(self._count(item))
     
-    def add_assistant_message(self,content: str)->None:
+    def add_assistant_message(
+            self,
+            content: str | None,
+            tool_calls: list[dict[str,Any]] | None = None,
+            )->None:
         item = MessageItem(
             role="assistant",
             content=content or "",
-            token_count=count_tokens(
-                content or "",
-                self._model_name
-                ),
+            tool_calls=tool_calls or [],
         )
 
-        self._messages.append(item)
+        self._append(self._count(item))
     
     def add_tool_result_message(self, tool_call_id: str, content: str)->None:
         item = MessageItem(
             role='tool',
             content=content,
             tool_call_id=tool_call_id,
-            token_count=count_tokens(content, self._model_name),
         )
 
-        self._messages.append(item)
+        self._append(self._count(item))
     
+    # returns the live list without copying: callers must treat it as read-only
     def get_messages(self)-> list[dict[str,Any]]:
-        messages = []
-
-        if self._system_prompt:
-            messages.append({
-                "role":"system",
-                "content": self._system_prompt,
-            })
-        
-        for item in self._messages:
-            messages.append(item.to_dict())
-        
-        return messages
\ No newline at end of file
+        return self._serialized
\ No newline at end of file
@@ -1,25 +1,175 @@
-import asyncio
+from __future__ import annotations
+import json
 import sys
 import click
 
 from agent.events import AgentEventType
-from client.llm_client import LLMClient
-from agent.agent import Agent
-from ui.renderer import TUI, get_console
+from config.settings import get_config, load_config, set_config
+from pathlib import Path
+from ui.jsonl import JsonlWriter
 
-from typing import Any
-console = get_console()
+from typing import TYPE_CHECKING, Any
+
+# the agent, the OpenAI client, httpx and even asyncio are imported where a prompt is
+# actually run, so --help, bad flags and the jsonl writer start without them
+if TYPE_CHECKING:
+    import asyncio
+    from agent.agent import Agent
+
+DEFAULT_BATCH_CONCURRENCY = 4
 
 class CLI:
-    def __init__(self):   
+    # output is "text" for the terminal UI or "jsonl" for one JSON event per line on stdout
+    def __init__(self, output: str = "text"):   
         self.agent: Agent | None = None
-        self.tui = TUI(console=console)
+        self.output = output
+        self.jsonl = JsonlWriter() if output == "jsonl" else None
+        if self.jsonl is None:
+            # rich is only loaded for the terminal UI
+            from ui.renderer import TUI, get_console
+            self.console = get_console()
+            self.tui = TUI(console=self.console)
 
     async def run_single(self, message: str )-> str | None:
-        async with Agent() as agent:
-            # it is instantiated because later we want it in other helper methods  
-            self.agent = agent
-            return await self._process_message(message)
+        from client.transport import close_http_client
+
+        # before the agent import, so the tokenizer loads while the agent modules do
+        prewarm_task = _start_prewarm()
+        try:
+            from agent.agent import Agent
+            async with Agent() as agent:
+                # it is instantiated because later we want it in other helper methods  
+                self.agent = agent
+                if self.jsonl is not None:
+                    return await self._emit_events(agent, message)
+                return await self._process_message(message)
+        finally:
+            await prewarm_task
+            await close_http_client()
+
+    # interactive session: every prompt goes to the same Agent on the same event loop, so the
+    # conversation history, the HTTP pool and the tokenizer carry over between prompts.
+    # Ctrl-C while an answer is streaming cancels that prompt only (its stream and tool calls)
+    # and returns to the input line; Ctrl-D or /exit ends the session
+    def run_interactive(self) -> None:
+        import asyncio
+        try:
+            # line editing and history for input()
+            import readline  # noqa: F401
+        except ImportError:
+            pass
+
+        with asyncio.Runner() as runner:
+            runner.run(self._open_session())
+            self.console.print("[muted]Ctrl-C cancels the current answer, Ctrl-D or /exit quits.[/muted]")
+            try:
+                while True:
+                    try:
+                        message = self.console.input("[user]> [/user]").strip()
+                    except KeyboardInterrupt:
+                        self.console.print()
+                        continue
+                    except EOFError:
+                        self.console.print()
+                        break
+                    if not message:
+                        continue
+                    if message in ("/exit", "/quit"):
+                        break
+                    # asyncio.Runner turns the first Ctrl-C into a cancellation of this task
+                    # and raises KeyboardInterrupt once it has unwound
+                    try:
+                        runner.run(self._process_message(message))
+                    except KeyboardInterrupt:
+                        self.console.print("[warning]Interrupted[/warning]")
+            finally:
+                runner.run(self._close_session())
+
+    async def _open_session(self) -> None:
+        prewarm_task = _start_prewarm()
+        try:
+            from agent.agent import Agent
+            self.agent = Agent()
+        finally:
+            # the loop is idle while the user types, the handshake has to finish before that
+            await prewarm_task
+
+    async def _close_session(self) -> None:
+        from client.transport import close_http_client
+        try:
+            if self.agent is not None:
+                await self.agent.close()
+        finally:
+            await close_http_client()
+
+    # prompts from `lines`, one per line: a JSON object with "prompt" and an optional "id",
+    # or a JSON string. up to `concurrency` run at once, each with its own Agent; the HTTP
+    # pool is process-wide so they share connections. returns the number that failed
+    async def run_batch(self, lines: Any, concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> int:
+        import asyncio
+        from client.transport import close_http_client
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        tasks : list[asyncio.Task[bool]] = []
+        prewarm_task = _start_prewarm()
+        try:
+            index = 0
+            while True:
+                line = await asyncio.to_thread(lines.readline)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # stop reading ahead while every slot is busy
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(self._run_batch_item(index, line, semaphore)))
+                index += 1
+            results = await asyncio.gather(*tasks)
+            return sum(not ok for ok in results)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await prewarm_task
+            await close_http_client()
+
+    async def _run_batch_item(self, index: int, line: str, semaphore: asyncio.Semaphore) -> bool:
+        try:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                self.jsonl.write({"id": index, "type": "input_error", "data": {"error": str(e), "line": line.rstrip("\n")}})
+                return False
+            if isinstance(request, str):
+                request = {"prompt": request}
+            prompt = request.get("prompt") if isinstance(request, dict) else None
+            if not isinstance(prompt, str) or not prompt:
+                self.jsonl.write({"id": index, "type": "input_error", "data": {"error": "expected a JSON string or an object with a \"prompt\""}})
+                return False
+
+            id = request.get("id", index)
+            from agent.agent import Agent
+            try:
+                async with Agent() as agent:
+                    response = await self._emit_events(agent, prompt, id=id)
+            except Exception as e:
+                # one broken prompt shouldn't take the rest of the batch down
+                self.jsonl.write({"id": id, "type": "internal_error", "data": {"error": f"{type(e).__name__}: {e}"}})
+                return False
+            return response is not None
+        finally:
+            semaphore.release()
+
+    async def _emit_events(self, agent: Agent, message: str, id: Any = None) -> str | None:
+        final_response : str | None = None
+        stop_reason : str | None = None
+        async for event in agent.run(message=message):
+            self.jsonl.write_event(event, id=id)
+            if event.type == AgentEventType.TEXT_COMPLETE:
+                final_response = event.data.get("content", "")
+            elif event.type == AgentEventType.AGENT_END:
+                stop_reason = event.data.get("stop_reason")
+        return final_response if stop_reason == "completed" else None
     
     def _get_tool_kind(self, tool_name: str) -> str | None:
         tool = self.agent.tool_registry.get(tool_name)
@@ -35,36 +185,53 @@ class CLI:
         assistant_streaming = False
         final_response : str | None = None
         
-        async for event in self.agent.run(message=message):
-            # print(event)
-            if event.type == AgentEventType.TEXT_DELTA:
-                content = event.data.get("content", "")
-                if not assistant_streaming:
-                    self.tui.begin_assistant()
-                    assistant_streaming = True
-                self.tui.stream_assistant_delta(content)
-            elif event.type == AgentEventType.TEXT_COMPLETE:
-                final_response = event.data.get("content", "")
-                if assistant_streaming:
-                    self.tui.end_assistant()
-                    assistant_streaming = False
-            elif event.type == AgentEventType.AGENT_ERROR:
-                error = event.data.get("error", "Unknown error")
-                console.print(f"[error]Agent Error:[/error] {error}")
-            elif event.type == AgentEventType.TOOL_CALL_START:
-                tool_name = event.data.get("tool_name", "unknown")
-                tool_kind = self._get_tool_kind(tool_name)
+        try:
+            async for event in self.agent.run(message=message):
+                # print(event)
+                if event.type == AgentEventType.TEXT_DELTA:
+                    content = event.data.get("content", "")
+                    if not assistant_streaming:
+                        self.tui.begin_assistant()
+                        assistant_streaming = True
+                    self.tui.stream_assistant_delta(content)
+                elif event.type == AgentEventType.TEXT_COMPLETE:
+                    final_response = event.data.get("content", "")
+                    if assistant_streaming:
+                        self.tui.end_assistant()
+                        assistant_streaming = False
+                elif event.type == AgentEventType.AGENT_ERROR:
+                    error = event.data.get("error", "Unknown error")
+                    self.console.print(f"[error]Agent Error:[/error] {error}")
+                elif event.type == AgentEventType.TOOL_CALL_START:
+                    tool_name = event.data.get("tool_name", "unknown")
+                    tool_kind = self._get_tool_kind(tool_name)
                 
-                self.tui.tool_call_start(
-                    event.data.get("call_id", ""),
-                    tool_name,
-                    tool_kind,
-                    event.data.get("arguments", {}),
-                )
+                    self.tui.tool_call_start(
+                        event.data.get("call_id", ""),
+                        tool_name,
+                        tool_kind,
+                        event.data.get("arguments", {}),
+                    )
+        finally:
+            # stop the live display if the answer was interrupted mid-stream
+            if assistant_streaming:
+                self.tui.end_assistant()
 
         return final_response
 
+# started before the agent is set up: the TCP/TLS handshake to the endpoint, and loading the
+# tokenizer in a background thread, which otherwise blocks the first token count
+def _start_prewarm() -> asyncio.Task[None]:
+    import asyncio
+    from client.transport import prewarm
+    from utils.text import prewarm_encoding
+
+    config = get_config()
+    prewarm_encoding(config.model)
+    return asyncio.create_task(prewarm(config.base_url))
+
 async def run(messages: dict[str,Any]):
+    from client.llm_client import LLMClient
     client = LLMClient()
     async for event in client.chat_completion(messages=messages, stream=True):
         print(event)
@@ -72,15 +239,57 @@ async def run(messages: dict[str,Any]):
 
 @click.command()
 @click.argument("prompt", required=False)
+@click.option("--config", "config_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), help="Config file (TOML or JSON).")
+@click.option("--model", help="Model name sent to the endpoint.")
+@click.option("--base-url", help="OpenAI-compatible endpoint, e.g. http://127.0.0.1:8765/v1")
+@click.option("--timeout", "request_timeout", type=float, help="Request timeout in seconds.")
+@click.option("--max-turns", type=int, help="Maximum model turns per prompt.")
+@click.option("--trace-file", help="Append tracing spans to this JSONL file.")
+@click.option("--output", type=click.Choice(["text", "jsonl"]), default="text", show_default=True, help="jsonl writes every agent event to stdout as one JSON object per line.")
+@click.option("--input", "input_format", type=click.Choice(["jsonl"]), help="Read prompts from stdin, one JSON string or {\"prompt\": ..., \"id\": ...} per line. Implies --output jsonl.")
+@click.option("--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY, show_default=True, help="Prompts run at once with --input jsonl.")
 
 def main(
     prompt: str | None,
+    config_path: Path | None,
+    model: str | None,
+    base_url: str | None,
+    request_timeout: float | None,
+    max_turns: int | None,
+    trace_file: str | None,
+    output: str,
+    input_format: str | None,
+    concurrency: int,
 ):
-    cli = CLI()
+    import asyncio
+
+    # flags win over AGENT_* environment variables, which win over the config file
+    set_config(load_config(
+        config_path,
+        overrides={
+            "model": model,
+            "base_url": base_url,
+            "request_timeout": request_timeout,
+            "max_turns": max_turns,
+            "trace_file": trace_file,
+        },
+    ))
+    if input_format == "jsonl":
+        failed = asyncio.run(CLI(output="jsonl").run_batch(sys.stdin, concurrency))
+        if failed:
+            sys.exit(1)
+        return
+
+    if not prompt and output == "jsonl":
+        raise click.UsageError("--output jsonl needs a PROMPT or --input jsonl")
+
+    cli = CLI(output=output)
     if prompt:
         result = asyncio.run(cli.run_single(prompt))
         if result is None:
             sys.exit(1)
+        return
+    cli.run_interactive()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
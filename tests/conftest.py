@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the packages live at the repo root, which isn't on sys.path when pytest is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config.settings as settings
+from config.settings import Config, set_config
+
+STUB_API_KEY_ENV = "STUB_API_KEY"
+
+# every test starts from a default config that reads no file or environment. tests that talk
+# to a StubServer point base_url at it
+@pytest.fixture(autouse=True)
+def stub_config(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv(STUB_API_KEY_ENV, "stub")
+    previous = settings._config
+    config = Config(model="stub-model", api_key_env=STUB_API_KEY_ENV)
+    set_config(config)
+    yield config
+    set_config(previous)
@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any, AsyncIterator
+
+from benchmarks.stub_server import StubServer
+from client.transport import close_http_client
+from config.settings import get_config, set_config
+
+# starts a StubServer on a free port and points the process config at it. the shared http
+# pool belongs to the test's event loop, so it is closed along with the server
+@asynccontextmanager
+async def stub_endpoint(
+        responses: list[dict[str, Any]],
+        server_class: type[StubServer] = StubServer,
+        **kwargs: Any,
+        )-> AsyncIterator[StubServer]:
+    server = server_class(responses, **kwargs)
+    await server.start()
+    set_config(replace(get_config(), base_url=server.base_url))
+    try:
+        yield server
+    finally:
+        await close_http_client()
+        await server.close()
+
+# every assistant tool call is answered by a tool message before the next assistant or
+# user message, which is what providers require of the history
+def assert_tool_calls_answered(messages: list[dict[str, Any]]) -> None:
+    pending : set[str] = set()
+    for message in messages:
+        if message["role"] in ("assistant", "user"):
+            assert not pending, f"unanswered tool calls: {pending}"
+        if message["role"] == "assistant":
+            pending = {call["id"] for call in message.get("tool_calls") or []}
+        elif message["role"] == "tool":
+            assert message["tool_call_id"] in pending, f"unexpected tool result {message['tool_call_id']}"
+            pending.discard(message["tool_call_id"])
+    assert not pending, f"unanswered tool calls: {pending}"
@@ -0,0 +1,58 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from agent.agent import Agent
+from agent.events import AgentEvent, AgentEventType
+from helpers import assert_tool_calls_answered, stub_endpoint
+
+def _read(path: Path) -> dict[str, Any]:
+    return {"content": "Let me look.", "tool_calls": [{"name": "read_file", "arguments": {"path": str(path)}}]}
+
+async def _run(responses: list[dict[str, Any]], **agent_kwargs: Any) -> tuple[list[AgentEvent], list[dict[str, Any]]]:
+    async with stub_endpoint(responses):
+        async with Agent(**agent_kwargs) as agent:
+            events = [event async for event in agent.run("Where is the loop?")]
+            return events, agent.context_manager.get_messages()
+
+def _end(events: list[AgentEvent]) -> dict[str, Any]:
+    assert events[-1].type == AgentEventType.AGENT_END
+    return events[-1].data
+
+def test_loop_runs_until_the_model_stops_calling_tools(tmp_path: Path):
+    source = tmp_path / "loop.py"
+    source.write_text("while True:\n    step()\n")
+    responses = [_read(source), _read(source), {"content": "It is in loop.py."}]
+
+    events, messages = asyncio.run(_run(responses))
+
+    end = _end(events)
+    assert end["stop_reason"] == "completed"
+    assert end["response"] == "It is in loop.py."
+    assert sum(1 for event in events if event.type == AgentEventType.TURN_START) == 3
+    assert [message["role"] for message in messages[1:]] == [
+        "user", "assistant", "tool", "assistant", "tool", "assistant",
+    ]
+    assert "step()" in messages[3]["content"]
+    assert_tool_calls_answered(messages)
+
+def test_turn_budget_stops_the_loop(tmp_path: Path):
+    source = tmp_path / "loop.py"
+    source.write_text("pass\n")
+
+    events, messages = asyncio.run(_run([_read(source)], max_turns=2))
+
+    assert _end(events)["stop_reason"] == "max_turns"
+    errors = [event for event in events if event.type == AgentEventType.AGENT_ERROR]
+    assert errors[-1].data["details"]["turns"] == 2
+    assert_tool_calls_answered(messages)
+
+def test_token_budget_stops_the_loop(tmp_path: Path):
+    source = tmp_path / "loop.py"
+    source.write_text("pass\n")
+
+    events, messages = asyncio.run(_run([_read(source)], max_total_tokens=1))
+
+    assert _end(events)["stop_reason"] == "token_budget"
+    assert sum(1 for event in events if event.type == AgentEventType.TURN_START) == 1
+    assert_tool_calls_answered(messages)
@@ -0,0 +1,14 @@
+import pytest
+
+from benchmarks.stats import percentile
+
+@pytest.mark.parametrize("values, fraction, expected", [
+    ([0.289, 0.0074], 0.95, 0.289),
+    ([0.289, 0.0074], 0.5, 0.0074),
+    ([5.0], 0.99, 5.0),
+    (list(range(1, 101)), 0.95, 95),
+    (list(range(1, 101)), 0.5, 50),
+    (list(range(100, 0, -1)), 0.99, 99),
+])
+def test_nearest_rank_percentile(values: list[float], fraction: float, expected: float):
+    assert percentile(values, fraction) == expected
@@ -0,0 +1,127 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from agent.agent import Agent
+from agent.scheduler import ToolScheduler
+from client.response import ToolCall
+from tools.base import CancellationToken, Tool, ToolInvocation, ToolKind, ToolResult
+from tools.builtin.read_file import ReadFileTool
+from tools.registry import ToolRegistry
+from helpers import assert_tool_calls_answered, stub_endpoint
+
+# sleeps in small steps and returns what it got through when its token is set
+class SlowTool(Tool):
+    name = "slow"
+    kind = ToolKind.READ
+    schema = {"type": "object", "properties": {"steps": {"type": "integer"}}}
+    timeout = 5.0
+
+    def __init__(self, ignore_cancellation: bool = False) -> None:
+        self.ignore_cancellation = ignore_cancellation
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        done = []
+        for step in range(invocation.params.get("steps", 20)):
+            if invocation.cancellation.cancelled and not self.ignore_cancellation:
+                return ToolResult.error_result("stopped early", output="\n".join(done))
+            await asyncio.sleep(0.01)
+            done.append(f"step {step}")
+        return ToolResult.success_result("\n".join(done))
+
+def _registry(tool: Tool) -> ToolRegistry:
+    registry = ToolRegistry(result_cache_bytes=0)
+    registry.register(tool)
+    return registry
+
+# -- timeouts --
+
+def test_timed_out_tool_keeps_its_partial_output():
+    tool = SlowTool()
+    tool.timeout = 0.05
+    result = asyncio.run(_registry(tool).invoke("slow", {"steps": 100}, Path.cwd()))
+
+    assert not result.success and result.timed_out
+    assert result.output.startswith("step 0")
+    assert result.error == "Tool slow timed out after 0.05s: stopped early"
+
+def test_tool_ignoring_its_token_is_cancelled_after_the_grace(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("tools.registry.TOOL_CANCEL_GRACE", 0.05)
+    tool = SlowTool(ignore_cancellation=True)
+    tool.timeout = 0.05
+    result = asyncio.run(_registry(tool).invoke("slow", {"steps": 1000}, Path.cwd()))
+
+    assert result.timed_out and result.output == ""
+    assert result.error == "Tool slow timed out after 0.05s without output"
+
+def test_read_file_stops_when_cancelled(tmp_path: Path):
+    path = tmp_path / "lines.txt"
+    path.write_text("line\n" * 100)
+    token = CancellationToken()
+    token.cancel()
+    invocation = ToolInvocation(params={"path": str(path)}, cwd=tmp_path, cancellation=token)
+
+    result = asyncio.run(ReadFileTool().execute(invocation))
+    assert result.error == "Read was cancelled before any line was read"
+
+# -- interrupted turns --
+
+def test_cancelled_scheduler_answers_every_call():
+    async def run() -> list[Any]:
+        scheduler = ToolScheduler(_registry(SlowTool()), Path.cwd(), max_concurrency=1)
+        for i in range(3):
+            scheduler.submit(ToolCall(call_id=f"call_{i}", name="slow", arguments={"steps": 100}))
+        await asyncio.sleep(0.02)
+        await scheduler.cancel()
+        return await scheduler.results()
+
+    results = asyncio.run(run())
+    assert [result.tool_call_id for result in results] == ["call_0", "call_1", "call_2"]
+    assert all(result.is_error and "was cancelled" in result.content for result in results)
+
+RESPONSES = [
+    {
+        "content": "Let me look at both.",
+        "tool_calls": [
+            {"name": "slow", "arguments": {"steps": 5}},
+            {"name": "slow", "arguments": {"steps": 5}},
+        ],
+    },
+    {"content": "Both are done."},
+]
+
+async def _run_until(agent: Agent, message: str, stop_after: int | None) -> int:
+    seen = 0
+    try:
+        async for _ in agent.run(message):
+            seen += 1
+            if seen == stop_after:
+                # what an interrupted REPL does to the task consuming the run
+                asyncio.current_task().cancel()
+    except asyncio.CancelledError:
+        pass
+    return seen
+
+def test_interrupted_run_leaves_a_valid_history():
+    async def count_events() -> int:
+        async with stub_endpoint(RESPONSES, token_rate=2000):
+            async with Agent() as agent:
+                agent.tool_registry.register(SlowTool())
+                return await _run_until(agent, "Check both", None)
+
+    async def run(stop_after: int) -> None:
+        async with stub_endpoint(RESPONSES, token_rate=2000):
+            async with Agent() as agent:
+                agent.tool_registry.register(SlowTool())
+                await _run_until(agent, "Check both", stop_after)
+                assert_tool_calls_answered(agent.context_manager.get_messages())
+                # the next run in the same session is accepted by the provider
+                await _run_until(agent, "Again", None)
+                assert_tool_calls_answered(agent.context_manager.get_messages())
+
+    total = asyncio.run(count_events())
+    assert total > 10
+    for stop_after in range(1, total):
+        asyncio.run(run(stop_after))
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from client.llm_client import LLMClient
+from context.compaction import SUMMARY_PREFIX, CompactionResult, ContextCompactor
+from context.manager import ContextManager
+from helpers import assert_tool_calls_answered, stub_endpoint
+
+MODEL = "stub-model"
+SUMMARY = [{"content": "The user is looking for the agentic loop."}]
+
+def _tool_turn(manager: ContextManager, call_id: str, output: str) -> None:
+    manager.add_assistant_message(
+        None,
+        [{"id": call_id, "type": "function", "function": {"name": "read_file", "arguments": "{}"}}],
+    )
+    manager.add_tool_result_message(call_id, output)
+
+def _chat(manager: ContextManager, turns: int, size: int) -> None:
+    for i in range(turns):
+        manager.add_user_message(f"question {i} " + "q" * size)
+        manager.add_assistant_message(f"answer {i} " + "a" * size)
+
+def _roles_alternate(messages: list[dict[str, Any]]) -> bool:
+    roles = [message["role"] for message in messages if message["role"] in ("user", "assistant")]
+    return all(a != b or a == "assistant" for a, b in zip(roles, roles[1:]))
+
+async def _compact(
+        manager: ContextManager,
+        responses: list[dict[str, Any]],
+        times: int = 1,
+        **stub_kwargs: Any,
+        )-> tuple[list[CompactionResult], ContextCompactor, int]:
+    async with stub_endpoint(responses, **stub_kwargs) as server:
+        # over the threshold right now, and well over the target
+        compactor = ContextCompactor(LLMClient(), context_window=manager.total_tokens, keep_recent_messages=4)
+        results = [await compactor.compact(manager) for _ in range(times)]
+        return results, compactor, server.requests
+
+def test_eliding_old_tool_outputs_can_be_enough():
+    manager = ContextManager(MODEL)
+    manager.add_user_message("Where is the loop?")
+    for i in range(4):
+        _tool_turn(manager, f"call_{i}", "x" * 20_000)
+    _chat(manager, 2, 10)
+
+    (result,), _, requests = asyncio.run(_compact(manager, SUMMARY))
+
+    assert result.elided_tool_results == 4 and result.summarized_messages == 0
+    assert requests == 0
+    assert result.tokens_after <= result.tokens_before // 2
+    assert_tool_calls_answered(manager.get_messages())
+
+def test_old_messages_are_summarized():
+    manager = ContextManager(MODEL)
+    _chat(manager, 20, 2_000)
+    tail = [item.content for item in manager.messages[-4:]]
+
+    (result,), _, requests = asyncio.run(_compact(manager, SUMMARY))
+
+    assert requests == 1
+    assert result.summarized_messages == 36 and result.error is None
+    messages = manager.get_messages()
+    assert messages[1]["role"] == "user"
+    assert messages[1]["content"].startswith(SUMMARY_PREFIX + SUMMARY[0]["content"])
+    # the first kept message was a user message too: merged, not stacked
+    assert messages[1]["content"].endswith(tail[0])
+    assert [message["content"] for message in messages[2:]] == tail[1:]
+    assert _roles_alternate(messages)
+
+def test_summarization_error_keeps_the_history():
+    manager = ContextManager(MODEL)
+    _chat(manager, 20, 2_000)
+    before = list(manager.get_messages())
+
+    (result,), _, requests = asyncio.run(_compact(manager, SUMMARY, error_rate=1.0, error_status=400))
+
+    assert requests == 1
+    assert result.error and result.summarized_messages == 0
+    assert manager.get_messages() == before
+
+def test_oversized_recent_tool_output_is_truncated_instead_of_summarized():
+    manager = ContextManager(MODEL)
+    manager.add_user_message("Read the log")
+    _tool_turn(manager, "call_log", "log line\n" * 20_000)
+
+    (result,), compactor, requests = asyncio.run(_compact(manager, SUMMARY))
+
+    assert result.truncated_tool_results == 1 and result.summarized_messages == 0
+    assert requests == 0
+    assert manager.messages[-1].token_count <= compactor.max_recent_tool_tokens
+    assert_tool_calls_answered(manager.get_messages())
+
+def test_compaction_without_progress_is_not_repeated():
+    manager = ContextManager(MODEL)
+    _chat(manager, 10, 200)
+    # the recent messages alone are over the target, a summary can't fix that
+    manager.add_assistant_message("b" * 40_000)
+    manager.add_user_message("c" * 40_000)
+    manager.add_assistant_message("d" * 40_000)
+
+    results, compactor, requests = asyncio.run(_compact(manager, SUMMARY, times=2))
+
+    assert results[0].summarized_messages > 0
+    # the second pass found only the previous summary before the recent messages
+    assert results[1].summarized_messages == 0 and requests == 1
+    compactor.context_window = results[1].tokens_after
+    assert not compactor.should_compact(manager)
+    manager.add_user_message("one more question")
+    assert compactor.should_compact(manager)
+
+def test_at_least_one_recent_message_is_kept():
+    with pytest.raises(ValueError):
+        ContextCompactor(None, keep_recent_messages=0)
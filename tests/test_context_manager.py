@@ -0,0 +1,63 @@
+import json
+from typing import Any
+
+from context.manager import ContextManager, MessageItem
+from utils.text import count_tokens
+
+MODEL = "stub-model"
+
+def _fresh(manager: ContextManager) -> list[dict[str, Any]]:
+    # what get_messages() would return if it serialized the whole history every time
+    return [
+        {"role": "system", "content": manager._system_prompt},
+        *(item.to_dict() for item in manager.messages),
+    ]
+
+def _fill(manager: ContextManager) -> None:
+    manager.add_user_message("Where is the loop?")
+    manager.add_assistant_message(
+        "Let me look.",
+        [{"id": "call_1", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}],
+    )
+    manager.add_tool_result_message("call_1", "while True:\n    step()")
+    manager.add_assistant_message(None)
+    manager.add_user_message("Thanks")
+
+def test_incremental_messages_match_a_full_serialization():
+    manager = ContextManager(MODEL)
+    _fill(manager)
+    assert manager.get_messages() == _fresh(manager)
+
+def test_each_request_extends_the_previous_one():
+    manager = ContextManager(MODEL)
+    previous : list[str] = []
+    for add in (
+        lambda: manager.add_user_message("one"),
+        lambda: manager.add_assistant_message("two"),
+        lambda: manager.add_user_message("three"),
+    ):
+        add()
+        current = [json.dumps(message, sort_keys=True) for message in manager.get_messages()]
+        # a byte-identical prefix is what keeps provider prompt caches hitting
+        assert current[:len(previous)] == previous
+        assert len(current) == len(previous) + (1 if previous else 2)
+        previous = current
+
+def test_replace_messages_rebuilds_messages_and_tokens():
+    manager = ContextManager(MODEL)
+    _fill(manager)
+    summary = MessageItem(role="user", content="Summary of the conversation so far", token_count=7)
+    manager.replace_messages([summary, manager.messages[-1]])
+
+    assert manager.get_messages() == _fresh(manager)
+    assert manager.total_tokens == (
+        count_tokens(manager._system_prompt, MODEL) + 7 + count_tokens("Thanks", MODEL)
+    )
+
+def test_total_tokens_tracks_every_message():
+    manager = ContextManager(MODEL)
+    _fill(manager)
+    expected = count_tokens(manager._system_prompt, MODEL) + sum(
+        count_tokens(item.content, MODEL) for item in manager.messages
+    )
+    assert manager.total_tokens == expected
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any, AsyncIterator
+
+from benchmarks.stub_server import StubServer
+from client.llm_client import LLMClient
+from client.rate_limit import RateLimiter
+from client.response import StreamEvent, StreamEventType
+from client.retry import RetryPolicy
+from config.settings import Endpoint, get_config, set_config
+from helpers import stub_endpoint
+
+RESPONSES = [{"content": "The loop is in agent/agent.py."}]
+MESSAGES = [{"role": "user", "content": "Where is the loop?"}]
+# a backoff this long would show up in every timing below
+SLOW_BACKOFF = RetryPolicy(max_retries=1, base_delay=5.0, max_delay=5.0)
+
+# a primary endpoint and a fallback, each its own stub server
+@asynccontextmanager
+async def _endpoints(
+        primary: dict[str, Any],
+        secondary: dict[str, Any],
+        **config: Any,
+        )-> AsyncIterator[tuple[StubServer, StubServer]]:
+    async with stub_endpoint(RESPONSES, **primary) as primary_server:
+        secondary_server = StubServer(RESPONSES, **secondary)
+        await secondary_server.start()
+        set_config(replace(
+            get_config(),
+            model="primary",
+            fallback_endpoints=(Endpoint(secondary_server.base_url, "secondary"),),
+            **config,
+        ))
+        try:
+            yield primary_server, secondary_server
+        finally:
+            await secondary_server.close()
+
+async def _complete(client: LLMClient) -> tuple[list[StreamEvent], float]:
+    start = time.monotonic()
+    events = [event async for event in client.chat_completion(MESSAGES)]
+    return events, time.monotonic() - start
+
+def test_fails_over_without_waiting():
+    async def run() -> None:
+        async with _endpoints({"error_rate": 1.0, "error_status": 503}, {}) as (primary, secondary):
+            client = LLMClient(retry_policy=SLOW_BACKOFF)
+            events, elapsed = await _complete(client)
+
+            retry = next(event.retry for event in events if event.type == StreamEventType.RETRY)
+            assert retry.failover and retry.delay == 0.0 and retry.endpoint.startswith("secondary@")
+            complete = events[-1]
+            assert complete.type == StreamEventType.MESSAGE_COMPLETE
+            assert complete.backend.endpoint.startswith("secondary@") and complete.backend.failovers == 1
+            assert (primary.requests, secondary.requests) == (1, 1)
+            assert elapsed < 1.0
+
+    asyncio.run(run())
+
+def test_bad_request_does_not_fail_over():
+    async def run() -> None:
+        async with _endpoints({"error_rate": 1.0, "error_status": 400}, {}) as (primary, secondary):
+            events, _ = await _complete(LLMClient(retry_policy=SLOW_BACKOFF))
+
+            assert events[-1].type == StreamEventType.ERROR
+            assert secondary.requests == 0
+
+    asyncio.run(run())
+
+def test_full_round_of_failures_backs_off_then_starts_over():
+    async def run() -> None:
+        failing = {"error_rate": 1.0, "error_status": 503}
+        async with _endpoints(failing, failing) as (primary, secondary):
+            policy = RetryPolicy(max_retries=1, base_delay=0.01, max_delay=0.01)
+            events, _ = await _complete(LLMClient(retry_policy=policy))
+
+            retries = [event.retry for event in events if event.type == StreamEventType.RETRY]
+            # failover, backoff back to the primary, failover again
+            assert [retry.failover for retry in retries] == [True, False, True]
+            assert retries[1].endpoint.startswith("primary@")
+            assert events[-1].type == StreamEventType.ERROR
+            assert (primary.requests, secondary.requests) == (2, 2)
+
+    asyncio.run(run())
+
+def test_slow_primary_is_hedged():
+    async def run() -> None:
+        async with _endpoints({"latency": 2.0}, {}, hedge_percentile=0.9, hedge_initial_delay=0.05) as (primary, secondary):
+            limiter = RateLimiter(max_concurrency=4)
+            client = LLMClient(rate_limiter=limiter)
+            events, elapsed = await _complete(client)
+
+            backend = events[-1].backend
+            assert backend.hedged and backend.endpoint.startswith("secondary@")
+            assert elapsed < 1.0
+            assert (primary.requests, secondary.requests) == (1, 1)
+            # the losing request was cancelled and gave its slot back
+            assert limiter.in_flight == 0
+            assert client.endpoint_stats[backend.endpoint].hedges == 1
+
+    asyncio.run(run())
+
+def test_fast_primary_is_not_hedged():
+    async def run() -> None:
+        async with _endpoints({}, {}, hedge_percentile=0.9, hedge_initial_delay=1.0) as (primary, secondary):
+            events, _ = await _complete(LLMClient())
+
+            backend = events[-1].backend
+            assert not backend.hedged and backend.endpoint.startswith("primary@")
+            assert secondary.requests == 0
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+import random
+from pathlib import Path
+
+import pytest
+
+import utils.line_index as line_index
+from utils.line_index import FileKey, LineIndex, LineIndexCache
+from utils.line_reader import open_mmap
+
+def _line_starts(data: bytes) -> list[int]:
+    # the linear scan the index has to agree with
+    starts = [0] if data else []
+    for pos, byte in enumerate(data):
+        if byte == ord("\n") and pos + 1 < len(data):
+            starts.append(pos + 1)
+    return starts
+
+def _write(path: Path, rng: random.Random, lines: int, trailing_newline: bool) -> bytes:
+    data = "\n".join("x" * rng.choice((0, 1, 5, 40, 300)) for _ in range(lines))
+    if trailing_newline:
+        data += "\n"
+    path.write_bytes(data.encode())
+    return data.encode()
+
+@pytest.mark.parametrize("stride", [1, 3, 7, 64])
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_line_starts_match_a_linear_scan(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        stride: int,
+        trailing_newline: bool,
+        ):
+    # small chunks so checkpoints land on both sides of chunk boundaries
+    monkeypatch.setattr(line_index, "READ_CHUNK_SIZE", 97)
+    path = tmp_path / "lines.txt"
+    data = _write(path, random.Random(stride), 500, trailing_newline)
+    expected = _line_starts(data)
+
+    with open_mmap(path) as mm:
+        index = LineIndex.build(mm, FileKey.from_path(path), stride=stride)
+        assert index.total_lines == len(expected)
+        assert [index.line_start(mm, line) for line in range(len(expected))] == expected
+        assert index.line_start(mm, len(expected)) is None
+
+def test_sidecar_round_trip(tmp_path: Path):
+    path = tmp_path / "lines.txt"
+    data = _write(path, random.Random(0), 2000, True)
+    cache_dir = tmp_path / "index"
+
+    with open_mmap(path) as mm:
+        built, source = LineIndexCache(cache_dir=cache_dir).get(path, mm)
+        assert source == "built"
+        loaded, source = LineIndexCache(cache_dir=cache_dir).get(path, mm)
+        assert source == "disk"
+        assert loaded.checkpoints == built.checkpoints
+        assert loaded.total_lines == built.total_lines == len(_line_starts(data))
+
+def test_changed_file_is_reindexed(tmp_path: Path):
+    path = tmp_path / "lines.txt"
+    cache = LineIndexCache(cache_dir=tmp_path / "index")
+    _write(path, random.Random(0), 100, True)
+    with open_mmap(path) as mm:
+        cache.get(path, mm)
+
+    # the sidecar keeps its name, the stored size and mtime tell it is stale
+    data = _write(path, random.Random(1), 300, True)
+    with open_mmap(path) as mm:
+        index, source = cache.get(path, mm)
+        assert source == "built"
+        assert index.total_lines == len(_line_starts(data))
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from conftest import STUB_API_KEY_ENV
+
+MAIN = Path(__file__).resolve().parent.parent / "main.py"
+# the second response only goes out to a request that already has an assistant message in it,
+# i.e. to a prompt that sees another prompt's history
+RESPONSES = [{"content": "Answer."}, {"content": "Leaked history."}]
+
+# keeps the messages of every chat request, and answers a prompt mentioning "fail" with a 400
+class RecordingStub(StubServer):
+    def __init__(self, responses: list[dict[str, Any]], **kwargs: Any) -> None:
+        super().__init__(responses, **kwargs)
+        self.conversations : list[list[dict[str, Any]]] = []
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if method == "POST" and path.endswith("/chat/completions"):
+            messages = json.loads(body)["messages"]
+            self.conversations.append(messages)
+            if "fail" in messages[-1].get("content", ""):
+                self.requests += 1
+                self._write_json(writer, {"error": {"message": "Bad prompt", "code": 400}}, status=400)
+                return
+        await super()._route(method, path, body, writer)
+
+# on a loop of its own, the CLI runs in a subprocess
+@pytest.fixture
+def server() -> Iterator[RecordingStub]:
+    loop = asyncio.new_event_loop()
+    server = RecordingStub(RESPONSES)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+def _main(
+        server: StubServer,
+        tmp_path: Path,
+        *args: str,
+        stdin: str = "",
+        )-> tuple[int, list[dict[str, Any]], str]:
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if not name.startswith("AGENT_")
+    }
+    env["AGENT_API_KEY_ENV"] = STUB_API_KEY_ENV
+    result = subprocess.run(
+        [sys.executable, str(MAIN), "--base-url", server.base_url, *args],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        # no config file gets picked up from the working directory
+        cwd=tmp_path,
+        env=env,
+        timeout=60,
+    )
+    # every line of stdout is one event
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    return result.returncode, records, result.stderr
+
+def test_single_prompt_writes_one_event_per_line(server: RecordingStub, tmp_path: Path):
+    code, records, _ = _main(server, tmp_path, "--output", "jsonl", "Hello")
+
+    assert code == 0
+    assert all(set(record) == {"type", "data"} for record in records)
+    types = [record["type"] for record in records]
+    assert types[0] == "agent_start" and types[-1] == "agent_end"
+    assert records[0]["data"]["message"] == "Hello"
+    assert "text_delta" in types
+    complete = next(record for record in records if record["type"] == "text_complete")
+    assert complete["data"]["content"] == "Answer."
+    assert records[-1]["data"]["stop_reason"] == "completed"
+
+def test_jsonl_output_needs_a_prompt(server: RecordingStub, tmp_path: Path):
+    code, records, stderr = _main(server, tmp_path, "--output", "jsonl")
+    assert code == 2 and not records
+    assert "--output jsonl needs a PROMPT" in stderr
+
+def test_batch_prompts_are_isolated(server: RecordingStub, tmp_path: Path):
+    lines = ['{"prompt": "First", "id": "a"}', '"Second"', "", '{"prompt": "Third", "id": 7}']
+    code, records, _ = _main(server, tmp_path, "--input", "jsonl", "--concurrency", "2", stdin="\n".join(lines) + "\n")
+
+    assert code == 0
+    # ids come from the line, or are the prompt's position among the non-blank lines
+    by_id : dict[Any, list[dict[str, Any]]] = {}
+    for record in records:
+        assert set(record) == {"id", "type", "data"}
+        by_id.setdefault(record["id"], []).append(record)
+    assert set(by_id) == {"a", 1, 7}
+    for id, prompt in (("a", "First"), (1, "Second"), (7, "Third")):
+        events = by_id[id]
+        assert events[0]["type"] == "agent_start" and events[0]["data"]["message"] == prompt
+        assert events[-1]["type"] == "agent_end" and events[-1]["data"]["response"] == "Answer."
+
+    # every agent sent only its own prompt
+    assert len(server.conversations) == 3
+    for messages in server.conversations:
+        assert [message["role"] for message in messages if message["role"] != "system"] == ["user"]
+
+def test_batch_exits_with_an_error_when_a_prompt_fails(server: RecordingStub, tmp_path: Path):
+    lines = ['"Fine"', "not json", '{"id": "empty"}', '{"prompt": "please fail", "id": "bad"}', '"Also fine"']
+    code, records, _ = _main(server, tmp_path, "--input", "jsonl", stdin="\n".join(lines) + "\n")
+
+    assert code == 1
+    input_errors = {record["id"] for record in records if record["type"] == "input_error"}
+    assert input_errors == {1, 2}
+    bad = [record for record in records if record["id"] == "bad"]
+    assert any(record["type"] == "agent_error" for record in bad)
+    assert bad[-1]["data"]["stop_reason"] != "completed"
+    # the failures don't stop the prompts around them
+    for id in (0, 4):
+        end = [record for record in records if record["id"] == id][-1]
+        assert end["type"] == "agent_end" and end["data"]["response"] == "Answer."
@@ -0,0 +1,84 @@
+import pytest
+
+from ui.renderer import MarkdownBlockSplitter
+
+# each document with the blocks it is cut into; the last one is only returned by flush()
+DOCUMENTS = {
+    "paragraphs": [
+        "First paragraph\nstill the first.\n\n",
+        "Second one.\n\n",
+        "And the tail, unfinished",
+    ],
+    "fence": [
+        "Before the code:\n\n",
+        "```python\ndef f():\n\n    return 1\n```\n",
+        "\n",
+        "After.\n",
+    ],
+    "tilde fence": [
+        "~~~\n``` not a fence in here\n\n~~~\n",
+        "done\n",
+    ],
+    # ``` inside a ```` block is content, and so is ```` followed by text
+    "longer fence": [
+        "````markdown\n```js\n\nx()\n```\n```` not yet\n\n`````\n",
+        "after\n",
+    ],
+    "lists": [
+        "- one\n- two\n  continued\n\n",
+        "1. first\n2. second\n\n",
+        "\n",
+        "* loose item\n",
+    ],
+    "unclosed fence": [
+        "intro\n\n",
+        "```\ncode that never\n\nends",
+    ],
+}
+
+def _feed(text: str, size: int) -> tuple[list[str], str]:
+    splitter = MarkdownBlockSplitter()
+    blocks = [splitter.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return [block for block in blocks if block], splitter.flush()
+
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_blocks_one_character_at_a_time(name: str):
+    expected = DOCUMENTS[name]
+    blocks, rest = _feed("".join(expected), 1)
+    assert blocks == expected[:-1]
+    assert rest == expected[-1]
+
+# bigger chunks can finish several blocks at once, but never cut anywhere else
+@pytest.mark.parametrize("size", [2, 3, 5, 7, 16, 1000])
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_chunk_boundaries_do_not_change_the_cuts(name: str, size: int):
+    expected = DOCUMENTS[name]
+    text = "".join(expected)
+    cuts = set()
+    offset = 0
+    for block in expected:
+        offset += len(block)
+        cuts.add(offset)
+
+    blocks, rest = _feed(text, size)
+    assert "".join(blocks) + rest == text
+    offset = 0
+    for block in blocks:
+        offset += len(block)
+        assert offset in cuts
+
+def test_fence_split_across_chunks():
+    splitter = MarkdownBlockSplitter()
+    assert splitter.feed("`") == ""
+    assert splitter.feed("``py\nx = 1\n\ny = 2\n`") == ""
+    assert splitter.feed("`") == ""
+    assert splitter.feed("`\nnext") == "```py\nx = 1\n\ny = 2\n```\n"
+    assert splitter.flush() == "next"
+
+def test_flush_resets_the_splitter():
+    splitter = MarkdownBlockSplitter()
+    splitter.feed("```\nopen fence\n")
+    assert splitter.flush() == "```\nopen fence\n"
+    assert splitter.flush() == ""
+    # the fence left open by the previous stream does not carry over
+    assert splitter.feed("text\n\n") == "text\n\n"
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+from client.rate_limit import RateLimiter, RequestPriority, TokenBucket
+
+BATCH = RequestPriority.BATCH
+INTERACTIVE = RequestPriority.INTERACTIVE
+
+async def _queue(limiter: RateLimiter, requests: list[tuple[str, int, RequestPriority]]) -> tuple[list[str], list[asyncio.Task]]:
+    # queues the requests in order and returns the order in which they get granted
+    granted : list[str] = []
+
+    async def request(name: str, tokens: int, priority: RequestPriority) -> None:
+        lease = await limiter.acquire(tokens, priority)
+        granted.append(name)
+        lease.release()
+
+    tasks = []
+    for name, tokens, priority in requests:
+        tasks.append(asyncio.create_task(request(name, tokens, priority)))
+        # let it reach the queue before the next one arrives
+        await asyncio.sleep(0)
+    return granted, tasks
+
+def test_interactive_requests_go_before_batch():
+    async def run() -> list[str]:
+        limiter = RateLimiter(max_concurrency=1)
+        held = await limiter.acquire(1)
+        granted, tasks = await _queue(limiter, [
+            ("batch1", 1, BATCH),
+            ("interactive1", 1, INTERACTIVE),
+            ("batch2", 1, BATCH),
+            ("interactive2", 1, INTERACTIVE),
+        ])
+        assert limiter.queue_depth == 4
+        held.release()
+        await asyncio.gather(*tasks)
+        assert limiter.in_flight == 0
+        return granted
+
+    assert asyncio.run(run()) == ["interactive1", "interactive2", "batch1", "batch2"]
+
+def test_large_request_is_not_starved_by_smaller_ones():
+    async def run() -> list[str]:
+        # 1000 tokens a second, at most 100 at once
+        limiter = RateLimiter(tokens_per_minute=60_000, burst_seconds=0.1)
+        (await limiter.acquire(100)).release()
+        granted, tasks = await _queue(limiter, [
+            ("large", 100, INTERACTIVE),
+            ("small1", 1, INTERACTIVE),
+            ("small2", 1, INTERACTIVE),
+        ])
+        await asyncio.gather(*tasks)
+        return granted
+
+    # the small ones would fit right away, but they queued behind the large one
+    assert asyncio.run(run()) == ["large", "small1", "small2"]
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def run() -> None:
+        limiter = RateLimiter(max_concurrency=1)
+        held = await limiter.acquire(1)
+        waiter = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        held.release()
+
+        lease = await asyncio.wait_for(limiter.acquire(1), timeout=1)
+        assert limiter.in_flight == 1
+        lease.release()
+        assert limiter.in_flight == 0 and limiter.queue_depth == 0
+
+    asyncio.run(run())
+
+def test_pause_holds_back_queued_requests():
+    async def run() -> float:
+        limiter = RateLimiter(max_concurrency=4)
+        limiter.pause(0.1)
+        start = time.monotonic()
+        (await limiter.acquire(1)).release()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.09
+
+def test_settle_charges_the_actual_usage():
+    limiter = RateLimiter(tokens_per_minute=60_000)
+
+    async def run() -> None:
+        lease = await limiter.acquire(1_000)
+        lease.settle(200)
+        lease.release()
+
+    asyncio.run(run())
+    # the 800 tokens reserved but not used went back (give or take the refill meanwhile)
+    assert limiter._tokens.level >= 60_000 - 200 - 1
+
+def test_bucket_refills_continuously():
+    bucket = TokenBucket(rate_per_minute=6_000, capacity=100)
+    bucket.consume(100)
+    assert bucket.time_until(50) > 0.4
+    # bigger than the bucket only waits for a full one
+    assert bucket.time_until(1_000) == pytest.approx(bucket.time_until(100), abs=0.01)
+
+def test_refund_wakes_a_queued_request():
+    async def run() -> None:
+        # 10 tokens a second, at most 100 at once: the waiter would wait 5 seconds for a refill
+        limiter = RateLimiter(tokens_per_minute=600, burst_seconds=10)
+        lease = await limiter.acquire(100)
+        waiter = asyncio.create_task(limiter.acquire(50))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        # the request only used 10 of the 100 tokens it reserved, and is still streaming
+        lease.settle(10)
+        (await asyncio.wait_for(waiter, timeout=1)).release()
+        lease.release()
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+import asyncio
+from dataclasses import replace
+from pathlib import Path
+
+from config.settings import get_config, set_config
+from tools.base import ToolInvocation, ToolResult
+from tools.builtin.read_file import ReadFileTool
+
+def _read(path: Path, **params) -> ToolResult:
+    invocation = ToolInvocation(params={"path": str(path), **params}, cwd=path.parent)
+    return asyncio.run(ReadFileTool().execute(invocation))
+
+def _numbered(count: int) -> str:
+    return "".join(f"line {i}\n" for i in range(1, count + 1))
+
+def test_reads_the_requested_window(tmp_path: Path):
+    path = tmp_path / "ten.txt"
+    path.write_text(_numbered(10))
+
+    result = _read(path, offset=3, limit=2)
+
+    assert result.success
+    assert result.output == "Showing lines 3-4 of 10.\n\n     3|line 3\n     4|line 4"
+    assert (result.metadata["shown_start"], result.metadata["shown_end"]) == (3, 4)
+
+def test_whole_file_has_no_header(tmp_path: Path):
+    path = tmp_path / "three.txt"
+    path.write_text(_numbered(3))
+
+    result = _read(path)
+
+    assert result.output == "     1|line 1\n     2|line 2\n     3|line 3"
+    assert result.metadata["total_lines"] == 3
+
+def test_offset_past_the_end_is_an_error(tmp_path: Path):
+    path = tmp_path / "three.txt"
+    path.write_text(_numbered(3))
+
+    result = _read(path, offset=4)
+
+    assert not result.success
+    assert "past the end of the file (3 lines)" in result.error
+
+def test_output_is_cut_at_the_token_budget(tmp_path: Path):
+    set_config(replace(get_config(), read_max_output_tokens=200))
+    path = tmp_path / "long.txt"
+    path.write_text(_numbered(10_000))
+
+    result = _read(path)
+
+    assert result.success and result.truncated
+    shown_end = result.metadata["shown_end"]
+    assert 1 < shown_end < 10_000
+    # the header names the lines that survived truncation
+    assert result.output.startswith(f"Showing lines 1-{shown_end} of 10000.")
+    assert f"{shown_end:6}|line {shown_end}\n" in result.output
+    assert f"{shown_end + 1:6}|" not in result.output
+
+def test_limit_bypasses_the_file_size_cap(tmp_path: Path):
+    set_config(replace(get_config(), read_max_file_size=1024))
+    path = tmp_path / "big.txt"
+    path.write_text(_numbered(1000))
+
+    assert not _read(path).success
+    result = _read(path, offset=500, limit=1)
+    assert result.success
+    assert result.output.endswith("   500|line 500")
@@ -0,0 +1,59 @@
+from tools.base import Tool, ToolInvocation, ToolResult
+from tools.registry import ToolRegistry, create_default_registry
+
+class NamedTool(Tool):
+    schema = {"type": "object", "properties": {"value": {"type": "string"}}}
+
+    def __init__(self, name: str, description: str = "Does a thing") -> None:
+        self.name = name
+        self.description = description
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        return ToolResult.success_result(self.name)
+
+def _names(registry: ToolRegistry) -> list[str]:
+    return [schema["function"]["name"] for schema in registry.get_schemas()]
+
+def test_schemas_are_sorted_and_built_once():
+    registry = ToolRegistry()
+    for name in ("write", "list", "read"):
+        registry.register(NamedTool(name))
+
+    schemas = registry.get_schemas()
+    assert _names(registry) == ["list", "read", "write"]
+    assert registry.get_schemas() is schemas
+    assert registry.schemas_hash == registry.schemas_hash
+
+def test_register_and_unregister_rebuild_the_schemas():
+    registry = ToolRegistry()
+    registry.register(NamedTool("read"))
+    schemas, first_hash = registry.get_schemas(), registry.schemas_hash
+
+    registry.register(NamedTool("write"))
+    assert _names(registry) == ["read", "write"]
+    assert registry.schemas_hash != first_hash
+
+    assert registry.unregister("write")
+    assert registry.get_schemas() is not schemas
+    # same tools, same payload, same hash
+    assert registry.get_schemas() == schemas
+    assert registry.schemas_hash == first_hash
+
+    # a replaced tool shows up with its new schema
+    registry.register(NamedTool("read", description="Reads a thing"))
+    assert registry.get_schemas()[0]["function"]["description"] == "Reads a thing"
+    assert registry.schemas_hash != first_hash
+
+def test_unregistering_an_unknown_tool_keeps_the_schemas():
+    registry = ToolRegistry()
+    registry.register(NamedTool("read"))
+    schemas = registry.get_schemas()
+    assert not registry.unregister("missing")
+    assert registry.get_schemas() is schemas
+
+def test_hash_does_not_depend_on_registration_order():
+    registries = [create_default_registry(), ToolRegistry()]
+    for tool in reversed(list(registries[0]._tools.values())):
+        registries[1].register(tool)
+    assert registries[0].schemas_hash == registries[1].schemas_hash
+    assert registries[0].get_schemas() == registries[1].get_schemas()
@@ -0,0 +1,115 @@
+import asyncio
+from typing import AsyncGenerator
+
+from client.response import (
+    StreamEvent,
+    StreamEventType,
+    TextBuffer,
+    TextDelta,
+    ToolCallDelta,
+    coalesce_text_deltas,
+)
+
+def _text(content: str) -> StreamEvent:
+    return StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta(content))
+
+def _tool_start(call_id: str) -> StreamEvent:
+    return StreamEvent(
+        type=StreamEventType.TOOL_CALL_START,
+        tool_call_delta=ToolCallDelta(call_id=call_id, name="read_file"),
+    )
+
+# an event source that waits `gap` seconds before every event and notes when it was closed
+class Source:
+    def __init__(self, events: list[StreamEvent], gap: float = 0.0) -> None:
+        self.events = events
+        self.gap = gap
+        self.closed = False
+
+    async def stream(self) -> AsyncGenerator[StreamEvent, None]:
+        try:
+            for event in self.events:
+                await asyncio.sleep(self.gap)
+                yield event
+        finally:
+            self.closed = True
+
+# each event as its type and its text, or the call id for tool call events
+def _coalesce(source: Source, window: float) -> list[tuple[StreamEventType, str | None]]:
+    async def run() -> list[StreamEvent]:
+        return [event async for event in coalesce_text_deltas(source.stream(), window)]
+
+    summary : list[tuple[StreamEventType, str | None]] = []
+    for event in asyncio.run(run()):
+        if event.text_delta:
+            summary.append((event.type, event.text_delta.content))
+        else:
+            summary.append((event.type, event.tool_call_delta.call_id if event.tool_call_delta else None))
+    return summary
+
+def test_first_delta_passes_and_the_rest_merge_within_the_window():
+    source = Source([_text(piece) for piece in ("a", "b", "c", "d")])
+    assert _coalesce(source, window=10.0) == [
+        (StreamEventType.TEXT_DELTA, "a"),
+        (StreamEventType.TEXT_DELTA, "bcd"),
+    ]
+    assert source.closed
+
+def test_held_text_is_flushed_once_the_window_passes():
+    # every gap is longer than the window, so each held delta goes out with the next one
+    source = Source([_text(piece) for piece in ("a", "b", "c", "d", "e")], gap=0.03)
+    assert _coalesce(source, window=0.01) == [
+        (StreamEventType.TEXT_DELTA, "a"),
+        (StreamEventType.TEXT_DELTA, "bc"),
+        (StreamEventType.TEXT_DELTA, "de"),
+    ]
+
+def test_zero_window_passes_every_delta_through():
+    source = Source([_text(piece) for piece in ("a", "b", "c")])
+    assert [content for _, content in _coalesce(source, window=0.0)] == ["a", "b", "c"]
+
+def test_other_events_flush_held_text_first():
+    source = Source([
+        _text("a"),
+        _text("b"),
+        _text("c"),
+        _tool_start("call_0"),
+        _text("d"),
+        _tool_start("call_1"),
+        StreamEvent(type=StreamEventType.MESSAGE_COMPLETE),
+    ])
+    assert _coalesce(source, window=10.0) == [
+        (StreamEventType.TEXT_DELTA, "a"),
+        (StreamEventType.TEXT_DELTA, "bc"),
+        (StreamEventType.TOOL_CALL_START, "call_0"),
+        (StreamEventType.TEXT_DELTA, "d"),
+        (StreamEventType.TOOL_CALL_START, "call_1"),
+        (StreamEventType.MESSAGE_COMPLETE, None),
+    ]
+
+def test_closing_early_closes_the_source():
+    source = Source([_text(piece) for piece in ("a", "b", "c")])
+
+    async def run() -> None:
+        events = coalesce_text_deltas(source.stream(), 10.0)
+        assert (await anext(events)).text_delta.content == "a"
+        await events.aclose()
+
+    asyncio.run(run())
+    assert source.closed
+
+def test_text_buffer():
+    buffer = TextBuffer()
+    assert not buffer and len(buffer) == 0 and buffer.getvalue() == ""
+
+    buffer.append("ab")
+    buffer.append("")
+    buffer.append("cd")
+    assert buffer and len(buffer) == 4
+    assert buffer.getvalue() == "abcd"
+    # joined once and kept
+    assert buffer.getvalue() is buffer.getvalue()
+
+    buffer.append("e")
+    assert str(buffer) == "abcde" and len(buffer) == 5
+    assert TextBuffer("xy").getvalue() == "xy"
@@ -0,0 +1,120 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from tools.registry import ToolRegistry
+from tools.result_cache import ToolResultCache
+
+# a cacheable read of an in-memory "file system"; the fingerprint is the entry's version,
+# 0 for a missing entry
+class LookupTool(Tool):
+    name = "lookup"
+    kind = ToolKind.READ
+    cacheable = True
+    schema = {"type": "object", "properties": {"key": {"type": "string"}}}
+
+    def __init__(self, files: dict[str, tuple[int, str]]) -> None:
+        self.files = files
+        self.calls = 0
+
+    def cache_fingerprint(self, invocation: ToolInvocation) -> Any | None:
+        entry = self.files.get(invocation.params["key"])
+        return entry[0] if entry else 0
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        self.calls += 1
+        entry = self.files.get(invocation.params["key"])
+        if entry is None:
+            return ToolResult.error_result("missing")
+        return ToolResult.success_result(entry[1])
+
+class StoreTool(Tool):
+    name = "store"
+    kind = ToolKind.WRITE
+    schema = {"type": "object", "properties": {"key": {"type": "string"}}}
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        await asyncio.sleep(self.delay)
+        return ToolResult.success_result("stored")
+
+def _registry(files: dict[str, tuple[int, str]], store_delay: float = 0.0) -> tuple[ToolRegistry, LookupTool]:
+    registry = ToolRegistry()
+    lookup = LookupTool(files)
+    registry.register(lookup)
+    registry.register(StoreTool(store_delay))
+    return registry, lookup
+
+def _invoke(registry: ToolRegistry, name: str, **params: Any) -> ToolResult:
+    return asyncio.run(registry.invoke(name, params, Path.cwd()))
+
+def test_repeated_read_is_served_from_the_cache():
+    registry, lookup = _registry({"a": (1, "alpha")})
+
+    first = _invoke(registry, "lookup", key="a")
+    second = _invoke(registry, "lookup", key="a")
+
+    assert lookup.calls == 1
+    assert second.output == first.output == "alpha"
+    assert second.metadata["cache_hit"] and not first.metadata.get("cache_hit")
+
+def test_changed_fingerprint_misses():
+    files = {"a": (1, "alpha")}
+    registry, lookup = _registry(files)
+
+    _invoke(registry, "lookup", key="a")
+    files["a"] = (2, "beta")
+
+    assert _invoke(registry, "lookup", key="a").output == "beta"
+    assert lookup.calls == 2
+
+def test_mutating_call_invalidates_the_cache():
+    registry, lookup = _registry({"a": (1, "alpha")})
+
+    _invoke(registry, "lookup", key="a")
+    _invoke(registry, "store", key="a")
+    _invoke(registry, "lookup", key="a")
+
+    assert lookup.calls == 2
+    assert registry.result_cache.invalidations == 1
+
+def test_reads_during_a_mutation_are_not_kept():
+    registry, lookup = _registry({"a": (1, "alpha")}, store_delay=0.05)
+
+    async def run() -> None:
+        store = asyncio.create_task(registry.invoke("store", {"key": "a"}, Path.cwd()))
+        await asyncio.sleep(0.01)
+        # cached while the write is still running, must not survive it
+        await registry.invoke("lookup", {"key": "a"}, Path.cwd())
+        await store
+        await registry.invoke("lookup", {"key": "a"}, Path.cwd())
+
+    asyncio.run(run())
+    assert lookup.calls == 2
+
+def test_failures_are_not_cached():
+    registry, lookup = _registry({"a": (1, "alpha")})
+
+    _invoke(registry, "lookup", key="missing")
+    _invoke(registry, "lookup", key="missing")
+
+    assert lookup.calls == 2
+    assert len(registry.result_cache) == 0
+
+def test_cache_is_bounded_by_output_size():
+    cache = ToolResultCache(max_bytes=10)
+    cache.put("a", ToolResult.success_result("12345"))
+    cache.put("b", ToolResult.success_result("12345"))
+    cache.get("a")
+    cache.put("c", ToolResult.success_result("12345"))
+
+    # b was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size_bytes == 10
+    # bigger than the whole cache: never stored
+    cache.put("d", ToolResult.success_result("x" * 11))
+    assert cache.get("d") is None
@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from email.utils import formatdate
+from typing import Any
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+from benchmarks.stub_server import StubServer
+from client.llm_client import LLMClient
+from client.response import StreamEvent, StreamEventType, TextDelta, ToolCall, ToolCallDelta
+from client.retry import RetryPolicy, RetryState, StreamDivergedError, StreamResumer, parse_retry_after
+from helpers import stub_endpoint
+
+CONTENT = "The agentic loop lives in agent/agent.py and runs until the model stops calling tools."
+MESSAGES = [{"role": "user", "content": "Where is the loop?"}]
+
+def _status_error(status: int, headers: dict[str, str] | None = None) -> APIStatusError:
+    request = httpx.Request("POST", "http://stub/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return APIStatusError("failed", response=response, body=None)
+
+# -- Retry-After parsing --
+
+def test_retry_after_seconds():
+    assert parse_retry_after(httpx.Headers({"Retry-After": "2.5"})) == 2.5
+
+def test_retry_after_ms_wins_over_seconds():
+    headers = httpx.Headers({"Retry-After": "2", "retry-after-ms": "150"})
+    assert parse_retry_after(headers) == 0.15
+
+def test_retry_after_http_date():
+    headers = httpx.Headers({"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+    assert 28 <= parse_retry_after(headers) <= 30
+
+def test_retry_after_never_negative():
+    assert parse_retry_after(httpx.Headers({"Retry-After": "-3"})) == 0.0
+    headers = httpx.Headers({"Retry-After": formatdate(time.time() - 30, usegmt=True)})
+    assert parse_retry_after(headers) == 0.0
+
+@pytest.mark.parametrize("headers", [None, {}, {"Retry-After": "soon"}, {"retry-after-ms": "x"}])
+def test_retry_after_missing_or_garbled(headers: dict[str, str] | None):
+    assert parse_retry_after(httpx.Headers(headers) if headers is not None else None) is None
+
+# -- RetryPolicy --
+
+def test_server_hint_sets_the_delay():
+    policy = RetryPolicy(base_delay=5.0, rng=random.Random(0))
+    retry = policy.plan(_status_error(429, {"Retry-After": "0.2"}), RetryState())
+
+    assert retry.server_hint
+    # the hint plus at most 10% jitter, never the (much longer) backoff
+    assert 0.2 <= retry.delay <= 0.22
+
+def test_backoff_stays_between_base_and_max():
+    policy = RetryPolicy(max_retries=50, base_delay=0.5, max_delay=4.0, deadline=None, rng=random.Random(0))
+    state = RetryState()
+    delays = [policy.plan(_status_error(503), state).delay for _ in range(50)]
+
+    assert all(0.5 <= delay <= 4.0 for delay in delays)
+    # jittered, not a fixed schedule
+    assert len(set(delays)) > 10
+
+def test_gives_up_after_max_retries():
+    policy = RetryPolicy(max_retries=2, base_delay=0.01)
+    state = RetryState()
+
+    assert policy.plan(_status_error(500), state) is not None
+    assert policy.plan(_status_error(500), state) is not None
+    assert policy.plan(_status_error(500), state) is None
+
+def test_client_errors_are_not_retried():
+    assert RetryPolicy().plan(_status_error(400), RetryState()) is None
+
+def test_deadline_stops_retrying():
+    policy = RetryPolicy(base_delay=1.0, deadline=5.0)
+    state = RetryState(started=time.monotonic() - 4.5)
+
+    assert policy.plan(_status_error(503), state) is None
+    # a server hint that would run past the deadline is not waited for either
+    assert policy.plan(_status_error(429, {"Retry-After": "10"}), RetryState()) is None
+
+# -- StreamResumer --
+
+def _text(content: str) -> StreamEvent:
+    return StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta(content=content))
+
+def _emitted(resumer: StreamResumer, events: list[StreamEvent]) -> list[StreamEvent]:
+    return [event for event in map(resumer.filter, events) if event is not None]
+
+def test_replayed_text_is_not_repeated():
+    resumer = StreamResumer()
+    first = _emitted(resumer, [_text("The loop "), _text("lives")])
+    resumer.restart()
+    # the retry is chunked differently and cuts the already shown text mid-delta
+    second = _emitted(resumer, [_text("The lo"), _text("op lives in"), _text(" agent.py")])
+
+    shown = "".join(event.text_delta.content for event in first + second)
+    assert shown == "The loop lives in agent.py"
+
+def test_replayed_tool_calls_are_not_repeated():
+    def events(call_id: str) -> list[StreamEvent]:
+        return [
+            StreamEvent(
+                type=StreamEventType.TOOL_CALL_START,
+                tool_call_delta=ToolCallDelta(call_id=call_id, name="read_file"),
+            ),
+            StreamEvent(
+                type=StreamEventType.TOOL_CALL_DELTA,
+                tool_call_delta=ToolCallDelta(call_id=call_id, name="read_file", arguments_delta='{"path": "a.py"}'),
+            ),
+            StreamEvent(
+                type=StreamEventType.TOOL_CALL_COMPLETE,
+                tool_call=ToolCall(call_id=call_id, name="read_file", arguments={"path": "a.py"}),
+            ),
+        ]
+
+    resumer = StreamResumer()
+    assert len(_emitted(resumer, events("call_1"))) == 3
+    resumer.restart()
+    # providers hand out new ids on every attempt
+    assert _emitted(resumer, events("call_9")) == []
+
+def test_diverging_retry_is_detected():
+    resumer = StreamResumer()
+    _emitted(resumer, [_text("The loop lives")])
+    resumer.restart()
+    with pytest.raises(StreamDivergedError):
+        _emitted(resumer, [_text("A loop")])
+
+# -- against the stub server --
+
+# fails the first `failures` requests, with an error status or by dropping the stream halfway
+class FlakyStub(StubServer):
+    def __init__(self, responses: list[dict[str, Any]], failures: int, disconnect: bool = False, **kwargs: Any) -> None:
+        super().__init__(responses, **kwargs)
+        self.failures = failures
+        self.disconnect = disconnect
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        failing = 1.0 if self.requests < self.failures else 0.0
+        if self.disconnect:
+            self.disconnect_rate = failing
+        else:
+            self.error_rate = failing
+        await super()._route(method, path, body, writer)
+
+async def _complete(policy: RetryPolicy, **stub_kwargs: Any) -> tuple[list[StreamEvent], StubServer]:
+    async with stub_endpoint([{"content": CONTENT}], FlakyStub, **stub_kwargs) as server:
+        client = LLMClient(retry_policy=policy)
+        return [event async for event in client.chat_completion(MESSAGES)], server
+
+def _of_type(events: list[StreamEvent], type: StreamEventType) -> list[StreamEvent]:
+    return [event for event in events if event.type == type]
+
+def test_retry_after_from_the_server_is_honoured():
+    # without the hint the backoff would be 10 seconds or more
+    policy = RetryPolicy(base_delay=10.0, max_delay=10.0)
+    events, server = asyncio.run(_complete(policy, failures=1, error_status=429, retry_after=0.05))
+
+    retries = _of_type(events, StreamEventType.RETRY)
+    assert len(retries) == 1
+    assert retries[0].retry.server_hint and retries[0].retry.status_code == 429
+    assert 0.05 <= retries[0].retry.delay <= 0.055
+    assert "".join(event.text_delta.content for event in _of_type(events, StreamEventType.TEXT_DELTA)) == CONTENT
+    assert server.requests == 2
+
+def test_resumed_stream_shows_every_delta_once():
+    policy = RetryPolicy(base_delay=0.01, max_delay=0.01)
+    events, server = asyncio.run(_complete(policy, failures=2, disconnect=True))
+
+    retries = _of_type(events, StreamEventType.RETRY)
+    assert server.disconnects == 2
+    assert [retry.retry.resumed for retry in retries] == [True, True]
+    assert "".join(event.text_delta.content for event in _of_type(events, StreamEventType.TEXT_DELTA)) == CONTENT
+    assert len(_of_type(events, StreamEventType.MESSAGE_COMPLETE)) == 1
+
+def test_error_surfaces_once_retries_are_spent():
+    policy = RetryPolicy(max_retries=1, base_delay=0.01, max_delay=0.01)
+    events, server = asyncio.run(_complete(policy, failures=5, error_status=503))
+
+    assert len(_of_type(events, StreamEventType.RETRY)) == 1
+    assert events[-1].type == StreamEventType.ERROR
+    assert "after 1 retries" in events[-1].error
+    assert server.requests == 2
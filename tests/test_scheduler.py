@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+
+from agent.events import AgentEventType
+from agent.scheduler import ToolScheduler
+from client.response import ToolCall
+from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from tools.registry import ToolRegistry
+
+# sleeps for `delay` seconds and records when it started and finished in a shared log
+class SleepTool(Tool):
+    name = "sleep"
+    kind = ToolKind.READ
+    schema = {"type": "object", "properties": {"delay": {"type": "number"}}}
+
+    def __init__(self, log: list[tuple[str, str]], active: list[int]) -> None:
+        self.log = log
+        # [running now, most ever running at once]
+        self.active = active
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        label = invocation.params["label"]
+        self.log.append(("start", label))
+        self.active[0] += 1
+        self.active[1] = max(self.active[1], self.active[0])
+        try:
+            await asyncio.sleep(invocation.params.get("delay", 0.01))
+        finally:
+            self.active[0] -= 1
+        self.log.append(("end", label))
+        return ToolResult.success_result(label)
+
+class SleepWriteTool(SleepTool):
+    name = "sleep_write"
+    kind = ToolKind.WRITE
+
+def _scheduler(max_concurrency: int = 8) -> tuple[ToolScheduler, list[tuple[str, str]], list[int]]:
+    log : list[tuple[str, str]] = []
+    active = [0, 0]
+    registry = ToolRegistry(result_cache_bytes=0)
+    registry.register(SleepTool(log, active))
+    registry.register(SleepWriteTool(log, active))
+    return ToolScheduler(registry, Path.cwd(), max_concurrency), log, active
+
+def _call(label: str, delay: float = 0.01, mutating: bool = False) -> ToolCall:
+    return ToolCall(
+        call_id=f"call_{label}",
+        name="sleep_write" if mutating else "sleep",
+        arguments={"label": label, "delay": delay},
+    )
+
+async def _run(scheduler: ToolScheduler, calls: list[ToolCall]) -> list[str]:
+    for call in calls:
+        scheduler.submit(call)
+    async for _ in scheduler.drain():
+        pass
+    return [result.tool_call_id for result in await scheduler.results()]
+
+def test_read_only_calls_run_concurrently():
+    scheduler, _, active = _scheduler()
+    asyncio.run(_run(scheduler, [_call(str(i), delay=0.05) for i in range(4)]))
+    assert active[1] == 4
+
+def test_concurrency_is_bounded():
+    scheduler, _, active = _scheduler(max_concurrency=2)
+    asyncio.run(_run(scheduler, [_call(str(i)) for i in range(6)]))
+    assert active[1] == 2
+
+def test_mutating_call_is_a_barrier():
+    scheduler, log, active = _scheduler()
+    calls = [
+        _call("read1", delay=0.05),
+        _call("read2", delay=0.01),
+        _call("write", mutating=True),
+        _call("read3"),
+        _call("read4"),
+    ]
+    asyncio.run(_run(scheduler, calls))
+
+    position = {entry: index for index, entry in enumerate(log)}
+    # the write starts only after every call submitted before it finished...
+    assert position[("start", "write")] > position[("end", "read1")]
+    assert position[("start", "write")] > position[("end", "read2")]
+    # ...and the calls after it only start once it is done
+    assert position[("start", "read3")] > position[("end", "write")]
+    assert position[("start", "read4")] > position[("end", "write")]
+    # the reads on either side of the barrier still overlap with each other
+    assert active[1] == 2
+
+def test_results_follow_submission_order():
+    scheduler, log, _ = _scheduler()
+    calls = [_call("slow", delay=0.05), _call("fast", delay=0.0), _call("middle", delay=0.02)]
+    ids = asyncio.run(_run(scheduler, calls))
+
+    assert [label for kind, label in log if kind == "end"] == ["fast", "middle", "slow"]
+    assert ids == ["call_slow", "call_fast", "call_middle"]
+
+def test_every_call_emits_start_and_complete():
+    scheduler, _, _ = _scheduler()
+
+    async def run() -> list[tuple[AgentEventType, str]]:
+        calls = [_call("a"), _call("b", mutating=True), _call("c")]
+        for call in calls:
+            scheduler.submit(call)
+        return [(event.type, event.data["call_id"]) async for event in scheduler.drain()]
+
+    events = asyncio.run(run())
+    assert len(events) == 6
+    for call_id in ("call_a", "call_b", "call_c"):
+        kinds = [kind for kind, event_call_id in events if event_call_id == call_id]
+        assert kinds == [AgentEventType.TOOL_CALL_START, AgentEventType.TOOL_CALL_COMPLETE]
@@ -0,0 +1,130 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import config.settings as settings
+from config.settings import CONFIG_FILE_ENV, ENV_PREFIX, Config, Endpoint, _coerce, load_config
+
+# no .env, config file or AGENT_* variable from the machine running the tests gets in
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(settings, "_dotenv_loaded", True)
+    monkeypatch.chdir(tmp_path)
+    for name in list(os.environ):
+        if name.startswith(ENV_PREFIX):
+            monkeypatch.delenv(name)
+
+def _write_toml(directory: Path, text: str, name: str = "agent.toml") -> Path:
+    path = directory / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+# (model in agent.toml, AGENT_MODEL, --model) -> the model that wins; None leaves a layer out
+@pytest.mark.parametrize(
+    ("file", "env", "flag", "expected"),
+    [
+        (None, None, None, Config.model),
+        ("from-file", None, None, "from-file"),
+        ("from-file", "from-env", None, "from-env"),
+        ("from-file", "from-env", "from-flag", "from-flag"),
+        (None, "from-env", "from-flag", "from-flag"),
+        ("from-file", None, "from-flag", "from-flag"),
+    ],
+)
+def test_layers(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, file: str | None, env: str | None, flag: str | None, expected: str):
+    if file is not None:
+        _write_toml(tmp_path, f'model = "{file}"\n')
+    if env is not None:
+        monkeypatch.setenv(ENV_PREFIX + "MODEL", env)
+    config = load_config(overrides={"model": flag})
+    assert config.model == expected
+    # layers only replace the options they set
+    assert config.base_url == Config.base_url
+
+def test_file_locations(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    (tmp_path / "agent.json").write_text(json.dumps({"max_turns": 3}), encoding="utf-8")
+    assert load_config().max_turns == 3
+
+    # settings may sit under an [agent] table, and AGENT_CONFIG points anywhere
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.setenv(CONFIG_FILE_ENV, str(_write_toml(elsewhere, "[agent]\nmax_turns = 9\n", "custom.toml")))
+    assert load_config().max_turns == 9
+    # an explicit path wins over both
+    assert load_config(_write_toml(elsewhere, "max_turns = 4\n")).max_turns == 4
+
+# (option, value from the environment, coerced value)
+@pytest.mark.parametrize(
+    ("name", "value", "expected"),
+    [
+        ("max_turns", "12", 12),
+        ("request_timeout", "30", 30.0),
+        ("compaction_threshold", " 0.5 ", 0.5),
+        ("max_duration", "90", 90.0),
+        ("max_duration", "none", None),
+        ("max_total_tokens", "", None),
+        ("hedge_percentile", "0.9", 0.9),
+        ("hedge_percentile", "none", None),
+        ("retry_deadline", "", None),
+        ("rate_limit_rpm", "null", None),
+        ("rate_limit_rpm", "60", 60),
+        ("trace_file", "None", None),
+        ("trace_file", "spans.jsonl", "spans.jsonl"),
+        ("fallback_endpoints", "", ()),
+        ("fallback_endpoints", "small@http://a/v1, large@http://b/v1", (
+            Endpoint("http://a/v1", "small"),
+            Endpoint("http://b/v1", "large"),
+        )),
+        ("fallback_endpoints", '[{"base_url": "http://a/v1", "model": "m", "api_key_env": "A_KEY"}]', (
+            Endpoint("http://a/v1", "m", "A_KEY"),
+        )),
+    ],
+)
+def test_environment_values_are_coerced(monkeypatch: pytest.MonkeyPatch, name: str, value: str, expected: Any):
+    monkeypatch.setenv(ENV_PREFIX + name.upper(), value)
+    assert getattr(load_config(), name) == expected
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("1", True), ("true", True), (" Yes ", True), ("ON", True),
+        ("0", False), ("false", False), ("no", False), ("off", False),
+        (True, True), (0, False),
+    ],
+)
+def test_bool_values(value: Any, expected: bool):
+    assert _coerce("flag", value, bool) is expected
+
+# (option, value from the environment, text of the error)
+@pytest.mark.parametrize(
+    ("name", "value", "message"),
+    [
+        ("max_turns", "many", "Invalid value for config option 'max_turns'"),
+        ("max_turns", "2.5", "Invalid value for config option 'max_turns'"),
+        ("request_timeout", "fast", "Invalid value for config option 'request_timeout'"),
+        ("max_turns", "none", "Invalid value for config option 'max_turns'"),
+        ("fallback_endpoints", "no-separator", "Invalid value for config option 'fallback_endpoints'"),
+        ("fallback_endpoints", "[{\"model\": \"m\"}]", "Invalid value for config option 'fallback_endpoints'"),
+        ("fallback_endpoints", "[{\"model\": \"m\"", "Invalid value for config option 'fallback_endpoints'"),
+    ],
+)
+def test_invalid_environment_values(monkeypatch: pytest.MonkeyPatch, name: str, value: str, message: str):
+    monkeypatch.setenv(ENV_PREFIX + name.upper(), value)
+    with pytest.raises(ValueError, match=message):
+        load_config()
+
+def test_invalid_bool():
+    with pytest.raises(ValueError, match="Invalid value for config option 'flag'"):
+        _coerce("flag", "maybe", bool)
+
+def test_unknown_file_option(tmp_path: Path):
+    _write_toml(tmp_path, "max_turn = 3\n")
+    with pytest.raises(ValueError, match="Unknown config option 'max_turn'"):
+        load_config()
+
+def test_flags_left_unset_do_not_override(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv(ENV_PREFIX + "MAX_TURNS", "7")
+    assert load_config(overrides={"max_turns": None, "model": None}).max_turns == 7
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any
+
+from client.llm_client import LLMClient
+from client.response import StreamEvent, StreamEventType
+from helpers import stub_endpoint
+
+MESSAGES = [{"role": "user", "content": "Read the files."}]
+
+def _chunk(delta: dict[str, Any], finish_reason: str | None = None) -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "model": "stub-model",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+# one tool call fragment as providers send it: id and name on the first, arguments after
+def _tool_chunk(
+        index: int,
+        arguments: str | None = None,
+        name: str | None = None,
+        call_id: str | None = None,
+        )-> dict[str, Any]:
+    tool_call : dict[str, Any] = {"index": index, "function": {}}
+    if call_id:
+        tool_call["id"] = call_id
+        tool_call["type"] = "function"
+    if name:
+        tool_call["function"]["name"] = name
+    if arguments is not None:
+        tool_call["function"]["arguments"] = arguments
+    return _chunk({"tool_calls": [tool_call]})
+
+def _stream(chunks: list[dict[str, Any]]) -> list[StreamEvent]:
+    async def run() -> list[StreamEvent]:
+        responses = [{"chunks": [*chunks, _chunk({}, "tool_calls")]}]
+        async with stub_endpoint(responses):
+            return [event async for event in LLMClient().chat_completion(MESSAGES)]
+
+    return asyncio.run(run())
+
+def _completed(events: list[StreamEvent]) -> list[tuple[int, StreamEvent]]:
+    return [
+        (position, event)
+        for position, event in enumerate(events)
+        if event.type == StreamEventType.TOOL_CALL_COMPLETE
+    ]
+
+def test_call_completes_only_once_its_arguments_close():
+    # every fragment but the last contains a "}", and the first two end in one
+    events = _stream([
+        _tool_chunk(0, name="write_file", call_id="call_0"),
+        _tool_chunk(0, '{"path": "a.json", "content": "{}'),
+        _tool_chunk(0, '\\n{\\"x\\": 1}'),
+        _tool_chunk(0, '", "meta": {"mode": 1}'),
+        _tool_chunk(0, "}"),
+    ])
+
+    completed = _completed(events)
+    assert len(completed) == 1
+    position, event = completed[0]
+    last_delta = max(
+        index for index, event in enumerate(events) if event.type == StreamEventType.TOOL_CALL_DELTA
+    )
+    assert position == last_delta + 1
+    assert event.tool_call.call_id == "call_0"
+    assert event.tool_call.arguments == {
+        "path": "a.json",
+        "content": '{}\n{"x": 1}',
+        "meta": {"mode": 1},
+    }
+
+def test_call_that_closed_early_is_not_completed_again():
+    events = _stream([
+        _tool_chunk(0, name="read_file", call_id="call_0"),
+        _tool_chunk(0, '{"path": "a.py"}'),
+        _tool_chunk(1, name="read_file", call_id="call_1"),
+        _tool_chunk(1, '{"path": "b.py"}'),
+    ])
+
+    completed = _completed(events)
+    assert [event.tool_call.call_id for _, event in completed] == ["call_0", "call_1"]
+    # the first call was handed over as soon as its arguments closed, before the second began
+    second_start = next(
+        index
+        for index, event in enumerate(events)
+        if event.type == StreamEventType.TOOL_CALL_START and event.tool_call_delta.call_id == "call_1"
+    )
+    assert completed[0][0] < second_start
+
+def test_new_index_completes_the_previous_call():
+    # the first call's arguments never close, so only the next index says they are all in
+    events = _stream([
+        _tool_chunk(0, name="read_file", call_id="call_0"),
+        _tool_chunk(0, '{"path": '),
+        _tool_chunk(0, '"a.py", "limit": 10'),
+        _tool_chunk(1, name="list_dir", call_id="call_1"),
+        _tool_chunk(1, '{"path": "."}'),
+    ])
+
+    completed = _completed(events)
+    assert [(event.tool_call.call_id, event.tool_call.arguments) for _, event in completed] == [
+        ("call_0", {"raw_arguments": '{"path": "a.py", "limit": 10'}),
+        ("call_1", {"path": "."}),
+    ]
+    starts = [index for index, event in enumerate(events) if event.type == StreamEventType.TOOL_CALL_START]
+    assert starts[0] < completed[0][0] < starts[1]
+
+def test_arguments_that_never_parse_complete_at_the_end():
+    events = _stream([
+        _tool_chunk(0, name="read_file", call_id="call_0"),
+        _tool_chunk(0, '{"path": "a.py"'),
+        _tool_chunk(0, ', "limit": }'),
+    ])
+
+    completed = _completed(events)
+    assert len(completed) == 1
+    position, event = completed[0]
+    assert event.tool_call.arguments == {"raw_arguments": '{"path": "a.py", "limit": }'}
+    # handed over when the stream ends, right before the message itself completes
+    assert events[position + 1].type == StreamEventType.MESSAGE_COMPLETE
+    assert events[position + 1].finish_reason == "tool_calls"
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from utils.text import TruncationStrategy, count_tokens, truncate_text
+
+MODEL = "stub-model"
+SUFFIX = "\n... [truncated]"
+
+def _random_text(rng: random.Random) -> str:
+    lines = [
+        "".join(rng.choice("abc def é中\t") for _ in range(rng.randint(0, 80)))
+        for _ in range(rng.randint(1, 200))
+    ]
+    return "\n".join(lines)
+
+def test_text_within_budget_is_returned_as_is():
+    text = "short\ntext\n"
+    # read_file relies on getting the very same object back to tell nothing was cut
+    assert truncate_text(text, 100, MODEL) is text
+
+@pytest.mark.parametrize("strategy", list(TruncationStrategy))
+@pytest.mark.parametrize("preserve_lines", [True, False])
+def test_output_stays_within_budget(strategy: TruncationStrategy, preserve_lines: bool):
+    rng = random.Random(f"{strategy.value}-{preserve_lines}")
+    for _ in range(100):
+        text = _random_text(rng)
+        budget = rng.randint(count_tokens(SUFFIX, MODEL) + 1, 400)
+        output = truncate_text(text, budget, MODEL, strategy=strategy, preserve_lines=preserve_lines)
+        assert count_tokens(output, MODEL) <= budget
+
+def test_head_keeps_whole_lines_from_the_start():
+    text = "\n".join(f"line {i:04}" for i in range(1000))
+    output = truncate_text(text, 50, MODEL)
+
+    kept = output.removesuffix(SUFFIX)
+    assert output.endswith(SUFFIX)
+    assert text.startswith(kept + "\n")
+
+def test_tail_keeps_whole_lines_from_the_end():
+    text = "\n".join(f"line {i:04}" for i in range(1000))
+    output = truncate_text(text, 50, MODEL, strategy=TruncationStrategy.TAIL)
+
+    marker = SUFFIX.strip() + "\n"
+    kept = output.removeprefix(marker)
+    assert output.startswith(marker)
+    assert text.endswith("\n" + kept)
+
+def test_head_tail_keeps_both_ends():
+    text = "\n".join(f"line {i:04}" for i in range(1000))
+    output = truncate_text(text, 50, MODEL, strategy=TruncationStrategy.HEAD_TAIL)
+
+    head, tail = output.split(SUFFIX + "\n")
+    assert head and tail
+    assert text.startswith(head + "\n")
+    assert text.endswith("\n" + tail)
+
+def test_budget_below_the_marker_returns_only_the_marker():
+    assert truncate_text("x" * 10_000, 1, MODEL) == SUFFIX.strip()
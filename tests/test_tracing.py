@@ -0,0 +1,112 @@
+import asyncio
+import json
+from dataclasses import replace
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from agent.agent import Agent
+from config.settings import get_config, set_config
+from helpers import stub_endpoint
+from utils.tracing import (
+    NOOP_SPAN,
+    InMemorySpanExporter,
+    SpanExporter,
+    Tracer,
+    current_span,
+    get_tracer,
+    set_tracer,
+)
+
+@pytest.fixture
+def exporter() -> Iterator[InMemorySpanExporter]:
+    exporter = InMemorySpanExporter()
+    set_tracer(Tracer(exporter))
+    yield exporter
+    set_tracer(None)
+
+def test_disabled_tracer_hands_out_the_noop_span():
+    tracer = get_tracer()
+    assert not tracer.enabled
+    with tracer.span("anything", key="value") as span:
+        span.set_attribute("more", 1)
+        span.set_error("ignored")
+    assert span is NOOP_SPAN and not span.recording
+    assert current_span() is None
+
+def test_children_share_the_trace_of_their_parent(exporter: InMemorySpanExporter):
+    tracer = get_tracer()
+    with tracer.span("root") as root:
+        with tracer.span("child") as child:
+            assert current_span() is child
+        detached = tracer.span("detached", parent=root, activate=False)
+        with detached:
+            assert current_span() is root
+    assert current_span() is None
+
+    assert child.parent_id == root.span_id and child.trace_id == root.trace_id
+    assert detached.parent_id == root.span_id
+    assert root.parent_id is None
+    # exported as they finish, innermost first
+    assert [span.name for span in exporter.spans] == ["child", "detached", "root"]
+
+def test_exceptions_are_recorded(exporter: InMemorySpanExporter):
+    with pytest.raises(ValueError):
+        with get_tracer().span("failing"):
+            raise ValueError("bad input")
+    with pytest.raises(asyncio.CancelledError):
+        with get_tracer().span("cancelled"):
+            raise asyncio.CancelledError()
+
+    failing, cancelled = exporter.spans
+    assert failing.status == "error" and failing.error == "ValueError: bad input"
+    assert cancelled.status == "cancelled" and cancelled.error is None
+
+def test_exporter_must_implement_export():
+    with pytest.raises(TypeError):
+        SpanExporter()
+
+def test_trace_file_gets_one_line_per_span(tmp_path: Path):
+    path = tmp_path / "trace.jsonl"
+    set_config(replace(get_config(), trace_file=str(path)))
+    tracer = get_tracer()
+    with tracer.span("root", answer=42):
+        with tracer.span("child"):
+            pass
+    tracer.close()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["child", "root"]
+    assert spans[0]["parent_id"] == spans[1]["span_id"]
+    assert spans[1]["attributes"] == {"answer": 42}
+
+def test_agent_spans_are_linked_without_leaking(exporter: InMemorySpanExporter, tmp_path: Path):
+    source = tmp_path / "loop.py"
+    source.write_text("pass\n")
+    responses = [
+        {"content": "Looking.", "tool_calls": [{"name": "read_file", "arguments": {"path": str(source)}}]},
+        {"content": "Found it."},
+    ]
+
+    async def run() -> None:
+        async with stub_endpoint(responses):
+            async with Agent() as agent:
+                async for _ in agent.run("Where is the loop?"):
+                    # the agent's spans never become the consumer's active span
+                    assert current_span() is None
+
+    asyncio.run(run())
+
+    (run_span,) = exporter.find("agent.run")
+    turns = exporter.find("agent.turn")
+    assert len(turns) == 2
+    assert all(turn.parent_id == run_span.span_id for turn in turns)
+    turn_ids = {turn.span_id for turn in turns}
+    completions = exporter.find("llm.chat_completion")
+    assert len(completions) == 2 and all(span.parent_id in turn_ids for span in completions)
+    completion_ids = {span.span_id for span in completions}
+    assert all(span.parent_id in completion_ids for span in exporter.find("llm.attempt"))
+    (tool,) = exporter.find("tool.invoke")
+    assert tool.parent_id == turns[0].span_id
+    assert {span.trace_id for span in exporter.spans} == {run_span.trace_id}
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from typing import Any, Iterator
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from client import transport
+
+# a stub server on a loop of its own, so it outlives the loops of the requests under test
+@pytest.fixture
+def server() -> Iterator[StubServer]:
+    loop = asyncio.new_event_loop()
+    server = StubServer([{"content": "hi"}])
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+async def _request(server: StubServer) -> tuple[Any, list[Any]]:
+    client = transport.get_http_client()
+    await client.get(server.base_url + "/models")
+    return client, transport._pool_sockets(client)
+
+@pytest.mark.filterwarnings("ignore::ResourceWarning")
+def test_pool_of_a_finished_loop_is_closed(server: StubServer):
+    first, sockets = asyncio.run(_request(server))
+    assert sockets and all(sock.fileno() != -1 for sock in sockets)
+
+    async def switch() -> Any:
+        second, _ = await _request(server)
+        await transport.close_http_client()
+        return second
+
+    assert asyncio.run(switch()) is not first
+    # asyncio.run closed the first loop, so its connections were closed directly
+    assert all(sock.fileno() == -1 for sock in sockets)
+
+def test_pool_of_a_running_loop_is_closed_on_it(server: StubServer):
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        first, _ = asyncio.run_coroutine_threadsafe(_request(server), other).result()
+
+        async def switch() -> None:
+            transport.get_http_client()
+            # aclose() runs on the other loop
+            for _ in range(100):
+                if first.is_closed:
+                    break
+                await asyncio.sleep(0.01)
+            await transport.close_http_client()
+
+        asyncio.run(switch())
+        assert first.is_closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 import abc
+import threading
 from enum import Enum
 from typing import Any
 from pydantic import BaseModel, ValidationError
 from dataclasses import dataclass, field
 from pathlib import Path
 from pydantic.json_schema import model_json_schema
+from config.settings import get_config
 
 class ToolKind(str, Enum):
     READ = "read"
@@ -21,10 +23,28 @@ class ToolConfirmation:
     params : dict[str,Any]
     description : str
 
+# set when a tool call has to stop early: it ran into its timeout, or the turn it belongs to
+# was cancelled. tools that can run for a while check `cancelled` (from any thread, execute
+# may hand work to one) and return what they have so far
+class CancellationToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self.reason : str | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
 @dataclass
 class ToolInvocation:
     params : dict[str,Any]
     cwd : Path
+    cancellation : CancellationToken = field(default_factory=CancellationToken)
 
 @dataclass
 class ToolResult:
@@ -33,6 +53,10 @@ class ToolResult:
     error : str | None = None
     metadata : dict[str,Any] = field(default_factory=dict)
     truncated : bool = False
+    # seconds spent in ToolRegistry.invoke, cache lookups and validation included
+    duration : float | None = None
+    # the call was stopped at its timeout; output holds what it produced until then
+    timed_out : bool = False
     @classmethod
     def error_result(
         cls,
@@ -70,10 +94,17 @@ class Tool(abc.ABC):
     name: str = "base_tool"
     description: str = "Base tool description"
     kind : ToolKind = ToolKind.READ
+    # opt in to ToolRegistry's result cache; results are reused while cache_fingerprint() is unchanged
+    cacheable : bool = False
 
     def __init__(self):
         pass
 
+    # seconds a call may run before ToolRegistry stops it, None for no limit
+    @property
+    def timeout(self) -> float | None:
+        return get_config().tool_timeout
+
     @property
     def schema(self) -> dict[str,Any] | type['BaseModel']:
         raise NotImplementedError("Tool must define a schema property or class attribute.")
@@ -110,6 +141,21 @@ class Tool(abc.ABC):
             ToolKind.MEMORY,
             }
     
+    # params in a canonical form for cache keys: defaults filled in, aliases resolved
+    def canonical_params(self, params: dict[str,Any]) -> dict[str,Any]:
+        schema = self.schema
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            try:
+                return schema(**params).model_dump()
+            except ValidationError:
+                return params
+        return params
+
+    # describes the state the result depends on (e.g. file size and mtime).
+    # None means this invocation must not be served from the cache
+    def cache_fingerprint(self, invocation: ToolInvocation) -> Any | None:
+        return None
+
     # tool confirmation
     async def get_confirmation(self, invocation: ToolInvocation) -> ToolInvocation | None:
         if not self.is_mutating(invocation.params):
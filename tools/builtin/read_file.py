@@ -1,11 +1,17 @@
+import asyncio
+import mmap
+from pathlib import Path
 from pydantic import Field
 from typing import Any
 
-from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from tools.base import CancellationToken, Tool, ToolInvocation, ToolKind, ToolResult
 from utils.paths import is_binary_file, resolve_path
 from pydantic import BaseModel, ValidationError
 
-from utils.text import count_tokens, truncate_text
+from utils.line_index import LINE_INDEX_MIN_FILE_SIZE, get_line_index_cache
+from utils.line_reader import count_lines, find_line_start, iter_lines, open_mmap
+from utils.text import CHARS_PER_TOKEN, count_tokens, truncate_text
+from config.settings import get_config
 
 class ReadFileParams(BaseModel):
     path: str = Field(
@@ -30,25 +36,58 @@ class ReadFileTool(Tool):
         )
     kind = ToolKind.READ
     schema = ReadFileParams
+    cacheable = True
 
-    def validate_params(self, params: dict[str, Any]) -> list[str]:
+    @staticmethod
+    def _normalize_params(params: dict[str, Any] | None) -> dict[str, Any]:
+        # accept both `path` and `file_path` from callers
         params_copy = dict(params or {})
         if "file_path" in params_copy and "path" not in params_copy:
             params_copy["path"] = params_copy.pop("file_path")
-        return super().validate_params(params_copy)
+        return params_copy
 
-    MAX_FILE_SIZE = 1024 * 1024 * 10 # 10 MB
-    MAX_OUTPUT_TOKENS = 25000
+    def validate_params(self, params: dict[str, Any]) -> list[str]:
+        return super().validate_params(self._normalize_params(params))
 
-    async def execute(self, invocation: ToolInvocation) -> ToolResult:
-        params_dict = dict(invocation.params or {})
-        # accept both `path` and `file_path` from callers
-        if "file_path" in params_dict and "path" not in params_dict:
-            params_dict["path"] = params_dict.pop("file_path")
+    def canonical_params(self, params: dict[str, Any]) -> dict[str, Any]:
+        return super().canonical_params(self._normalize_params(params))
+
+    def cache_fingerprint(self, invocation: ToolInvocation) -> Any | None:
+        path = invocation.params.get("path") or invocation.params.get("file_path")
+        if not isinstance(path, str):
+            return None
+        try:
+            stat = resolve_path(invocation.cwd, path).stat()
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    # limits and the tokenizer model come from the config
+    @property
+    def max_file_size(self) -> int:
+        # only enforced for reads without a limit, bounded windows can come from files of any size
+        return get_config().read_max_file_size
 
-        params = ReadFileParams(**params_dict)
+    @property
+    def max_output_tokens(self) -> int:
+        return get_config().read_max_output_tokens
+
+    @property
+    def model_name(self) -> str:
+        return get_config().model
+
+    @property
+    def timeout(self) -> float | None:
+        return get_config().read_timeout
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        params = ReadFileParams(**self._normalize_params(invocation.params))
         path = resolve_path(invocation.cwd, params.path)
 
+        # file access blocks, keep it off the event loop so concurrent reads overlap
+        return await asyncio.to_thread(self._read, path, params, invocation.cancellation)
+
+    def _read(self, path: Path, params: ReadFileParams, cancellation: CancellationToken) -> ToolResult:
         if not path.exists():
             return ToolResult.error_result(f"File not found: {str(path)}")
         
@@ -57,10 +96,11 @@ class ReadFileTool(Tool):
         
         file_size = path.stat().st_size
 
-        if file_size > self.MAX_FILE_SIZE:
+        if file_size > self.max_file_size and params.limit is None:
             return ToolResult.error_result(
                 f"File too large ({file_size / (1024*1024):.1f}MB). "
-                f"Maximum is {self.MAX_FILE_SIZE / (1024*1024):.0f}MB."
+                f"Maximum is {self.max_file_size / (1024*1024):.0f}MB "
+                f"unless a line range is given with offset and limit."
             )
         
         if is_binary_file(path):
@@ -72,70 +112,111 @@ class ReadFileTool(Tool):
                 f"Cannot read binary file: {path.name} ({size_str}) "
                 f"This tool only reads text files."
             )
-        try:
-            try:
-                content = path.read_text(encoding="utf-8")
-            except UnicodeDecodeError:
-                content = path.read_text(encoding="latin-1")
-
-            lines = content.splitlines()
-            total_lines = len(lines)
-
-            if total_lines == 0:
-                return ToolResult.success_result(
-                    output=f"File is empty: {str(path)}",
-                    metadata={
-                        "lines_read": 0
-                        }
-                )
-            
-            start_idx = max(0, params.offset - 1)
-
-            if params.limit is not None:
-                end_idx = min(start_idx + params.limit, total_lines)
-            else:
-                end_idx = total_lines
-            
-            selected_lines = lines[start_idx:end_idx]
-
-            formatted_lines = []
-
-            for i, line in enumerate(selected_lines, start= start_idx + 1):
-                formatted_lines.append(f"{i:6}|{line}")
-            
-            output = "\n".join(formatted_lines)
-            token_count = count_tokens(output, model="mistralai/devstral-2512:free" )
-
-            truncated = False
-            if token_count > self.MAX_OUTPUT_TOKENS:
-                output = truncate_text(
-                    output = output,
-                    max_tokens=self.MAX_OUTPUT_TOKENS,
-                    suffix=f"\n... [truncated {total_lines} total number of lines] "
-                )
-                truncated = True
-            
-            metadata_lines = []
-
-            if start_idx > 0 or end_idx < total_lines:
-                metadata_lines.append(
-                    f"Showing lines {start_idx+1}-{end_idx} of {total_lines}."
-                    )
-            
-            if metadata_lines:
-                header = " | ".join(metadata_lines) + "\n\n"
-                output = header + output
-            
+
+        if file_size == 0:
             return ToolResult.success_result(
-                output=output,
-                truncated = truncated,
-                metadata = {
-                    'path' : str(path),
-                    'total_lines': total_lines,
-                    'shown_start' : start_idx + 1,
-                    'shown_end' : end_idx,
-                    
-                },
-            )            
+                output=f"File is empty: {str(path)}",
+                metadata={
+                    "lines_read": 0
+                    }
+            )
+
+        try:
+            with open_mmap(path) as mm:
+                return self._read_window(mm, path, params, cancellation)
         except Exception as e:
             return ToolResult.error_result(f"Failed to read file: {str(e)}")
+
+    def _read_window(
+            self,
+            mm: mmap.mmap,
+            path: Path,
+            params: ReadFileParams,
+            cancellation: CancellationToken,
+            ) -> ToolResult:
+        start_idx = max(0, params.offset - 1)
+        index_metadata : dict[str, Any] | None = None
+
+        if len(mm) >= LINE_INDEX_MIN_FILE_SIZE:
+            # large files keep a line-offset index so paging through them doesn't rescan
+            line_index_cache = get_line_index_cache()
+            line_index, source = line_index_cache.get(path, mm)
+            total_lines = line_index.total_lines
+            start_pos = line_index.line_start(mm, start_idx)
+            index_metadata = {"source": source, **line_index_cache.stats()}
+        else:
+            total_lines = count_lines(mm)
+            start_pos = find_line_start(mm, start_idx)
+
+        if start_pos is None:
+            return ToolResult.error_result(
+                f"Offset {params.offset} is past the end of the file ({total_lines} lines)."
+            )
+
+        # lines are formatted as they stream in; the exact token count is only taken when
+        # the text could be over budget, and reading stops once it is
+        formatted_lines : list[str] = []
+        chars = 0
+        next_check = self.max_output_tokens * CHARS_PER_TOKEN
+        end_idx = start_idx
+
+        for line in iter_lines(mm, start_pos):
+            if params.limit is not None and end_idx - start_idx >= params.limit:
+                break
+            # timed out or cancelled: the lines read so far become the (partial) result
+            if cancellation.cancelled:
+                break
+
+            end_idx += 1
+            formatted = f"{end_idx:6}|{line}"
+            formatted_lines.append(formatted)
+            chars += len(formatted) + 1
+
+            if chars >= next_check:
+                if count_tokens("\n".join(formatted_lines), self.model_name) > self.max_output_tokens:
+                    break
+                next_check *= 2
+
+        if cancellation.cancelled and not formatted_lines:
+            return ToolResult.error_result("Read was cancelled before any line was read")
+
+        full_output = "\n".join(formatted_lines)
+        suffix = f"\n... [truncated {total_lines} total number of lines] "
+        # truncate_text hands back the same string when it already fits the budget
+        output = truncate_text(
+            full_output,
+            max_tokens=self.max_output_tokens,
+            model=self.model_name,
+            suffix=suffix,
+        )
+        truncated = output is not full_output
+        if truncated:
+            # report the lines that survived truncation, not the ones that were read
+            shown = output[:len(output) - len(suffix)]
+            end_idx = start_idx + shown.count("\n") + 1 if shown else start_idx
+        
+        metadata_lines = []
+
+        if start_idx > 0 or end_idx < total_lines:
+            metadata_lines.append(
+                f"Showing lines {start_idx+1}-{end_idx} of {total_lines}."
+                )
+        
+        if metadata_lines:
+            header = " | ".join(metadata_lines) + "\n\n"
+            output = header + output
+
+        metadata = {
+            'path' : str(path),
+            'total_lines': total_lines,
+            'shown_start' : start_idx + 1,
+            'shown_end' : end_idx,
+        }
+        if index_metadata:
+            metadata['line_index'] = index_metadata
+        
+        return ToolResult.success_result(
+            output=output,
+            truncated = truncated,
+            metadata = metadata,
+        )
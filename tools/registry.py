@@ -1,28 +1,47 @@
 # manage entire dictionary of tools
 # register new tools here
 
+import asyncio
+import hashlib
+import json
 import logging
+import time
 from pathlib import Path
 from typing import Any
 from tools.base import Tool, ToolInvocation, ToolResult
 from tools.builtin import ReadFileTool, get_all_builtin_tools
+from tools.result_cache import DEFAULT_RESULT_CACHE_BYTES, ToolResultCache, make_cache_key
+from utils.tracing import Span, get_tracer
 
 logger = logging.getLogger(__name__)
 
+# seconds a tool gets, once its timeout passed and its cancellation token is set, to return
+# the output it has so far before it is cancelled outright
+TOOL_CANCEL_GRACE = 1.0
+
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, result_cache_bytes: int = DEFAULT_RESULT_CACHE_BYTES):
         self._tools: dict[str, Tool] = {}
+        # results of cacheable tools, dropped whenever a mutating tool runs. 0 disables it
+        self.result_cache : ToolResultCache | None = (
+            ToolResultCache(result_cache_bytes) if result_cache_bytes > 0 else None
+        )
+        # provider-ready tool payload and its hash, rebuilt only after register/unregister
+        self._schemas : list[dict[str,Any]] | None = None
+        self._schemas_hash : str | None = None
     
     def register(self, tool: Tool) -> None:
         if tool.name in self._tools:
             logger.warning(f"Overwriting existing tool : {tool.name}")
         
         self._tools[tool.name] = tool   
+        self._schemas = None
         logger.debug(f"Registered tool: {tool.name}")
 
     def unregister(self, name: str)-> bool:
         if name in self._tools:
             del self._tools[name]
+            self._schemas = None
             return True
     
         return False
@@ -40,10 +59,60 @@ class ToolRegistry:
 
         return tools
 
+    # tools in the OpenAI "function" format, sorted by name so the payload is byte-stable
+    # across turns and processes. the list is shared and must not be modified
     def get_schemas(self) -> list[dict[str,Any]]:
-        return [tool.to_openai_schema() for tool in self.get_tools()]
+        if self._schemas is None:
+            schemas = []
+            for tool in sorted(self._tools.values(), key=lambda t: t.name):
+                schema = tool.to_openai_schema()
+                schemas.append({
+                    "type": "function",
+                    "function": {
+                        "name": schema["name"],
+                        "description": schema.get("description", ""),
+                        "parameters": schema.get("parameters", {
+                            "type": "object",
+                            "properties": {},
+                            "required": [],
+                        }),
+                    },
+                })
+            canonical = json.dumps(schemas, sort_keys=True, separators=(",", ":"))
+            self._schemas_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+            self._schemas = schemas
+        return self._schemas
+
+    # content hash of get_schemas(), usable as a prompt cache key
+    @property
+    def schemas_hash(self) -> str:
+        self.get_schemas()
+        return self._schemas_hash
     
-    async def invoke(self, name: str, params: dict[str,Any] | None, cwd: Path,)->ToolResult:
+    async def invoke(
+            self,
+            name: str,
+            params: dict[str,Any] | None,
+            cwd: Path,
+            parent_span: Span | None = None,
+            )->ToolResult:
+        # without parent_span the call goes under the active span, if any
+        with get_tracer().span("tool.invoke", parent=parent_span, tool=name) as span:
+            start = time.perf_counter()
+            result = await self._invoke(name, params, cwd)
+            result.duration = time.perf_counter() - start
+            span.set_attributes(
+                success=result.success,
+                cache_hit=result.metadata.get("cache_hit", False),
+                truncated=result.truncated,
+                timed_out=result.timed_out,
+                output_chars=len(result.output),
+            )
+            if not result.success:
+                span.set_error(result.error or "tool failed")
+        return result
+
+    async def _invoke(self, name: str, params: dict[str,Any] | None, cwd: Path,)->ToolResult:
         tool = self.get(name)
 
         if tool is None:
@@ -69,8 +138,27 @@ class ToolRegistry:
             params=invocation_params,
             cwd=cwd,
         )
+
+        mutating = tool.is_mutating(invocation_params)
+        cache_key = None
+        if self.result_cache is not None:
+            if mutating:
+                self.result_cache.invalidate()
+            elif tool.cacheable:
+                fingerprint = tool.cache_fingerprint(invocation)
+                if fingerprint is not None:
+                    cache_key = make_cache_key(
+                        name,
+                        tool.canonical_params(invocation_params),
+                        fingerprint,
+                        str(cwd),
+                    )
+                    cached = self.result_cache.get(cache_key)
+                    if cached is not None:
+                        return cached
+
         try:
-            result = await tool.execute(invocation)
+            result = await self._execute(tool, invocation)
         except Exception as e:
             logger.exception(f"Error executing tool {name}: {str(e)}")
             result = ToolResult.error_result(
@@ -78,8 +166,55 @@ class ToolRegistry:
                 metadata={"tool_name": name},
             )
 
+        if self.result_cache is not None:
+            if mutating:
+                # also drop anything cached while the mutation was running
+                self.result_cache.invalidate()
+            elif cache_key is not None and result.success:
+                self.result_cache.put(cache_key, result)
+
         return result
 
+    # runs the tool under its timeout. when the caller is cancelled (the turn was interrupted)
+    # the invocation's token is set as well, so work the tool handed to a thread stops too
+    async def _execute(self, tool: Tool, invocation: ToolInvocation) -> ToolResult:
+        timeout = tool.timeout
+        task = asyncio.ensure_future(tool.execute(invocation))
+        try:
+            done, _ = await asyncio.wait((task,), timeout=timeout)
+            if done:
+                return task.result()
+
+            invocation.cancellation.cancel("timeout")
+            done, _ = await asyncio.wait((task,), timeout=TOOL_CANCEL_GRACE)
+            partial = None
+            if done and not task.cancelled() and task.exception() is None:
+                partial = task.result()
+            return self._timed_out_result(tool.name, timeout, partial)
+        except asyncio.CancelledError:
+            invocation.cancellation.cancel()
+            raise
+        finally:
+            if not task.done():
+                task.cancel()
+
+    def _timed_out_result(self, name: str, timeout: float, partial: ToolResult | None) -> ToolResult:
+        metadata = dict(partial.metadata) if partial is not None else {}
+        metadata.update(tool_name=name, timeout=timeout)
+        error = f"Tool {name} timed out after {timeout:g}s"
+        if partial is None or not partial.output:
+            error += " without output"
+        # the tool's own account of where it stopped, e.g. read_file's cancellation message
+        if partial is not None and partial.error:
+            error += f": {partial.error}"
+        return ToolResult.error_result(
+            error,
+            output=partial.output if partial is not None else "",
+            metadata=metadata,
+            truncated=partial.truncated if partial is not None else False,
+            timed_out=True,
+        )
+
 def create_default_registry() -> ToolRegistry:
     registry = ToolRegistry()
     # register default tools here
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Hashable
+
+from tools.base import ToolResult
+
+DEFAULT_RESULT_CACHE_BYTES = 16 * 1024 * 1024
+
+# LRU of tool results bounded by the size of their output, used by ToolRegistry.invoke
+class ToolResultCache:
+    def __init__(self, max_bytes: int = DEFAULT_RESULT_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries : OrderedDict[Hashable, tuple[ToolResult, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def get(self, key: Hashable) -> ToolResult | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+
+        # callers get their own copy so they can't change what is cached
+        return replace(result, metadata={**result.metadata, "cache_hit": True})
+
+    def put(self, key: Hashable, result: ToolResult) -> None:
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (replace(result, metadata=dict(result.metadata)), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+
+def _result_size(result: ToolResult) -> int:
+    size = len(result.output.encode("utf-8", errors="replace"))
+    if result.error:
+        size += len(result.error)
+    return size
+
+def make_cache_key(
+        tool_name: str,
+        params: dict[str, Any],
+        fingerprint: Hashable,
+        cwd: str,
+        ) -> Hashable:
+    return (tool_name, _freeze(params), fingerprint, cwd)
+
+def _freeze(value: Any) -> Hashable:
+    # canonical, hashable form of json-like params: key order doesn't matter
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+import json
+import sys
+from typing import TYPE_CHECKING, Any, TextIO
+
+if TYPE_CHECKING:
+    from agent.events import AgentEvent
+
+# headless output: one JSON object per AgentEvent, for pipelines that consume the agent's
+# events instead of a terminal. deliberately free of rich so batch runs don't load it
+class JsonlWriter:
+    def __init__(self, file: TextIO | None = None) -> None:
+        self.file = file or sys.stdout
+
+    # `id` tags the events of one prompt when several run at once
+    def write_event(self, event: AgentEvent, id: Any = None) -> None:
+        record = event.to_dict()
+        if id is not None:
+            record = {"id": id, **record}
+        self.write(record)
+
+    def write(self, record: dict[str, Any]) -> None:
+        # values without a JSON form (paths, enums) are written as strings
+        self.file.write(json.dumps(record, default=str, separators=(",", ":")) + "\n")
+        # consumers read the stream live, don't leave events sitting in a pipe buffer
+        self.file.flush()
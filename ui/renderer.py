@@ -5,6 +5,8 @@ from rich.rule import Rule
 from rich.text import Text
 from rich.panel import Panel
 from rich.table import Table
+from rich.live import Live
+from rich.markdown import Markdown
 from pathlib import Path
 from utils.paths import display_path_rel_to_cwd
 from rich import box
@@ -37,6 +39,11 @@ AGENT_THEME = Theme(
     }
 )
 
+# on a terminal the in-progress assistant text is redrawn at most this many times a second,
+# however fast tokens arrive
+DEFAULT_MAX_FPS = 15
+FENCES = ("```", "~~~")
+
 _console: Console | None = None
 
 def get_console() -> Console:
@@ -46,28 +53,138 @@ def get_console() -> Console:
     
     return _console
 
+# the leading run of fence characters of a line, e.g. "````" for "````python"
+def _fence_run(line: str) -> str:
+    if not line.startswith(FENCES):
+        return ""
+    length = len(line) - len(line.lstrip(line[0]))
+    return line[:length]
+
+# cuts streamed markdown into blocks that can be rendered on their own: everything up to
+# a blank line, or up to the end of a fenced code block. text inside a fence is never split
+class MarkdownBlockSplitter:
+    def __init__(self) -> None:
+        # text not yet returned as part of a complete block
+        self.pending = ""
+        # lines before this offset of `pending` were already looked at
+        self._scanned = 0
+        self._fence = ""
+
+    # returns the complete blocks the new text finished, or "" if none
+    def feed(self, text: str) -> str:
+        self.pending += text
+        if "\n" not in text:
+            return ""
+
+        pending = self.pending
+        end = pending.rfind("\n") + 1
+        boundary = 0
+        position = self._scanned
+        while position < end:
+            line_end = pending.index("\n", position) + 1
+            line = pending[position:line_end].strip()
+            if self._fence:
+                # a closing fence is a run of the same character, at least as long as the
+                # opening one, and nothing else: ``` inside a ```` block is content
+                run = _fence_run(line)
+                if run.startswith(self._fence) and line == run:
+                    self._fence = ""
+                    boundary = line_end
+            elif line.startswith(FENCES):
+                self._fence = _fence_run(line)
+            elif not line:
+                boundary = line_end
+            position = line_end
+
+        self._scanned = end - boundary
+        if not boundary:
+            return ""
+        self.pending = pending[boundary:]
+        return pending[:boundary]
+
+    # whatever is left once the stream ended
+    def flush(self) -> str:
+        rest = self.pending
+        self.pending = ""
+        self._scanned = 0
+        self._fence = ""
+        return rest
+
 class TUI:
     def __init__(
             self,
             console: Console | None = None,
+            max_fps: float = DEFAULT_MAX_FPS,
             )->None:
         self.console = console or get_console()
+        self.max_fps = max_fps
         self._assistant_stream_open = False
         self._tool_args_by_call_id: dict[str, dict[str,Any]] = {}
         self.cwd = Path.cwd()
-    
+        # on a terminal, finished markdown blocks are printed as they complete and the block
+        # still streaming is shown below them by a Live display that refreshes at max_fps from
+        # its own thread, so a delta costs a string append. anywhere else deltas are written
+        # through as plain text
+        self._splitter = MarkdownBlockSplitter()
+        self._live : Live | None = None
+        self._blocks_printed = 0
+
+    @property
+    def _is_terminal(self) -> bool:
+        return self.console.is_terminal
+
     def begin_assistant(self)-> None:
         self.console.print()
         self.console.print(Rule(Text("Assistant", style="assistant"), style="border"))
         self._assistant_stream_open = True
+        self._splitter = MarkdownBlockSplitter()
+        self._blocks_printed = 0
+        if self._is_terminal:
+            self._live = Live(
+                console=self.console,
+                get_renderable=self._render_pending,
+                refresh_per_second=self.max_fps,
+                transient=True,
+                redirect_stdout=False,
+                redirect_stderr=False,
+            )
+            self._live.start()
     
     def end_assistant(self)-> None:
-        if self._assistant_stream_open:
-            self.console.print()  # ensure we end with a newline
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+            self._print_block(self._splitter.flush())
+        elif self._assistant_stream_open:
+            self.console.file.write("\n")  # ensure we end with a newline
+            self.console.file.flush()
         self._assistant_stream_open = False
 
     def stream_assistant_delta(self, content: str)-> None:
-        self.console.print(content, end="", markup=False)
+        if self._live is None:
+            self.console.file.write(content)
+            self.console.file.flush()
+            return
+        block = self._splitter.feed(content)
+        if block:
+            self._print_block(block)
+
+    def _print_block(self, block: str) -> None:
+        if not block.strip():
+            return
+        if self._blocks_printed:
+            self.console.print()
+        self.console.print(Markdown(block))
+        self._blocks_printed += 1
+
+    # called by the Live thread on every refresh. only the last lines that fit on screen
+    # are shown, Live can't redraw anything that scrolled off
+    def _render_pending(self) -> Text:
+        pending = self._splitter.pending
+        max_lines = max(1, self.console.size.height - 2)
+        if pending.count("\n") >= max_lines:
+            pending = "\n".join(pending.splitlines()[-max_lines:])
+        return Text(pending)
     
     def ordered_arguments(self, tool_name: str, args: dict[str,Any])->list[Tuple]:
         _PREFERED_ORDER = {
@@ -91,13 +208,17 @@ class TUI:
         table.add_column(style="code", overflow="fold")
 
         for key, value in self.ordered_arguments(tool_name, arguments):
-            table.add_row(key, value)
+            # offsets and limits arrive as ints, rich only renders strings
+            table.add_row(key, value if isinstance(value, str) else str(value))
 
         return table
 
     
     def tool_call_start(self, call_id: str, name: str,tool_kind: str, arguments: dict[str,Any])-> None:
         self._tool_args_by_call_id[call_id] = arguments
+        if self._live is not None:
+            # keep the text streamed so far above the panel
+            self._print_block(self._splitter.flush())
         border_style = f"tool.{tool_kind}" if tool_kind else "tool"
 
         title = Text.assemble(
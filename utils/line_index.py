@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from itertools import accumulate, count, islice
+from operator import add
+from pathlib import Path
+
+from utils.line_reader import READ_CHUNK_SIZE, find_line_start
+
+logger = logging.getLogger(__name__)
+
+# byte offset of every STRIDE-th line is kept, so seeking to any line scans at most
+# STRIDE - 1 newlines and the index of a 1M line file is ~8KB
+LINE_INDEX_STRIDE = 1024
+LINE_INDEX_CACHE_SIZE = 64
+# smaller files are cheaper to scan than to index
+LINE_INDEX_MIN_FILE_SIZE = 256 * 1024
+# set to a directory to keep indexes across processes
+LINE_INDEX_DIR_ENV = "LINE_INDEX_CACHE_DIR"
+
+@dataclass(frozen=True)
+class FileKey:
+    path : str
+    size : int
+    mtime_ns : int
+    inode : int
+
+    @classmethod
+    def from_path(cls, path: Path) -> "FileKey":
+        stat = path.stat()
+        return cls(
+            path=str(path),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+        )
+
+class LineIndex:
+    def __init__(self, key: FileKey, stride: int, checkpoints: array, total_lines: int) -> None:
+        self.key = key
+        self.stride = stride
+        # checkpoints[i] is the byte offset where line i * stride starts
+        self.checkpoints = checkpoints
+        self.total_lines = total_lines
+
+    @classmethod
+    def build(cls, mm: mmap.mmap, key: FileKey, stride: int = LINE_INDEX_STRIDE) -> "LineIndex":
+        checkpoints = array("Q", [0])
+        size = len(mm)
+        lines = 0
+        # newlines still to skip before the next checkpoint
+        until_checkpoint = stride
+        pos = 0
+
+        while pos < size:
+            chunk = mm[pos:pos + READ_CHUNK_SIZE]
+            newlines = chunk.count(b"\n")
+            if newlines >= until_checkpoint:
+                # offsets just past each newline, computed without a python level loop
+                line_ends = map(add, accumulate(map(len, chunk.split(b"\n"))), count(1))
+                for end in islice(line_ends, until_checkpoint - 1, newlines, stride):
+                    if pos + end < size:
+                        checkpoints.append(pos + end)
+                until_checkpoint = stride - (newlines - until_checkpoint) % stride
+            else:
+                until_checkpoint -= newlines
+            lines += newlines
+            pos += len(chunk)
+
+        if size and mm[size - 1:size] != b"\n":
+            lines += 1
+        return cls(key, stride, checkpoints, lines)
+
+    def line_start(self, mm: mmap.mmap, line_index: int) -> int | None:
+        if line_index >= self.total_lines:
+            return None
+        checkpoint = min(line_index // self.stride, len(self.checkpoints) - 1)
+        return find_line_start(
+            mm,
+            line_index,
+            start_pos=self.checkpoints[checkpoint],
+            start_line=checkpoint * self.stride,
+        )
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            "key": asdict(self.key),
+            "stride": self.stride,
+            "total_lines": self.total_lines,
+        })
+        return header.encode("utf-8") + b"\n" + self.checkpoints.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LineIndex":
+        header, _, body = data.partition(b"\n")
+        meta = json.loads(header)
+        checkpoints = array("Q")
+        checkpoints.frombytes(body)
+        return cls(FileKey(**meta["key"]), meta["stride"], checkpoints, meta["total_lines"])
+
+# in-process LRU of line indexes, optionally backed by a sidecar directory
+class LineIndexCache:
+    def __init__(
+            self,
+            max_entries: int = LINE_INDEX_CACHE_SIZE,
+            cache_dir: Path | None = None,
+            )-> None:
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._indexes : OrderedDict[FileKey, LineIndex] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._indexes),
+        }
+
+    # returns the index and where it came from: "memory", "disk" or "built"
+    def get(self, path: Path, mm: mmap.mmap) -> tuple[LineIndex, str]:
+        key = FileKey.from_path(path)
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                self.hits += 1
+                return index, "memory"
+
+        source = "disk"
+        index = self._load(key)
+        if index is None:
+            source = "built"
+            index = LineIndex.build(mm, key)
+            self._store(index)
+
+        with self._lock:
+            if source == "disk":
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index, source
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+    def _sidecar_path(self, key: FileKey) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256(key.path.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.lineidx"
+
+    def _load(self, key: FileKey) -> LineIndex | None:
+        sidecar = self._sidecar_path(key)
+        if sidecar is None or not sidecar.exists():
+            return None
+        try:
+            index = LineIndex.from_bytes(sidecar.read_bytes())
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable line index {sidecar}: {e}")
+            return None
+        # a changed file keeps its sidecar name, the stored key tells if it is stale
+        if index.key != key:
+            return None
+        return index
+
+    def _store(self, index: LineIndex) -> None:
+        sidecar = self._sidecar_path(index.key)
+        if sidecar is None:
+            return
+        try:
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            tmp = sidecar.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(index.to_bytes())
+            tmp.replace(sidecar)
+        except OSError as e:
+            logger.debug(f"Could not persist line index for {index.key.path}: {e}")
+
+_line_index_cache: LineIndexCache | None = None
+
+def get_line_index_cache() -> LineIndexCache:
+    global _line_index_cache
+    if _line_index_cache is None:
+        cache_dir = os.getenv(LINE_INDEX_DIR_ENV)
+        _line_index_cache = LineIndexCache(
+            cache_dir=Path(cache_dir).expanduser() if cache_dir else None,
+        )
+    return _line_index_cache
@@ -0,0 +1,84 @@
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# newlines are counted a chunk at a time so memory stays flat for any file size
+READ_CHUNK_SIZE = 1024 * 1024
+
+@contextmanager
+def open_mmap(path: Path) -> Iterator[mmap.mmap]:
+    # callers must handle empty files themselves, they can't be mapped
+    with open(path, "rb") as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+def count_lines(mm: mmap.mmap, start_pos: int = 0) -> int:
+    # same count as str.splitlines() for \n terminated text: a trailing newline
+    # does not start another line
+    size = len(mm)
+    if start_pos >= size:
+        return 0
+
+    lines = 0
+    pos = start_pos
+    while pos < size:
+        lines += mm[pos:pos + READ_CHUNK_SIZE].count(b"\n")
+        pos += READ_CHUNK_SIZE
+
+    if mm[size - 1:size] != b"\n":
+        lines += 1
+    return lines
+
+def find_line_start(
+        mm: mmap.mmap,
+        line_index: int,
+        start_pos: int = 0,
+        start_line: int = 0,
+        ) -> int | None:
+    # byte offset of 0-based line `line_index`, scanning forward from a known
+    # (start_pos, start_line) pair. None when the file has fewer lines
+    size = len(mm)
+    remaining = line_index - start_line
+    pos = start_pos
+
+    while remaining > 0:
+        if pos >= size:
+            return None
+        chunk = mm[pos:pos + READ_CHUNK_SIZE]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            pos += len(chunk)
+            continue
+
+        offset = -1
+        for _ in range(remaining):
+            offset = chunk.find(b"\n", offset + 1)
+        pos += offset + 1
+        remaining = 0
+
+    if pos >= size:
+        return None
+    return pos
+
+def decode_line(raw: bytes) -> str:
+    if raw.endswith(b"\r"):
+        raw = raw[:-1]
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+def iter_lines(mm: mmap.mmap, start_pos: int) -> Iterator[str]:
+    size = len(mm)
+    pos = start_pos
+    while pos < size:
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = size
+        yield decode_line(mm[pos:end])
+        pos = end + 1
@@ -1,24 +1,120 @@
-import tiktoken
+from __future__ import annotations
+import threading
+from enum import Enum
+from typing import TYPE_CHECKING
 
-def get_tokenizer(model: str):
+# tiktoken is imported on first use and its BPE file loaded off the startup path, see
+# prewarm_encoding
+if TYPE_CHECKING:
+    import tiktoken
+
+FALLBACK_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4
+# extra tokens tokenized past a truncation cut, see _window_tokens
+WINDOW_MARGIN_TOKENS = 64
+# tiktoken releases the GIL while encoding, so batches scale with threads
+DEFAULT_BATCH_THREADS = 8
+
+# model name -> encoding, resolved once per process. None means no encoding could be
+# loaded (e.g. the BPE file can't be downloaded) and callers fall back to estimates
+_encodings: dict[str, tiktoken.Encoding | None] = {}
+_encodings_lock = threading.Lock()
+# separate from _encodings_lock, which is held for the whole load
+_prewarm_lock = threading.Lock()
+_prewarming : set[str] = set()
+
+def _resolve_encoding(model: str) -> tiktoken.Encoding | None:
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return encoding.encode
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = FALLBACK_ENCODING
+    try:
+        return tiktoken.get_encoding(encoding_name)
     except Exception:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return encoding.encode
+        return None
+
+def get_encoding(model: str) -> tiktoken.Encoding | None:
+    try:
+        return _encodings[model]
+    except KeyError:
+        pass
+
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _resolve_encoding(model)
+        return _encodings[model]
+
+# loads the encoding for `model` in a daemon thread, so the first exact count doesn't wait
+# for tiktoken's import and BPE file. get_encoding() called meanwhile blocks until it is done
+def prewarm_encoding(model: str) -> None:
+    with _prewarm_lock:
+        if model in _encodings or model in _prewarming:
+            return
+        _prewarming.add(model)
+    threading.Thread(target=get_encoding, args=(model,), name="tokenizer-prewarm", daemon=True).start()
+
+def encoding_ready(model: str) -> bool:
+    return model in _encodings
+
+# the exact count when the encoding is already loaded (or known to be unavailable, then the
+# estimate), otherwise None without waiting; loading is started in the background so a later
+# call can count exactly
+def count_tokens_if_ready(text: str, model: str) -> int | None:
+    if not encoding_ready(model):
+        prewarm_encoding(model)
+        return None
+    return count_tokens(text, model)
+
+def get_tokenizer(model: str):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return None
+    return encoding.encode_ordinary
+
+def _encode(encoding: tiktoken.Encoding, text: str) -> list[int]:
+    # file contents may legitimately contain "<|endoftext|>", so special tokens are counted
+    # as plain text
+    return encoding.encode_ordinary(text)
 
 def count_tokens(text: str, model: str) -> int:
-    tokenizer = get_tokenizer(model)
-    if tokenizer:
-        return len(tokenizer(text))
+    if not text:
+        return 0
+
+    encoding = get_encoding(model)
+    if encoding is not None:
+        return len(_encode(encoding, text))
     
     return estimate_tokens(text)
 
+def count_tokens_many(
+        texts: list[str],
+        model: str,
+        num_threads: int = DEFAULT_BATCH_THREADS,
+        ) -> list[int]:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [estimate_tokens(text) if text else 0 for text in texts]
+
+    encoded = encoding.encode_batch(
+        texts,
+        num_threads=num_threads,
+        disallowed_special=(),
+    )
+    return [len(tokens) for tokens in encoded]
+
 
 def estimate_tokens(text: str) -> int:
     # rough estimate assuming 4 characters per token
-    return max(1, len(text) // 4)
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+class TruncationStrategy(str, Enum):
+    HEAD = "head"  # keep the beginning
+    TAIL = "tail"  # keep the end, e.g. for logs
+    HEAD_TAIL = "head_tail"  # keep both ends and elide the middle
 
 def truncate_text(
         text: str, 
@@ -26,50 +122,110 @@ def truncate_text(
         model : str, 
         suffix: str = "\n... [truncated]",
         preserve_lines: bool = True,
-        ):
-    current_tokens = count_tokens(text, model)
-    if current_tokens <= max_tokens:
+        strategy: TruncationStrategy = TruncationStrategy.HEAD,
+        ) -> str:
+    # only a window at the kept end(s) is tokenized, grown until it holds more tokens than
+    # the budget, so cost follows the budget instead of the input size. cut points come from
+    # token offsets and are then moved back to the nearest line boundary inside the budget
+    encoding = get_encoding(model)
+    head : list[int] | None = None
+    if encoding is not None:
+        head, complete = _window_tokens(encoding, text, max_tokens)
+        if complete and len(head) <= max_tokens:
+            return text
+    elif estimate_tokens(text) <= max_tokens:
         return text
     
-    suffix_tokens = count_tokens(suffix, model)
-    target_tokens = max_tokens - suffix_tokens
+    # the marker is appended for head, prepended for tail and sits between both parts otherwise
+    if strategy == TruncationStrategy.HEAD:
+        marker = suffix
+    elif strategy == TruncationStrategy.TAIL:
+        marker = suffix.strip() + "\n"
+    else:
+        marker = suffix + "\n"
+
+    target_tokens = max_tokens - count_tokens(marker, model)
 
     if target_tokens <= 0:
         return suffix.strip()
-    
-    if preserve_lines:
-        return _truncate_by_lines(text, target_tokens, model, suffix)
-    else:
-        return _truncate_by_chars(text, target_tokens, model, suffix)
 
-def _truncate_by_lines(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    lines = text.split("\n")
-    result_lines: list[str] = []
-    current_tokens = 0
+    if strategy == TruncationStrategy.HEAD:
+        end = _head_cut(text, encoding, target_tokens, preserve_lines, head)
+        return text[:end] + marker
 
-    for line in lines:
-        line_tokens = count_tokens(line + "\n", model)
-        if current_tokens + line_tokens > target_tokens:
-            break
-        result_lines.append(line)
-        current_tokens += line_tokens
+    if strategy == TruncationStrategy.TAIL:
+        start = _tail_cut(text, encoding, target_tokens, preserve_lines)
+        return marker + text[start:]
 
-    if not result_lines:
-        # Fall back to character truncation if no complete lines fit
-        return _truncate_by_chars(text, target_tokens, suffix, model)
+    head_tokens = target_tokens // 2
+    end = _head_cut(text, encoding, head_tokens, preserve_lines, head)
+    start = _tail_cut(text, encoding, target_tokens - head_tokens, preserve_lines)
+    return text[:end] + marker + text[max(start, end):]
 
-    return "\n".join(result_lines) + suffix
+def _window_tokens(
+        encoding: tiktoken.Encoding,
+        text: str,
+        count: int,
+        from_end: bool = False,
+        ) -> tuple[list[int], bool]:
+    # tokens of the first (or last) part of text holding more than `count` tokens.
+    # the margin keeps the possibly mis-split word at the window edge away from the cut.
+    # the second value is True when the whole text had to be tokenized
+    size = (count + WINDOW_MARGIN_TOKENS) * CHARS_PER_TOKEN * 2
+    while size < len(text):
+        window = text[-size:] if from_end else text[:size]
+        tokens = _encode(encoding, window)
+        if len(tokens) > count + WINDOW_MARGIN_TOKENS:
+            return tokens, False
+        size *= 2
+    return _encode(encoding, text), True
 
+def _head_cut(
+        text: str,
+        encoding: tiktoken.Encoding | None,
+        budget: int,
+        preserve_lines: bool,
+        tokens: list[int] | None = None,
+        ) -> int:
+    # index of the first character past the first `budget` tokens.
+    # `tokens` may hold an already tokenized prefix with more than `budget` tokens
+    if budget <= 0:
+        return 0
+    if encoding is None:
+        end = budget * CHARS_PER_TOKEN
+    else:
+        if tokens is None:
+            tokens, _ = _window_tokens(encoding, text, budget)
+        # a token boundary can split a multi-byte character, that partial character is dropped
+        end = len(encoding.decode_bytes(tokens[:budget]).decode("utf-8", errors="ignore"))
+    end = min(end, len(text))
 
-def _truncate_by_chars(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    # Binary search for the right length
-    low, high = 0, len(text)
+    if preserve_lines:
+        newline = text.rfind("\n", 0, end + 1)
+        if newline > 0:
+            return newline
+    # no complete line fits, fall back to the character cut
+    return end
 
-    while low < high:
-        mid = (low + high + 1) // 2
-        if count_tokens(text[:mid], model) <= target_tokens:
-            low = mid
-        else:
-            high = mid - 1
+def _tail_cut(
+        text: str,
+        encoding: tiktoken.Encoding | None,
+        budget: int,
+        preserve_lines: bool,
+        ) -> int:
+    # index of the first character of the last `budget` tokens
+    if budget <= 0:
+        return len(text)
+    if encoding is None:
+        start = len(text) - budget * CHARS_PER_TOKEN
+    else:
+        tokens, _ = _window_tokens(encoding, text, budget, from_end=True)
+        tail = encoding.decode_bytes(tokens[-budget:]).decode("utf-8", errors="ignore")
+        start = len(text) - len(tail)
+    start = max(start, 0)
 
-    return text[:low] + suffix
\ No newline at end of file
+    if preserve_lines and start > 0 and text[start - 1] != "\n":
+        newline = text.find("\n", start)
+        if newline != -1 and newline + 1 < len(text):
+            return newline + 1
+    return start
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import abc
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from config.settings import Config, get_config
+
+# lightweight spans in the shape of OpenTelemetry's: a trace id shared by everything under
+# one root, a span id, the parent's span id, wall clock start, duration, attributes and
+# timestamped events. nothing is recorded unless an exporter is configured, and then every
+# finished span goes to it right away
+
+# the span new spans are parented to when none is passed explicitly
+_current_span : contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+class Span:
+    __slots__ = (
+        "tracer", "name", "trace_id", "span_id", "parent_id", "start_time", "duration",
+        "attributes", "events", "status", "error", "_start", "_activate", "_token", "_ended",
+    )
+    recording = True
+
+    def __init__(
+            self,
+            tracer: Tracer,
+            name: str,
+            parent: Span | None,
+            attributes: dict[str, Any],
+            activate: bool,
+            ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time()
+        self.duration : float | None = None
+        self.attributes = attributes
+        self.events : list[dict[str, Any]] = []
+        self.status = "ok"
+        self.error : str | None = None
+        self._start = time.perf_counter()
+        self._activate = activate
+        self._token : contextvars.Token | None = None
+        self._ended = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append({
+            "name": name,
+            "offset_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "attributes": attributes,
+        })
+
+    def set_error(self, error: str) -> None:
+        self.status = "error"
+        self.error = error
+
+    def end(self) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        self.duration = time.perf_counter() - self._start
+        self.tracer._export(self)
+
+    def __enter__(self) -> Span:
+        if self._activate:
+            self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # an async generator finalized from another task runs in another context
+                pass
+            self._token = None
+        if exc_type is not None and self.status == "ok":
+            if issubclass(exc_type, (GeneratorExit, KeyboardInterrupt, asyncio.CancelledError)):
+                self.status = "cancelled"
+            else:
+                self.set_error(f"{exc_type.__name__}: {exc_value}")
+        self.end()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+# what a disabled tracer hands out: every method is a no-op, so instrumented code doesn't
+# need to check whether tracing is on. `recording` lets it skip computing costly attributes
+class _NoopSpan:
+    __slots__ = ()
+    recording = False
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        pass
+
+    def set_error(self, error: str) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+# receives every finished span
+class SpanExporter(abc.ABC):
+    @abc.abstractmethod
+    def export(self, span: Span) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+# keeps finished spans in a list, for tests and for inspecting a run from code
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans : list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def find(self, name: str) -> list[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+# one JSON object per finished span, appended to a file. lines are flushed as they are
+# written so a crashed or killed run still leaves every span that finished
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.path.open("a", encoding="utf-8", buffering=1)
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter | None = None) -> None:
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    # starts a span under `parent`, or under the active span. used as a context manager
+    # it ends on exit, recording an exception as an error. with activate=False it doesn't
+    # become the active span: spans opened inside an async generator that yields to other
+    # code should not be, or that code would end up parented to them
+    def span(
+            self,
+            name: str,
+            parent: Span | _NoopSpan | None = None,
+            activate: bool = True,
+            **attributes: Any,
+            ) -> Span | _NoopSpan:
+        if self.exporter is None:
+            return NOOP_SPAN
+        if parent is None or not parent.recording:
+            parent = _current_span.get()
+        return Span(self, name, parent, attributes, activate)
+
+    def _export(self, span: Span) -> None:
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+_DISABLED = Tracer()
+# set explicitly with set_tracer(), otherwise built from config.trace_file
+_tracer : Tracer | None = None
+_file_tracer : Tracer | None = None
+
+def get_tracer(config: Config | None = None) -> Tracer:
+    global _file_tracer
+    if _tracer is not None:
+        return _tracer
+    trace_file = (config or get_config()).trace_file
+    if not trace_file:
+        return _DISABLED
+    if _file_tracer is None or _file_tracer.exporter.path != Path(trace_file).expanduser():
+        if _file_tracer is not None:
+            _file_tracer.close()
+        _file_tracer = Tracer(JsonlSpanExporter(trace_file))
+    return _file_tracer
+
+# None goes back to the config's trace_file
+def set_tracer(tracer: Tracer | None) -> None:
+    global _tracer
+    _tracer = tracer
+
+def current_span() -> Span | None:
+    return _current_span.get()